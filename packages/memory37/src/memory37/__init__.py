@@ -3,16 +3,34 @@
 from .config import KnowledgeConfig, KnowledgeDomainConfig, RetrievalConfig
 from .domain import ArtCard, KnowledgeItem, NpcProfile, RelationDelta, SceneState
 from .loader import load_knowledge_config
-from .vector_store import EmbeddingProvider, MemoryVectorStore, PgVectorStore, VectorRecord, VectorStore
+from .vector_store import (
+    AsyncPgVectorStore,
+    BulkUpsertStats,
+    EmbeddingProvider,
+    MemoryVectorStore,
+    PgVectorStore,
+    QuantizationReport,
+    SchemaMigrationStats,
+    VectorIndexSpec,
+    VectorIndexStats,
+    VectorRecord,
+    VectorStore,
+    quantization_report,
+)
 from .retrieval import HybridRetriever, RerankProvider
-from .embedding import TokenFrequencyEmbeddingProvider, OpenAIEmbeddingProvider
-from .rerankers import OpenAIChatRerankProvider
+from .lexical import BM25Index
+from .chunking import SemanticChunker
+from .embedding import EmbeddingBatchStats, HashingEmbeddingProvider, TokenFrequencyEmbeddingProvider, OpenAIEmbeddingProvider
+from .embedding_cache import CachedEmbeddingProvider, PersistentEmbeddingProvider, SQLiteEmbeddingCache
+from .rerankers import BudgetedRerankProvider, LocalRerankProvider, OpenAIChatRerankProvider, RerankStats
 from .ingest import load_knowledge_items_from_yaml
 from .etl import ETLPipeline
+from .pipeline import IngestCheckpoint, IngestProgress, StreamingIngestPipeline
 from .versioning import KnowledgeAlias, KnowledgeVersion, KnowledgeVersionRegistry
-from .types import EpisodicSummary, NPCProfile, ArtCard, Chunk, GraphFact
+from .types import EpisodicSummary, NPCProfile, ArtCard, Chunk, GraphFact, SearchRequest
 from .stores.base import VectorStore as CoreVectorStore, GraphStore
 from .stores.pgvector_store import PgVectorWrapper, InMemoryVectorStore
+from .stores.executor import ExecutorStats, StoreExecutor
 
 __all__ = [
     "KnowledgeConfig",
@@ -28,13 +46,33 @@ __all__ = [
     "VectorRecord",
     "EmbeddingProvider",
     "MemoryVectorStore",
+    "AsyncPgVectorStore",
+    "BulkUpsertStats",
     "PgVectorStore",
+    "QuantizationReport",
+    "quantization_report",
+    "SchemaMigrationStats",
+    "VectorIndexSpec",
+    "VectorIndexStats",
     "HybridRetriever",
     "RerankProvider",
+    "BM25Index",
+    "EmbeddingBatchStats",
+    "HashingEmbeddingProvider",
     "TokenFrequencyEmbeddingProvider",
     "OpenAIEmbeddingProvider",
+    "CachedEmbeddingProvider",
+    "PersistentEmbeddingProvider",
+    "SQLiteEmbeddingCache",
     "OpenAIChatRerankProvider",
+    "BudgetedRerankProvider",
+    "LocalRerankProvider",
+    "RerankStats",
     "ETLPipeline",
+    "SemanticChunker",
+    "StreamingIngestPipeline",
+    "IngestCheckpoint",
+    "IngestProgress",
     "load_knowledge_items_from_yaml",
     "KnowledgeVersion",
     "KnowledgeAlias",
@@ -44,8 +82,11 @@ __all__ = [
     "ArtCard",
     "Chunk",
     "GraphFact",
+    "SearchRequest",
     "CoreVectorStore",
     "GraphStore",
     "PgVectorWrapper",
     "InMemoryVectorStore",
+    "StoreExecutor",
+    "ExecutorStats",
 ]
@@ -2,15 +2,19 @@ from __future__ import annotations
 
 from typing import Literal
 
-from ..types import Chunk
-from .lore import lore_search
-from .rules import rules_lookup
+from ..types import Chunk, SearchRequest
 
 
 async def lore_assert(store, fact: str, *, version_id: str | None = None) -> dict[str, object]:
-    candidates = await lore_search(store, query=fact, k=3, version_id=version_id)
-    rules = await rules_lookup(store, term=fact, k=3, version_id=version_id)
-    sources = candidates + rules
+    # lore_search и rules_lookup одним пакетом: один эмбеддинг и один проход по стору.
+    filters = {"knowledge_version_id": version_id} if version_id else None
+    lore, rules = await store.search_many(
+        [
+            SearchRequest(domain="lore", query=fact, k=3, filters=filters),
+            SearchRequest(domain="srd", query=fact, k=3, filters=filters),
+        ]
+    )
+    sources: list[Chunk] = [score.chunk for score in lore + rules]
     if sources:
         return {"result": "unknown", "sources": [c.model_dump() for c in sources]}  # type: ignore[return-value]
     return {"result": "unknown", "sources": []}  # type: ignore[return-value]
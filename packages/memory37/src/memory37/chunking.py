@@ -0,0 +1,173 @@
+"""Token-aware chunking on sentence and paragraph boundaries."""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import deque
+from typing import Callable, Iterator
+
+from .embedding import approximate_tokens
+from .types import Chunk
+
+TokenCounter = Callable[[str], int]
+
+# A boundary is a blank line (paragraph) or terminal punctuation, optional closing
+# quotes/brackets and whitespace (sentence). One left-to-right scan over the text.
+_BOUNDARY = re.compile(r"\n[ \t]*\n\s*|[.!?…]+[\"'»”)\]]*\s+")
+_WORD = re.compile(r"\S+")
+
+
+class SemanticChunker:
+    """Pack sentences into chunks of at most ``max_tokens`` with a sentence-level overlap.
+
+    Text is scanned once: sentences are accumulated until the next one would not fit,
+    and a chunk is closed early at a paragraph break once it holds ``min_tokens``. The
+    trailing sentences of a closed chunk (up to ``overlap_tokens``) open the next one.
+    A sentence longer than the budget is cut between words, a word longer than the
+    budget between characters. With ``dedupe`` a part repeating an earlier part of
+    the same document is dropped.
+
+    Called with a Chunk it yields ``{id}::part{n}`` chunks with their own copies of
+    payload and metadata; text that fits in one chunk comes back unchanged, and a
+    single part always keeps the original id.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_tokens: int = 512,
+        overlap_tokens: int = 64,
+        min_tokens: int | None = None,
+        token_counter: TokenCounter = approximate_tokens,
+        dedupe: bool = True,
+    ) -> None:
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be in [0, max_tokens)")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = max_tokens // 2 if min_tokens is None else min_tokens
+        self._count = token_counter
+        self._dedupe = dedupe
+
+    def __call__(self, chunk: Chunk) -> Iterator[Chunk]:
+        parts = self.split(chunk.text)
+        first = next(parts, None)
+        second = next(parts, None)
+        if second is None:
+            # A single part keeps the record's id. Its text replaces the original only
+            # when it differs by more than whitespace (a repeated part was dropped).
+            if first is None or first.split() == chunk.text.split():
+                yield chunk
+            else:
+                yield chunk.model_copy(
+                    update={"text": first, "payload": dict(chunk.payload), "metadata": dict(chunk.metadata)}
+                )
+            return
+        yield _part(chunk, 0, first)
+        yield _part(chunk, 1, second)
+        for idx, text in enumerate(parts, start=2):
+            yield _part(chunk, idx, text)
+
+    def split(self, text: str) -> Iterator[str]:
+        """Yield the chunk texts of ``text`` in order."""
+
+        seen: set[bytes] = set()
+        window: deque[tuple[str, int, bool]] = deque()
+        tokens = 0
+        fresh = 0  # segments in the window that are not part of an emitted chunk yet
+        for segment, count, paragraph_end in self._segments(text):
+            if window and tokens + count > self.max_tokens:
+                if fresh:
+                    yield from self._emit(window, seen)
+                    fresh = 0
+                tokens = self._keep_overlap(window, count)
+            window.append((segment, count, paragraph_end))
+            tokens += count
+            fresh += 1
+            if paragraph_end and tokens >= self.min_tokens:
+                yield from self._emit(window, seen)
+                fresh = 0
+                tokens = self._keep_overlap(window, 0)
+        if fresh:
+            yield from self._emit(window, seen)
+
+    def _segments(self, text: str) -> Iterator[tuple[str, int, bool]]:
+        start = 0
+        for match in _BOUNDARY.finditer(text):
+            yield from self._fit(text[start : match.end()].strip(), match.group().count("\n") >= 2)
+            start = match.end()
+        yield from self._fit(text[start:].strip(), True)
+
+    def _fit(self, sentence: str, paragraph_end: bool) -> Iterator[tuple[str, int, bool]]:
+        if not sentence:
+            return
+        count = self._count(sentence)
+        if count <= self.max_tokens:
+            yield sentence, count, paragraph_end
+            return
+        # The sentence alone exceeds the budget: fall back to word windows. A window is
+        # sized from the sentence's tokens per character, then corrected word by word
+        # against the real count, so each word is measured a bounded number of times.
+        words = _WORD.findall(sentence)
+        per_word = max(1, len(words) * self.max_tokens // count)
+        start = 0
+        while start < len(words):
+            if self._count(words[start]) > self.max_tokens:
+                yield from self._cut(words[start])
+                start += 1
+                continue
+            end = min(len(words), start + per_word)
+            while end > start + 1 and self._count(" ".join(words[start:end])) > self.max_tokens:
+                end -= 1
+            while end < len(words) and self._count(" ".join(words[start : end + 1])) <= self.max_tokens:
+                end += 1
+            yield self._measured(" ".join(words[start:end]), paragraph_end and end == len(words))
+            start = end
+
+    def _measured(self, text: str, paragraph_end: bool) -> tuple[str, int, bool]:
+        return text, self._count(text), paragraph_end
+
+    def _cut(self, word: str) -> Iterator[tuple[str, int, bool]]:
+        step = max(1, len(word) * self.max_tokens // max(1, self._count(word)))
+        for start in range(0, len(word), step):
+            yield self._measured(word[start : start + step], False)
+
+    def _emit(self, window: deque[tuple[str, int, bool]], seen: set[bytes]) -> Iterator[str]:
+        pieces: list[str] = []
+        for segment, _, paragraph_end in window:
+            pieces.append(segment)
+            pieces.append("\n\n" if paragraph_end else " ")
+        text = "".join(pieces[:-1])
+        if self._dedupe:
+            digest = hashlib.blake2b(" ".join(text.split()).encode("utf-8"), digest_size=16).digest()
+            if digest in seen:
+                return
+            seen.add(digest)
+        yield text
+
+    def _keep_overlap(self, window: deque[tuple[str, int, bool]], incoming: int) -> int:
+        """Drop emitted sentences from ``window`` except a tail that fits the overlap budget."""
+
+        budget = min(self.overlap_tokens, self.max_tokens - incoming)
+        kept = 0
+        tail: list[tuple[str, int, bool]] = []
+        while window and kept + window[-1][1] <= budget:
+            segment = window.pop()
+            tail.append(segment)
+            kept += segment[1]
+        window.clear()
+        window.extend(reversed(tail))
+        return kept
+
+
+def _part(chunk: Chunk, idx: int, text: str) -> Chunk:
+    return Chunk(
+        id=f"{chunk.id}::part{idx}",
+        domain=chunk.domain,
+        text=text,
+        payload=dict(chunk.payload),
+        metadata=dict(chunk.metadata),
+    )
@@ -5,7 +5,7 @@ from __future__ import annotations
 import asyncio
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 import typer
 
@@ -15,17 +15,29 @@ except Exception:  # pragma: no cover
     psycopg = None  # type: ignore[assignment]
 
 from .domain import ArtCard, KnowledgeItem, NpcProfile, SceneState
-from .embedding import OpenAIEmbeddingProvider, TokenFrequencyEmbeddingProvider
-from .ingest import build_runtime_items, load_knowledge_items_from_yaml
+from .embedding import HashingEmbeddingProvider, OpenAIEmbeddingProvider, TokenFrequencyEmbeddingProvider
+from .embedding_cache import with_embedding_cache
+from .ingest import build_runtime_items, iter_knowledge_items_from_yaml, load_knowledge_items_from_yaml
+from .pipeline import IngestCheckpoint, IngestProgress, StreamingIngestPipeline
 from .stores.pgvector_store import InMemoryVectorStore, PgVectorWrapper
 from .types import Chunk
+from .vector_store import PgVectorStore, VectorIndexSpec, quantization_report
 
 app = typer.Typer(help="Memory37 CLI")
 
 
-def _provider_from_flags(use_openai: bool, openai_model: Optional[str]) -> TokenFrequencyEmbeddingProvider | OpenAIEmbeddingProvider:
+def _provider_from_flags(
+    use_openai: bool,
+    openai_model: Optional[str],
+    local_embedder: str = "token-frequency",
+    dimension: int = 1536,
+) -> TokenFrequencyEmbeddingProvider | HashingEmbeddingProvider | OpenAIEmbeddingProvider:
     if use_openai:
         return OpenAIEmbeddingProvider(model=openai_model)
+    if local_embedder == "hashing":
+        return HashingEmbeddingProvider(dimension=dimension)
+    if local_embedder != "token-frequency":
+        raise typer.BadParameter("local-embedder must be token-frequency or hashing")
     return TokenFrequencyEmbeddingProvider()
 
 
@@ -37,12 +49,20 @@ def _build_store(
     dry_run: bool,
     provider,
     embedding_model: Optional[str],
+    bulk_batch_size: Optional[int] = None,
 ):
     if dry_run or not dsn or psycopg is None:
         if dsn and psycopg is None and not dry_run:
             typer.echo("psycopg не установлен, используем in-memory store")
         return InMemoryVectorStore(embedding_provider=provider, embedding_model=embedding_model)
-    return PgVectorWrapper(lambda: psycopg.connect(dsn), table=table, dimension=dimension, embedding_provider=provider, embedding_model=embedding_model)
+    return PgVectorWrapper(
+        lambda: psycopg.connect(dsn),
+        table=table,
+        dimension=dimension,
+        embedding_provider=provider,
+        embedding_model=embedding_model,
+        bulk_batch_size=bulk_batch_size,
+    )
 
 
 async def _ingest_items(store, items: list[KnowledgeItem]) -> None:
@@ -63,18 +83,9 @@ async def _ingest_items(store, items: list[KnowledgeItem]) -> None:
 
 async def _search(store, query: str, top_k: int, *, version_id: Optional[str]) -> list[tuple[str, float, str]]:
     domains = ["scene", "npc", "lore", "srd", "art"]
-    results = []
     filters = {"knowledge_version_id": version_id} if version_id else {}
-    for domain in domains:
-        try:
-            scores = await store.search(domain=domain, query=query, k_vector=top_k, filters=filters)
-            for score in scores:
-                snippet = score.chunk.text[:160].replace("\n", " ")
-                results.append((score.chunk.id, score.score, snippet))
-        except Exception:
-            continue
-    results.sort(key=lambda r: r[1], reverse=True)
-    return results[:top_k]
+    scores = await store.search_domains(domains=domains, query=query, k=top_k, filters=filters)
+    return [(score.chunk.id, score.score, score.chunk.text[:160].replace("\n", " ")) for score in scores]
 
 
 @app.command()
@@ -86,19 +97,84 @@ def ingest_file(
     dry_run: bool = typer.Option(False, help="Use in-memory store instead of database"),
     use_openai: bool = typer.Option(False, "--use-openai", help="Use OpenAI embeddings"),
     openai_embedding_model: Optional[str] = typer.Option(None, help="Override OpenAI embedding model"),
+    local_embedder: str = typer.Option("token-frequency", help="Embedder without OpenAI: token-frequency or hashing (uses --dimension)"),
     knowledge_version_id: Optional[str] = typer.Option(None, "--knowledge-version-id", help="Knowledge version id for ingested items"),
+    embedding_cache: Optional[Path] = typer.Option(None, "--embedding-cache", envvar="MEMORY37_EMBEDDING_CACHE", help="SQLite file with cached embeddings"),
+    bulk_batch_size: int = typer.Option(1000, "--bulk-batch-size", help="COPY batch size for pgvector ingest (0 = row-by-row INSERT)"),
+    batch_size: int = typer.Option(256, "--batch-size", help="Chunks per embed/upsert micro-batch"),
+    chunk_tokens: int = typer.Option(0, "--chunk-tokens", help="Split entries on sentence boundaries into parts of this many tokens (0 = keep whole)"),
+    chunk_overlap: int = typer.Option(64, "--chunk-overlap", help="Tokens of trailing sentences repeated at the start of the next part"),
+    embed_concurrency: int = typer.Option(2, "--embed-concurrency", help="Embedding batches in flight"),
+    checkpoint: Optional[Path] = typer.Option(None, "--checkpoint", help="JSON file to resume an interrupted ingest from"),
+    progress: bool = typer.Option(False, "--progress", help="Print throughput after every batch"),
+    incremental: bool = typer.Option(False, "--incremental", help="Embed and write only new/changed items of --knowledge-version-id, delete removed ones"),
+    diff_only: bool = typer.Option(False, "--diff-only", help="Only report new/changed/unchanged/removed counts, write nothing"),
+    source_id: Optional[str] = typer.Option(None, "--source-id", help="Tag rows with this source for --incremental (default: file name)"),
 ) -> None:
-    """Load knowledge items from YAML file and ingest into vector store."""
-
-    items = load_knowledge_items_from_yaml(path, knowledge_version_id=knowledge_version_id)
-    provider = _provider_from_flags(use_openai or bool(os.environ.get("OPENAI_API_KEY")), openai_embedding_model)
+    """Stream knowledge items from YAML file into vector store (read, chunk, embed, upsert overlap)."""
+
+    if not path.exists():
+        raise typer.BadParameter(f"Knowledge source not found: {path}")
+    if (incremental or diff_only) and not knowledge_version_id:
+        raise typer.BadParameter("--incremental and --diff-only require --knowledge-version-id")
+    provider = _provider_from_flags(
+        use_openai or bool(os.environ.get("OPENAI_API_KEY")), openai_embedding_model, local_embedder, dimension
+    )
     embedding_model = openai_embedding_model if isinstance(provider, OpenAIEmbeddingProvider) else None
-
-    store = _build_store(dsn=dsn, table=table, dimension=dimension, dry_run=dry_run, provider=provider, embedding_model=embedding_model)
+    provider = with_embedding_cache(provider, embedding_cache)
+
+    store = _build_store(
+        dsn=dsn,
+        table=table,
+        dimension=dimension,
+        dry_run=dry_run,
+        provider=provider,
+        embedding_model=embedding_model,
+        bulk_batch_size=bulk_batch_size or None,
+    )
     if dry_run:
         typer.echo("Running in dry-run mode (memory store).")
-    asyncio.run(_ingest_items(store, items))
-    typer.echo(f"Ingested {len(items)} knowledge items.")
+    resume = IngestCheckpoint.load(checkpoint, source=str(path.resolve())) if checkpoint else None
+    if resume is not None and resume.offset:
+        typer.echo(f"Resuming after {resume.offset} items ({resume.chunks} chunks) from {checkpoint}")
+    pipeline = StreamingIngestPipeline(
+        store,
+        provider,
+        embedding_model=embedding_model,
+        batch_size=batch_size,
+        embed_concurrency=embed_concurrency,
+        max_tokens=chunk_tokens or None,
+        overlap_tokens=chunk_overlap,
+        checkpoint=resume,
+        on_progress=_echo_progress if progress else None,
+        incremental=incremental,
+        knowledge_version_id=knowledge_version_id,
+        source_id=(source_id or path.name) if incremental or diff_only else None,
+        dry_run=diff_only,
+    )
+    stats = asyncio.run(pipeline.run(iter_knowledge_items_from_yaml(path, knowledge_version_id=knowledge_version_id)))
+    if incremental or diff_only:
+        prefix = "Would apply" if diff_only else "Applied"
+        typer.echo(
+            f"{prefix}: {stats.new} new, {stats.changed} changed, {stats.unchanged} unchanged, {stats.deleted} removed."
+        )
+        if stats.refreshed:
+            typer.echo(f"TTL refreshed for {stats.refreshed} unchanged items.")
+        if diff_only:
+            return
+    if resume is not None:
+        resume.clear()
+    typer.echo(
+        f"Ingested {stats.items} knowledge items ({stats.upserted} chunks, "
+        f"{stats.chunks_per_second:.0f} chunks/s)."
+    )
+
+
+def _echo_progress(stats: IngestProgress) -> None:
+    typer.echo(
+        f"  {stats.upserted} chunks in {stats.batches} batches, {stats.chunks_per_second:.0f} chunks/s "
+        f"(embed {stats.embed_seconds:.1f}s, upsert {stats.upsert_seconds:.1f}s)"
+    )
 
 
 @app.command()
@@ -112,6 +188,9 @@ def ingest_runtime_snapshot(
     dry_run: bool = typer.Option(True, help="Default to dry run for runtime snapshots"),
     use_openai: bool = typer.Option(False, "--use-openai", help="Use OpenAI embeddings"),
     openai_embedding_model: Optional[str] = typer.Option(None, help="Override OpenAI embedding model"),
+    local_embedder: str = typer.Option("token-frequency", help="Embedder without OpenAI: token-frequency or hashing (uses --dimension)"),
+    embedding_cache: Optional[Path] = typer.Option(None, "--embedding-cache", envvar="MEMORY37_EMBEDDING_CACHE", help="SQLite file with cached embeddings"),
+    bulk_batch_size: int = typer.Option(1000, "--bulk-batch-size", help="COPY batch size for pgvector ingest (0 = row-by-row INSERT)"),
 ) -> None:
     """Load runtime snapshots (scenes/npcs/art) and ingest."""
 
@@ -133,9 +212,20 @@ def ingest_runtime_snapshot(
 
     items = build_runtime_items(scenes=scenes, npcs=npcs, art_cards=art_cards)
 
-    provider = _provider_from_flags(use_openai or bool(os.environ.get("OPENAI_API_KEY")), openai_embedding_model)
+    provider = _provider_from_flags(
+        use_openai or bool(os.environ.get("OPENAI_API_KEY")), openai_embedding_model, local_embedder, dimension
+    )
     embedding_model = openai_embedding_model if isinstance(provider, OpenAIEmbeddingProvider) else None
-    store = _build_store(dsn=dsn, table=table, dimension=dimension, dry_run=dry_run, provider=provider, embedding_model=embedding_model)
+    provider = with_embedding_cache(provider, embedding_cache)
+    store = _build_store(
+        dsn=dsn,
+        table=table,
+        dimension=dimension,
+        dry_run=dry_run,
+        provider=provider,
+        embedding_model=embedding_model,
+        bulk_batch_size=bulk_batch_size or None,
+    )
     if dry_run:
         typer.echo("Running in dry-run mode (memory store).")
     asyncio.run(_ingest_items(store, items))
@@ -153,12 +243,15 @@ def search(
     dry_run: bool = typer.Option(False, help="Use in-memory store even if DSN provided"),
     use_openai: bool = typer.Option(False, "--use-openai", help="Use OpenAI embeddings"),
     openai_embedding_model: Optional[str] = typer.Option(None, help="Override OpenAI embedding model"),
+    local_embedder: str = typer.Option("token-frequency", help="Embedder without OpenAI: token-frequency or hashing (uses --dimension)"),
     ingest: bool = typer.Option(False, help="Ingest knowledge file before search"),
     knowledge_version_id: Optional[str] = typer.Option(None, "--knowledge-version-id", help="Knowledge version id for ingested items"),
 ) -> None:
     """Query knowledge store and display top matching items."""
 
-    provider = _provider_from_flags(use_openai or bool(os.environ.get("OPENAI_API_KEY")), openai_embedding_model)
+    provider = _provider_from_flags(
+        use_openai or bool(os.environ.get("OPENAI_API_KEY")), openai_embedding_model, local_embedder, dimension
+    )
     embedding_model = openai_embedding_model if isinstance(provider, OpenAIEmbeddingProvider) else None
 
     store = _build_store(dsn=dsn, table=table, dimension=dimension, dry_run=dry_run, provider=provider, embedding_model=embedding_model)
@@ -179,6 +272,122 @@ def search(
         typer.echo(f"{item_id}\t{score:.3f}\t{snippet}")
 
 
+@app.command()
+def create_index(
+    dsn: str = typer.Option(..., "--dsn", envvar="MEMORY37_DATABASE_URL", help="PostgreSQL DSN"),
+    table: str = typer.Option("memory37_vectors", help="Vector table name"),
+    dimension: int = typer.Option(1536, help="Vector dimension"),
+    method: str = typer.Option("hnsw", help="Index method: hnsw or ivfflat"),
+    distance: str = typer.Option("inner_product", help="Distance used by queries: inner_product or cosine"),
+    m: int = typer.Option(16, help="HNSW: max connections per layer"),
+    ef_construction: int = typer.Option(64, help="HNSW: candidate list size during build"),
+    lists: int = typer.Option(100, help="IVFFlat: number of lists"),
+    concurrently: bool = typer.Option(True, help="Build with CREATE INDEX CONCURRENTLY"),
+    domain: Optional[str] = typer.Option(None, help="Index only this domain (its partition or a partial index)"),
+    partition: List[str] = typer.Option([], "--partition", help="Domains with their own partition (repeatable)"),
+    text: bool = typer.Option(False, "--text", help="Build the GIN full-text index for keyword search instead"),
+) -> None:
+    """Create (or finish an interrupted build of) the ANN or full-text index on the vector table."""
+
+    if psycopg is None:
+        raise typer.BadParameter("psycopg is required to manage pgvector indexes")
+    if method not in ("hnsw", "ivfflat"):
+        raise typer.BadParameter("method must be hnsw or ivfflat")
+    store = PgVectorStore(
+        lambda: psycopg.connect(dsn),
+        table=table,
+        dimension=dimension,
+        distance=distance,
+        partitions=partition or None,
+    )
+    try:
+        if text:
+            stats = store.create_text_index(concurrently=concurrently, domain=domain)
+        else:
+            stats = store.create_vector_index(
+                VectorIndexSpec(method=method, m=m, ef_construction=ef_construction, lists=lists),  # type: ignore[arg-type]
+                concurrently=concurrently,
+                domain=domain,
+            )
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    built = f", built in {stats.build_seconds:.1f}s" if stats.build_seconds is not None else " (already present)"
+    typer.echo(f"{stats.name}\t{stats.method}\t{stats.size_bytes} bytes{built}")
+
+
+@app.command()
+def index_stats(
+    dsn: str = typer.Option(..., "--dsn", envvar="MEMORY37_DATABASE_URL", help="PostgreSQL DSN"),
+    table: str = typer.Option("memory37_vectors", help="Vector table name"),
+) -> None:
+    """List ANN indexes on the vector table with size and validity."""
+
+    if psycopg is None:
+        raise typer.BadParameter("psycopg is required to manage pgvector indexes")
+    store = PgVectorStore(lambda: psycopg.connect(dsn), table=table)
+    indexes = store.vector_index_stats()
+    if not indexes:
+        typer.echo("No vector indexes")
+        raise typer.Exit(code=0)
+    for stats in indexes:
+        state = "valid" if stats.valid else "INVALID"
+        typer.echo(f"{stats.name}\t{stats.method}\t{stats.size_bytes} bytes\t{state}")
+
+
+@app.command()
+def migrate_schema(
+    dsn: str = typer.Option(..., "--dsn", envvar="MEMORY37_DATABASE_URL", help="PostgreSQL DSN"),
+    table: str = typer.Option("memory37_vectors", help="Vector table name"),
+    dimension: int = typer.Option(1536, help="Vector dimension"),
+    partition: List[str] = typer.Option([], "--partition", help="Domains with their own partition (repeatable)"),
+    batch_size: int = typer.Option(10_000, help="Rows per transaction of the domain backfill and of partition moves"),
+) -> None:
+    """Add the domain column, backfill it and (with --partition) partition the table by domain."""
+
+    if psycopg is None:
+        raise typer.BadParameter("psycopg is required to migrate the vector table")
+    store = PgVectorStore(lambda: psycopg.connect(dsn), table=table, dimension=dimension, partitions=partition or None)
+    stats = store.migrate_schema(batch_size=batch_size)
+    typer.echo(
+        f"backfilled {stats.backfilled_rows} rows, copied {stats.copied_rows} rows, "
+        f"partitions created: {', '.join(stats.created_partitions) or 'none'}"
+    )
+
+
+@app.command("quantization-report")
+def report_quantization(
+    knowledge_file: Optional[Path] = typer.Option(None, help="YAML knowledge file to embed with the hashing embedder (synthetic vectors otherwise)"),
+    count: int = typer.Option(20_000, help="Synthetic vectors when no knowledge file is given"),
+    dimension: int = typer.Option(1536, help="Vector dimension"),
+    queries: int = typer.Option(100, help="Number of queries"),
+    top_k: int = typer.Option(10, help="Recall is measured at this k"),
+    seed: int = typer.Option(0, help="Random seed for synthetic data and query sampling"),
+) -> None:
+    """Compare memory per vector and recall@k of float32/float16/int8 in-memory storage."""
+
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    if knowledge_file is not None:
+        texts = [item.content for item in load_knowledge_items_from_yaml(knowledge_file)]
+        if not texts:
+            raise typer.BadParameter("knowledge file has no items")
+        vectors = HashingEmbeddingProvider(dimension=dimension).embed_matrix(texts)
+    else:
+        # Clustered data: neighbours are close, as with real embeddings of related chunks.
+        centers = rng.normal(size=(max(1, count // 400), dimension))
+        vectors = centers[rng.integers(0, len(centers), count)] + 0.6 * rng.normal(size=(count, dimension))
+    picks = rng.integers(0, len(vectors), queries)
+    probes = vectors[picks] + 0.3 * rng.normal(size=(queries, vectors.shape[1]))
+    typer.echo(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {queries} queries, recall@{top_k}")
+    for report in quantization_report(vectors, probes, top_k=top_k):
+        mode = report.precision + (f"+{report.rescore_precision} rescore" if report.rescore_precision else "")
+        typer.echo(
+            f"{mode:<22}\t{report.bytes_per_vector:8.0f} B/vector\t"
+            f"{report.vector_bytes / 2**20:8.1f} MiB\trecall {report.recall:.3f}"
+        )
+
+
 def main() -> None:
     app()
 
@@ -16,7 +16,11 @@ class EmbeddingConfig(BaseModel):
 
 
 class RetrievalConfig(BaseModel):
-    """Настройки ретрива документов."""
+    """Настройки ретрива документов.
+
+    ``k_vector`` — минимум dense-кандидатов домена; в hybrid-режиме ветки сливаются
+    через RRF (``fuse: rrf``) или, без ``fuse``, линейным alpha-смешиванием оценок.
+    """
 
     mode: Literal["vector", "hybrid"]
     k_vector: Annotated[int, Field(ge=1, le=32)]
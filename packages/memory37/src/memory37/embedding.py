@@ -2,17 +2,31 @@
 
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from math import sqrt
-from typing import Sequence
+from typing import Callable, Sequence
 
+import numpy as np
+
+from .lexical import tokenize
 from .vector_store import EmbeddingProvider
 
 try:  # pragma: no cover - optional dependency
-    from openai import OpenAI  # type: ignore
+    from openai import AsyncOpenAI, OpenAI  # type: ignore
 except ImportError:  # pragma: no cover - optional dependency
+    AsyncOpenAI = None  # type: ignore
     OpenAI = None  # type: ignore
 
+logger = logging.getLogger(__name__)
+
 
 class TokenFrequencyEmbeddingProvider(EmbeddingProvider):
     """Simple embedding provider based on token frequency (for local use/testing)."""
@@ -20,6 +34,10 @@ class TokenFrequencyEmbeddingProvider(EmbeddingProvider):
     def __init__(self, *, vocab_limit: int = 64) -> None:
         self.vocab_limit = vocab_limit
 
+    @property
+    def model_name(self) -> str:
+        return f"token-frequency-{self.vocab_limit}"
+
     def embed(self, texts: Sequence[str], *, model: str | None = None) -> list[list[float]]:
         embeddings: list[list[float]] = []
         for text in texts:
@@ -35,8 +53,168 @@ class TokenFrequencyEmbeddingProvider(EmbeddingProvider):
         return embeddings
 
 
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic signed feature hashing over word and character n-grams.
+
+    Every feature (word n-grams and character n-grams of ``<word>``) is hashed with
+    CRC32 into one of ``dimension`` buckets with a hash-derived sign, so the same
+    word always lands in the same position and texts sharing words or word pieces
+    get a positive cosine similarity. The batch is accumulated into one matrix with
+    ``np.bincount`` and L2-normalised; per-word features are memoised per provider.
+    Intended for load tests and offline environments, not as a semantic model.
+    """
+
+    _MAX_CACHED_FEATURES = 500_000
+    _CHUNK = 2048
+
+    def __init__(
+        self,
+        *,
+        dimension: int = 1536,
+        word_ngrams: int = 2,
+        char_ngrams: tuple[int, int] = (3, 5),
+        char_weight: float = 0.5,
+    ) -> None:
+        if dimension <= 0:
+            raise ValueError("dimension must be positive")
+        if word_ngrams < 1 or char_ngrams[0] < 1 or char_ngrams[0] > char_ngrams[1]:
+            raise ValueError("invalid n-gram range")
+        self.dimension = dimension
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+        self.char_weight = char_weight
+        self._buckets: dict[str, int] = {}
+        self._words: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def model_name(self) -> str:
+        low, high = self.char_ngrams
+        return f"hashing-{self.dimension}-w{self.word_ngrams}-c{low}{high}"
+
+    def embed(self, texts: Sequence[str], *, model: str | None = None) -> list[list[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        """Embeddings of ``texts`` as a ``(len(texts), dimension)`` float32 matrix."""
+
+        output = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), self._CHUNK):
+            output[start : start + self._CHUNK] = self._embed_chunk(texts[start : start + self._CHUNK])
+        return output
+
+    def _embed_chunk(self, texts: Sequence[str]) -> np.ndarray:
+        buckets: list[np.ndarray] = []
+        weights: list[np.ndarray] = []
+        lengths: list[int] = []
+        word_features = self._word_features
+        bucket = self._bucket
+        for text in texts:
+            words = tokenize(text)
+            length = 0
+            for word in words:
+                word_buckets, word_weights = word_features(word)
+                buckets.append(word_buckets)
+                weights.append(word_weights)
+                length += len(word_buckets)
+            for n in range(2, self.word_ngrams + 1):
+                ngrams = [bucket(" ".join(words[idx : idx + n])) for idx in range(len(words) - n + 1)]
+                if ngrams:
+                    buckets.append(np.asarray(ngrams, dtype=np.int64))
+                    weights.append(np.ones(len(ngrams)))
+                    length += len(ngrams)
+            lengths.append(length)
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float64)
+        if buckets:
+            signed = np.concatenate(buckets)
+            negative = signed < 0
+            flat = np.repeat(np.arange(len(texts), dtype=np.int64), lengths) * self.dimension
+            flat += np.where(negative, -signed - 1, signed)
+            values = np.where(negative, -1.0, 1.0) * np.concatenate(weights)
+            matrix = np.bincount(flat, weights=values, minlength=matrix.size).reshape(matrix.shape)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def _word_features(self, word: str) -> tuple[np.ndarray, np.ndarray]:
+        """Signed buckets and weights of a word and its character n-grams (memoised)."""
+
+        cached = self._words.get(word)
+        if cached is not None:
+            return cached
+        features = [(word, 1.0)]
+        if self.char_weight > 0:
+            low, high = self.char_ngrams
+            padded = f"<{word}>"
+            for n in range(low, min(high, len(padded)) + 1):
+                features.extend(("#" + padded[idx : idx + n], self.char_weight) for idx in range(len(padded) - n + 1))
+        cached = (
+            np.asarray([self._bucket(feature, memoize=False) for feature, _ in features], dtype=np.int64),
+            np.asarray([weight for _, weight in features]),
+        )
+        if len(self._words) >= self._MAX_CACHED_FEATURES:
+            self._words.clear()
+        self._words[word] = cached
+        return cached
+
+    def _bucket(self, feature: str, *, memoize: bool = True) -> int:
+        """Signed bucket: ``index`` for a positive sign, ``-index - 1`` for a negative one."""
+
+        bucket = self._buckets.get(feature) if memoize else None
+        if bucket is None:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            index = (digest & 0x7FFFFFFF) % self.dimension
+            bucket = index if digest >> 31 else -index - 1
+            if memoize:
+                if len(self._buckets) >= self._MAX_CACHED_FEATURES:
+                    self._buckets.clear()
+                self._buckets[feature] = bucket
+        return bucket
+
+
+@dataclass
+class EmbeddingBatchStats:
+    """Counters of OpenAIEmbeddingProvider requests."""
+
+    texts: int = 0
+    tokens: int = 0
+    requests: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.texts / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds > 0 else 0.0
+
+
+def approximate_tokens(text: str) -> int:
+    """Conservative token estimate without a tokenizer (about 3 UTF-8 bytes per token)."""
+
+    return max(1, len(text.encode("utf-8")) // 3)
+
+
 class OpenAIEmbeddingProvider(EmbeddingProvider):
-    """Embedding provider backed by OpenAI API."""
+    """Embedding provider backed by OpenAI API.
+
+    Inputs are split into requests of at most ``max_batch_items`` texts and
+    ``max_batch_tokens`` estimated tokens (``token_counter``, by default
+    ``approximate_tokens``); up to ``max_concurrency`` requests are in flight at
+    once. Rate limits (429), server errors (5xx) and connection errors are retried
+    with exponential backoff and full jitter, honouring ``Retry-After``; other 4xx
+    fail at once. The SDK clients are built with ``max_retries=0`` so this loop is
+    the only retry layer. With an injected ``token_counter`` a text over
+    ``max_input_tokens`` (the model's per-input limit) is rejected before any request
+    is sent; the byte-based default estimate overshoots real token counts, so without
+    one an oversize text is only logged and left for the API to judge. Vectors are
+    returned in input order; ``stats`` accumulates throughput counters.
+
+    ``aembed`` uses the async client, so callers on an event loop do not block on
+    the HTTP round-trip. With an injected sync ``client`` and no ``async_client``
+    it runs ``embed`` in a worker thread instead.
+    """
 
     def __init__(
         self,
@@ -44,7 +222,19 @@ class OpenAIEmbeddingProvider(EmbeddingProvider):
         api_key: str | None = None,
         model: str | None = None,
         client: object | None = None,
+        async_client: object | None = None,
+        max_batch_items: int = 2048,
+        max_batch_tokens: int = 250_000,
+        max_input_tokens: int | None = 8191,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 30.0,
+        token_counter: Callable[[str], int] | None = None,
     ) -> None:
+        if max_batch_items <= 0 or max_batch_tokens <= 0 or max_concurrency <= 0:
+            raise ValueError("batch limits and max_concurrency must be positive")
+        self._async_client = async_client
         if client is not None:
             self._client = client
         else:
@@ -53,16 +243,169 @@ class OpenAIEmbeddingProvider(EmbeddingProvider):
             api_key = api_key or os.environ.get("OPENAI_API_KEY")
             if not api_key:
                 raise RuntimeError("OPENAI_API_KEY is not configured")
-            self._client = OpenAI(api_key=api_key)
+            self._client = OpenAI(api_key=api_key, max_retries=0)
+            if async_client is None and AsyncOpenAI is not None:
+                self._async_client = AsyncOpenAI(api_key=api_key, max_retries=0)
         self._model = model or os.environ.get("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._token_counter = token_counter or approximate_tokens
+        self._exact_tokens = token_counter is not None
+        self._stats_lock = threading.Lock()
+        self.stats = EmbeddingBatchStats()
+
+    @property
+    def model_name(self) -> str:
+        return self._model
 
     def embed(self, texts: Sequence[str], *, model: str | None = None) -> list[list[float]]:
         target_model = model or self._model
-        response = self._client.embeddings.create(model=target_model, input=list(texts))
+        batches = self._batches(texts)
+        started = time.perf_counter()
+        inputs = [[texts[idx] for idx in batch] for batch in batches]
+        if len(inputs) <= 1 or self.max_concurrency == 1:
+            results = [self._request(target_model, batch) for batch in inputs]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(inputs))) as pool:
+                results = list(pool.map(lambda batch: self._request(target_model, batch), inputs))
+        return self._collect(texts, batches, results, started)
+
+    async def aembed(self, texts: Sequence[str], *, model: str | None = None) -> list[list[float]]:
+        if self._async_client is None:
+            return await asyncio.to_thread(self.embed, texts, model=model)
+        target_model = model or self._model
+        batches = self._batches(texts)
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch: list[str]) -> list[list[float]]:
+            async with semaphore:
+                return await self._arequest(target_model, batch)
+
+        results = await asyncio.gather(*(run([texts[idx] for idx in batch]) for batch in batches))
+        return self._collect(texts, batches, list(results), started)
+
+    def _batches(self, texts: Sequence[str]) -> list[list[int]]:
+        """Indices of ``texts`` grouped into requests within the item and token limits."""
+
+        batches: list[list[int]] = []
+        current: list[int] = []
+        budget = 0
+        for idx, text in enumerate(texts):
+            tokens = self._token_counter(text)
+            if self.max_input_tokens is not None and tokens > self.max_input_tokens:
+                if self._exact_tokens:
+                    raise ValueError(
+                        f"Input {idx} has {tokens} tokens, over the per-input limit of {self.max_input_tokens}; "
+                        "split it into chunks before embedding"
+                    )
+                logger.warning(
+                    "Input %d has ~%d estimated tokens, over the per-input limit of %d; the API may reject it",
+                    idx,
+                    tokens,
+                    self.max_input_tokens,
+                )
+            if current and (len(current) >= self.max_batch_items or budget + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, budget = [], 0
+            current.append(idx)
+            budget += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _request(self, model: str, batch: list[str]) -> list[list[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._client.embeddings.create(model=model, input=list(batch))
+                return self._vectors(response, len(batch))
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    async def _arequest(self, model: str, batch: list[str]) -> list[list[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._async_client.embeddings.create(model=model, input=list(batch))
+                return self._vectors(response, len(batch))
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def _retry_delay(self, exc: Exception, attempt: int) -> float | None:
+        """Backoff before the next attempt, or ``None`` when ``exc`` is final."""
+
+        if attempt >= self.max_retries or not _is_retryable(exc):
+            return None
+        with self._stats_lock:
+            self.stats.retries += 1
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2**attempt))
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.retry_max_delay))
+        logger.warning("OpenAI embeddings: %s, retry %d in %.2fs", exc, attempt + 1, delay)
+        return delay
+
+    def _collect(
+        self,
+        texts: Sequence[str],
+        batches: list[list[int]],
+        results: list[list[list[float]]],
+        started: float,
+    ) -> list[list[float]]:
+        vectors: list[list[float]] = [[] for _ in texts]
+        for batch, batch_vectors in zip(batches, results, strict=True):
+            for idx, vector in zip(batch, batch_vectors, strict=True):
+                vectors[idx] = vector
+        with self._stats_lock:
+            self.stats.texts += len(texts)
+            self.stats.tokens += sum(self._token_counter(text) for text in texts)
+            self.stats.requests += len(batches)
+            self.stats.seconds += time.perf_counter() - started
+        return vectors
+
+    @staticmethod
+    def _vectors(response: object, expected: int | None = None) -> list[list[float]]:
+        entries = list(response.data)  # type: ignore[attr-defined]
+        if all(getattr(entry, "index", None) is not None for entry in entries):
+            entries.sort(key=lambda entry: entry.index)
         vectors: list[list[float]] = []
-        for entry in response.data:  # type: ignore[attr-defined]
+        for entry in entries:
             vector = getattr(entry, "embedding", None)
             if vector is None:
                 raise RuntimeError("OpenAI embedding response missing 'embedding'")
             vectors.append(list(vector))
+        if expected is not None and len(vectors) != expected:
+            raise RuntimeError(f"OpenAI returned {len(vectors)} embeddings for {expected} inputs")
         return vectors
+
+
+_RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return int(status) == 429 or int(status) >= 500
+    return type(exc).__name__ in _RETRYABLE_ERRORS
+
+
+def _retry_after(exc: Exception) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
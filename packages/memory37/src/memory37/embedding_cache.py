@@ -0,0 +1,332 @@
+"""Caching decorators for embedding providers."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from .vector_store import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Canonical cache form of a text: NFC, collapsed whitespace, stripped."""
+
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def embedding_cache_key(model: str | None, text: str) -> str:
+    digest = hashlib.sha256()
+    digest.update((model or "").encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    """Counters of a caching embedding provider."""
+
+    hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.shared_hits + self.misses
+        return (self.hits + self.shared_hits) / total if total else 0.0
+
+
+class CachedEmbeddingProvider(EmbeddingProvider):
+    """LRU cache with TTL in front of another EmbeddingProvider.
+
+    Entries are keyed on ``(model, normalized text)``; when ``model`` is not passed the
+    wrapped provider's ``model_name`` is used. Memory is bounded by
+    ``max_entries``. An optional Redis client adds a tier shared between workers;
+    Redis errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        *,
+        max_entries: int = 10_000,
+        ttl_seconds: float | None = 3600.0,
+        default_model: str | None = None,
+        redis_client: Any | None = None,
+        redis_prefix: str = "memory37:embedding:",
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self._provider = provider
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._default_model = default_model or getattr(provider, "model_name", None)
+        self._redis = redis_client
+        self._redis_prefix = redis_prefix
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float | None, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = EmbeddingCacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def embed(self, texts: Sequence[str], *, model: str | None = None) -> list[list[float]]:
+        keys, found, pending = self._lookup(texts, model)
+        if pending and self._redis is not None:
+            pending = self._take_shared(found, pending, self._get_shared(pending))
+        if pending:
+            self.stats.misses += len(pending)
+            vectors = self._provider.embed(_texts_of(keys, texts, pending), model=model)
+            self._put_shared(self._take_fresh(found, pending, vectors))
+        return [list(found[key]) for key in keys]
+
+    async def aembed(self, texts: Sequence[str], *, model: str | None = None) -> list[list[float]]:
+        """Async ``embed``: misses go to the wrapped provider's ``aembed`` when it has one.
+
+        The Redis client is synchronous, so the shared tier is read and written in a thread.
+        """
+
+        keys, found, pending = self._lookup(texts, model)
+        if pending and self._redis is not None:
+            pending = self._take_shared(found, pending, await asyncio.to_thread(self._get_shared, pending))
+        if pending:
+            self.stats.misses += len(pending)
+            missing = _texts_of(keys, texts, pending)
+            aembed = getattr(self._provider, "aembed", None)
+            if aembed is not None:
+                vectors = await aembed(missing, model=model)
+            else:
+                vectors = await asyncio.to_thread(self._provider.embed, missing, model=model)
+            fresh = self._take_fresh(found, pending, vectors)
+            if self._redis is not None:
+                await asyncio.to_thread(self._put_shared, fresh)
+        return [list(found[key]) for key in keys]
+
+    def _lookup(
+        self, texts: Sequence[str], model: str | None
+    ) -> tuple[list[str], dict[str, list[float]], list[str]]:
+        """Cache keys of ``texts``, local hits and the unique keys still missing."""
+
+        cache_model = model if model is not None else self._default_model
+        keys = [embedding_cache_key(cache_model, text) for text in texts]
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            now = self._clock()
+            for key in dict.fromkeys(keys):
+                vector = self._get_local(key, now)
+                if vector is not None:
+                    found[key] = vector
+                    self.stats.hits += 1
+        return keys, found, [key for key in dict.fromkeys(keys) if key not in found]
+
+    def _take_shared(
+        self, found: dict[str, list[float]], pending: list[str], shared: dict[str, list[float]]
+    ) -> list[str]:
+        if not shared:
+            return pending
+        found.update(shared)
+        self.stats.shared_hits += len(shared)
+        self._put_local(shared)
+        return [key for key in pending if key not in shared]
+
+    def _take_fresh(
+        self, found: dict[str, list[float]], pending: list[str], vectors: Sequence[Sequence[float]]
+    ) -> dict[str, list[float]]:
+        fresh = {key: list(vector) for key, vector in zip(pending, vectors, strict=True)}
+        found.update(fresh)
+        self._put_local(fresh)
+        return fresh
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, key: str, now: float) -> list[float] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, vector = entry
+        if expires_at is not None and expires_at <= now:
+            del self._entries[key]
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return vector
+
+    def _put_local(self, vectors: dict[str, list[float]]) -> None:
+        with self._lock:
+            expires_at = self._clock() + self._ttl if self._ttl else None
+            for key, vector in vectors.items():
+                self._entries[key] = (expires_at, vector)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def _get_shared(self, keys: list[str]) -> dict[str, list[float]]:
+        try:
+            payloads = self._redis.mget([self._redis_prefix + key for key in keys])
+        except Exception as exc:  # pragma: no cover - depends on redis availability
+            logger.warning("Embedding cache: redis read failed: %s", exc)
+            return {}
+        return {
+            key: np.frombuffer(payload, dtype="<f4").tolist()
+            for key, payload in zip(keys, payloads)
+            if payload
+        }
+
+    def _put_shared(self, vectors: dict[str, list[float]]) -> None:
+        if self._redis is None or not vectors:
+            return
+        ttl = int(self._ttl) if self._ttl else None
+        try:
+            pipe = self._redis.pipeline()
+            for key, vector in vectors.items():
+                pipe.set(self._redis_prefix + key, np.asarray(vector, dtype="<f4").tobytes(), ex=ttl)
+            pipe.execute()
+        except Exception as exc:  # pragma: no cover - depends on redis availability
+            logger.warning("Embedding cache: redis write failed: %s", exc)
+
+
+def _texts_of(keys: Sequence[str], texts: Sequence[str], pending: Sequence[str]) -> list[str]:
+    """First text of each pending key, in ``pending`` order."""
+
+    text_by_key: dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        text_by_key.setdefault(key, text)
+    return [text_by_key[key] for key in pending]
+
+
+class SQLiteEmbeddingCache:
+    """Content-addressed on-disk embedding store: ``sha256(model, text) -> float32 blob``.
+
+    One SQLite file (WAL mode) survives between ingest runs, so re-importing a
+    corpus only embeds texts that changed.
+    """
+
+    _LOOKUP_BATCH = 500
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " dimension INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return int(count)
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), self._LOOKUP_BATCH):
+                batch = unique[start : start + self._LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="<f4").tolist()
+        return found
+
+    def put_many(self, vectors: dict[str, Sequence[float]]) -> None:
+        if not vectors:
+            return
+        now = time.time()
+        rows = [
+            (key, len(vector), np.asarray(vector, dtype="<f4").tobytes(), now)
+            for key, vector in vectors.items()
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "SQLiteEmbeddingCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class PersistentEmbeddingProvider(EmbeddingProvider):
+    """EmbeddingProvider that consults a SQLiteEmbeddingCache before the wrapped provider."""
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        cache: SQLiteEmbeddingCache | str | Path,
+        *,
+        default_model: str | None = None,
+    ) -> None:
+        self._provider = provider
+        self._cache = cache if isinstance(cache, SQLiteEmbeddingCache) else SQLiteEmbeddingCache(cache)
+        self._default_model = default_model or getattr(provider, "model_name", None)
+        self.stats = EmbeddingCacheStats()
+
+    @property
+    def cache(self) -> SQLiteEmbeddingCache:
+        return self._cache
+
+    def embed(self, texts: Sequence[str], *, model: str | None = None) -> list[list[float]]:
+        cache_model = model if model is not None else self._default_model
+        keys = [embedding_cache_key(cache_model, text) for text in texts]
+        found = self._cache.get_many(keys)
+        self.stats.hits += len(found)
+
+        text_by_key: dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                text_by_key.setdefault(key, text)
+        if text_by_key:
+            self.stats.misses += len(text_by_key)
+            vectors = self._provider.embed(list(text_by_key.values()), model=model)
+            fresh = {key: list(vector) for key, vector in zip(text_by_key, vectors, strict=True)}
+            self._cache.put_many(fresh)
+            found.update(fresh)
+        return [list(found[key]) for key in keys]
+
+
+def with_embedding_cache(
+    provider: EmbeddingProvider,
+    path: str | Path | None,
+    *,
+    default_model: str | None = None,
+) -> EmbeddingProvider:
+    """Wrap ``provider`` in a PersistentEmbeddingProvider when a cache path is configured."""
+
+    if not path:
+        return provider
+    return PersistentEmbeddingProvider(provider, path, default_model=default_model)
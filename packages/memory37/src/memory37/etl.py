@@ -6,6 +6,7 @@ from dataclasses import dataclass
 from typing import Iterable, Sequence
 
 from .domain import KnowledgeItem
+from .embedding_cache import PersistentEmbeddingProvider, SQLiteEmbeddingCache
 from .vector_store import EmbeddingProvider, VectorRecord, VectorStore
 
 
@@ -16,10 +17,14 @@ class ETLPipeline:
     vector_store: VectorStore
     embedding_provider: EmbeddingProvider
     embedding_model: str | None = None
+    embedding_cache: SQLiteEmbeddingCache | None = None
 
     def ingest(self, items: Sequence[KnowledgeItem]) -> None:
         texts = [item.content for item in items]
-        embeddings = self.embedding_provider.embed(texts, model=self.embedding_model)
+        provider = self.embedding_provider
+        if self.embedding_cache is not None:
+            provider = PersistentEmbeddingProvider(provider, self.embedding_cache)
+        embeddings = provider.embed(texts, model=self.embedding_model)
         records: list[VectorRecord] = []
         for item, vector in zip(items, embeddings, strict=True):
             metadata = {
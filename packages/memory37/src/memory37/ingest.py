@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, Iterator, List
 
 import yaml
 
@@ -14,6 +14,14 @@ from .domain import ArtCard, KnowledgeItem, NpcProfile, SceneState
 def load_knowledge_items_from_yaml(path: str | Path, *, knowledge_version_id: str | None = None, ttl_days: int | None = None) -> list[KnowledgeItem]:
     """Load knowledge items from YAML file with scenes, NPCs, and art sections."""
 
+    return list(iter_knowledge_items_from_yaml(path, knowledge_version_id=knowledge_version_id, ttl_days=ttl_days))
+
+
+def iter_knowledge_items_from_yaml(
+    path: str | Path, *, knowledge_version_id: str | None = None, ttl_days: int | None = None
+) -> Iterator[KnowledgeItem]:
+    """Yield knowledge items one at a time; the YAML document is parsed once, items are built lazily."""
+
     file_path = Path(path)
     if not file_path.exists():
         raise FileNotFoundError(f"Knowledge source not found: {file_path}")
@@ -22,19 +30,16 @@ def load_knowledge_items_from_yaml(path: str | Path, *, knowledge_version_id: st
     if not isinstance(data, dict):
         raise ValueError("Knowledge YAML root must be a mapping")
 
-    items: list[KnowledgeItem] = []
     expires_at = _expires_in_days(ttl_days)
-
-    for scene in data.get("scenes", []) or []:
-        items.append(_scene_to_knowledge(scene, knowledge_version_id, expires_at))
-    for npc in data.get("npcs", []) or []:
-        items.append(_npc_to_knowledge(npc, knowledge_version_id, expires_at))
-    for art in data.get("art", []) or []:
-        items.append(_art_to_knowledge(art, knowledge_version_id, expires_at))
-    for lore in data.get("lore", []) or []:
-        items.append(_lore_to_knowledge(lore, knowledge_version_id, expires_at))
-
-    return items
+    sections = (
+        ("scenes", _scene_to_knowledge),
+        ("npcs", _npc_to_knowledge),
+        ("art", _art_to_knowledge),
+        ("lore", _lore_to_knowledge),
+    )
+    for key, convert in sections:
+        for entry in data.get(key, []) or []:
+            yield convert(entry, knowledge_version_id, expires_at)
 
 
 def build_runtime_items(
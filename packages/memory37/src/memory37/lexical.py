@@ -0,0 +1,200 @@
+"""Inverted-index BM25 scoring for the lexical half of hybrid retrieval."""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field
+from heapq import nlargest
+from math import log
+from typing import Callable, Iterable
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case word tokens; punctuation is dropped, unicode letters are kept."""
+
+    return _TOKEN_RE.findall(text.lower())
+
+
+def normalize_scores(scores: dict[str, float]) -> dict[str, float]:
+    """Scale one query's BM25 scores into [0, 1] by dividing by the best score.
+
+    Raw BM25 is unbounded and grows with corpus statistics (idf, document length),
+    so it has to be normalised per query before it is blended with cosine similarity.
+    """
+
+    best = max(scores.values(), default=0.0)
+    if best <= 0.0:
+        return scores
+    return {doc_id: value / best for doc_id, value in scores.items()}
+
+
+@dataclass
+class _DomainIndex:
+    postings: dict[str, dict[str, int]] = field(default_factory=dict)
+    doc_terms: dict[str, Counter[str]] = field(default_factory=dict)
+    doc_lengths: dict[str, int] = field(default_factory=dict)
+    total_length: int = 0
+    sorted_terms: list[str] = field(default_factory=list)
+    terms_dirty: bool = False
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                self.terms_dirty = True
+            posting[doc_id] = tf
+        self.doc_terms[doc_id] = counts
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id: str) -> None:
+        counts = self.doc_terms.pop(doc_id, None)
+        if counts is None:
+            return
+        for term in counts:
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+                self.terms_dirty = True
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def expand(self, term: str, *, min_prefix: int) -> list[str]:
+        """Dictionary terms matching ``term`` exactly or, if long enough, by prefix."""
+
+        if len(term) < min_prefix:
+            return [term] if term in self.postings else []
+        if self.terms_dirty:
+            self.sorted_terms = sorted(self.postings)
+            self.terms_dirty = False
+        terms = self.sorted_terms
+        matched: list[str] = []
+        idx = bisect_left(terms, term)
+        while idx < len(terms) and terms[idx].startswith(term):
+            matched.append(terms[idx])
+            idx += 1
+        return matched
+
+
+class BM25Index:
+    """Per-domain inverted index maintained at upsert time.
+
+    Each domain keeps postings (term -> doc -> tf), document lengths and a sorted
+    term dictionary, so prefix matches are a range scan and scoring touches only
+    the posting lists of the query terms.
+    """
+
+    def __init__(self, *, k1: float = 1.2, b: float = 0.75, min_prefix: int = 3) -> None:
+        self.k1 = k1
+        self.b = b
+        self.min_prefix = min_prefix
+        self._domains: dict[str, _DomainIndex] = {}
+
+    def add(self, domain: str, doc_id: str, text: str) -> None:
+        self._domains.setdefault(domain, _DomainIndex()).add(doc_id, text)
+
+    def add_many(self, domain: str, docs: Iterable[tuple[str, str]]) -> None:
+        index = self._domains.setdefault(domain, _DomainIndex())
+        for doc_id, text in docs:
+            index.add(doc_id, text)
+
+    def remove(self, domain: str, doc_id: str) -> None:
+        index = self._domains.get(domain)
+        if index is not None:
+            index.remove(doc_id)
+
+    def contains(self, domain: str, doc_id: str) -> bool:
+        index = self._domains.get(domain)
+        return index is not None and doc_id in index.doc_lengths
+
+    def size(self, domain: str) -> int:
+        index = self._domains.get(domain)
+        return len(index.doc_lengths) if index else 0
+
+    def to_state(self) -> dict:
+        """JSON-serializable postings and document lengths (the term dictionary is rebuilt on load)."""
+
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "min_prefix": self.min_prefix,
+            "domains": {
+                domain: {"postings": index.postings, "doc_lengths": index.doc_lengths}
+                for domain, index in self._domains.items()
+            },
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "BM25Index":
+        index = cls(k1=state["k1"], b=state["b"], min_prefix=state["min_prefix"])
+        for domain, data in state["domains"].items():
+            domain_index = _DomainIndex(postings=data["postings"], doc_lengths=data["doc_lengths"])
+            domain_index.doc_terms = {doc_id: Counter() for doc_id in domain_index.doc_lengths}
+            for term, posting in domain_index.postings.items():
+                for doc_id, tf in posting.items():
+                    domain_index.doc_terms[doc_id][term] = tf
+            domain_index.total_length = sum(domain_index.doc_lengths.values())
+            domain_index.terms_dirty = True
+            index._domains[domain] = domain_index
+        return index
+
+    def score(self, domain: str, query: str, *, doc_ids: Iterable[str] | None = None) -> dict[str, float]:
+        """BM25 scores for documents matching ``query``.
+
+        When ``doc_ids`` is given only those documents are scored; each posting list is
+        then probed per candidate or walked in full, whichever is shorter.
+        """
+
+        index = self._domains.get(domain)
+        if index is None or not index.doc_lengths:
+            return {}
+        candidates = set(doc_ids) if doc_ids is not None else None
+        if candidates is not None and not candidates:
+            return {}
+
+        n_docs = len(index.doc_lengths)
+        avg_length = index.total_length / n_docs or 1.0
+        k1, b = self.k1, self.b
+        lengths = index.doc_lengths
+        scores: dict[str, float] = {}
+        for query_term in tokenize(query):
+            for term in index.expand(query_term, min_prefix=self.min_prefix):
+                posting = index.postings[term]
+                df = len(posting)
+                idf = log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                if candidates is not None and len(candidates) < df:
+                    hits: Iterable[tuple[str, int]] = (
+                        (doc_id, posting[doc_id]) for doc_id in candidates if doc_id in posting
+                    )
+                else:
+                    hits = posting.items()
+                for doc_id, tf in hits:
+                    if candidates is not None and doc_id not in candidates:
+                        continue
+                    norm = k1 * (1.0 - b + b * lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+        return scores
+
+    def top_k(
+        self,
+        domain: str,
+        query: str,
+        k: int,
+        *,
+        accept: Callable[[str], bool] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Best ``k`` documents by BM25, optionally restricted by an ``accept`` predicate."""
+
+        scores = self.score(domain, query)
+        if accept is not None:
+            scores = {doc_id: value for doc_id, value in scores.items() if accept(doc_id)}
+        return nlargest(k, scores.items(), key=lambda pair: pair[1])
@@ -0,0 +1,415 @@
+"""Streaming ingestion: read -> normalize -> chunk -> embed -> upsert with bounded queues."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterable, Callable, Iterable, Iterator
+
+from .chunking import SemanticChunker
+from .domain import KnowledgeItem
+from .stores.base import VectorStore
+from .stores.executor import StoreExecutor, embed_async
+from .types import Chunk
+from .vector_store import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+Source = Iterable[KnowledgeItem | Chunk] | AsyncIterable[KnowledgeItem | Chunk]
+Chunker = Callable[[Chunk], Iterable[Chunk]]
+
+
+@dataclass
+class IngestProgress:
+    """Throughput counters of a StreamingIngestPipeline run."""
+
+    items: int = 0
+    skipped_items: int = 0
+    chunks: int = 0
+    upserted: int = 0
+    batches: int = 0
+    new: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    refreshed: int = 0
+    embed_seconds: float = 0.0
+    upsert_seconds: float = 0.0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.upserted / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class IngestCheckpoint:
+    """Resume point of a streaming ingest, persisted as JSON after every committed batch.
+
+    ``offset`` counts source items whose chunks are all stored; a resumed run skips
+    that many items from the start of the same source. ``source`` guards against
+    resuming with a checkpoint written for another input.
+    """
+
+    path: Path
+    source: str = ""
+    offset: int = 0
+    chunks: int = 0
+
+    @classmethod
+    def load(cls, path: str | Path, *, source: str = "") -> "IngestCheckpoint":
+        path = Path(path)
+        if not path.exists():
+            return cls(path=path, source=source)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if source and data.get("source") not in ("", source):
+            raise ValueError(f"checkpoint {path} belongs to source {data.get('source')!r}, not {source!r}")
+        return cls(path=path, source=source or data.get("source", ""), offset=int(data.get("offset", 0)), chunks=int(data.get("chunks", 0)))
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"source": self.source, "offset": self.offset, "chunks": self.chunks}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+@dataclass
+class _Batch:
+    seq: int
+    chunks: list[Chunk]
+    end_offset: int
+    vectors: list[list[float]] = field(default_factory=list)
+
+
+_DONE = object()
+
+
+class StreamingIngestPipeline:
+    """Generator-driven ingestion with backpressure between stages.
+
+    The source is consumed lazily and cut into micro-batches of ``batch_size``
+    chunks. Stages are connected by queues holding at most ``queue_size`` batches,
+    so memory stays bounded by ``(queue_size + concurrency) * batch_size`` chunks
+    whatever the corpus size. ``embed_concurrency`` workers embed while
+    ``upsert_concurrency`` workers write earlier batches, so embedding overlaps
+    with database writes. Entries are split by ``chunker``, by a SemanticChunker
+    when ``max_tokens`` is set (sentence-aligned parts with ``overlap_tokens``),
+    into ``max_chars`` pieces when that is set, and otherwise stored as is. Chunks carry their vector in
+    ``payload["embedding"]``; the store does not embed them again.
+
+    Every chunk gets ``metadata["content_hash"]`` and, with ``source_id``,
+    ``metadata["ingest_source"]``. With ``incremental=True`` (which requires
+    ``knowledge_version_id``) the hashes stored for that version and source are
+    fetched first: unchanged chunks are neither embedded nor written, only their
+    ``expires_at`` is refreshed, and rows missing from the source are deleted in
+    bulk once it is exhausted. Deletion is limited to the domains the source
+    yielded in this run. ``dry_run`` only computes the diff counters.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        embedding_provider: EmbeddingProvider,
+        *,
+        embedding_model: str | None = None,
+        batch_size: int = 256,
+        queue_size: int = 4,
+        embed_concurrency: int = 2,
+        upsert_concurrency: int = 1,
+        max_chars: int | None = None,
+        max_tokens: int | None = None,
+        overlap_tokens: int = 64,
+        chunker: Chunker | None = None,
+        checkpoint: IngestCheckpoint | None = None,
+        on_progress: Callable[[IngestProgress], None] | None = None,
+        executor: StoreExecutor | None = None,
+        incremental: bool = False,
+        knowledge_version_id: str | None = None,
+        source_id: str | None = None,
+        dry_run: bool = False,
+    ) -> None:
+        if min(batch_size, queue_size, embed_concurrency, upsert_concurrency) <= 0:
+            raise ValueError("batch_size, queue_size and concurrency must be positive")
+        if (incremental or dry_run) and not knowledge_version_id:
+            # Без версии сравнение шло бы со всеми строками без версии, включая чужие.
+            raise ValueError("incremental ingest requires knowledge_version_id")
+        self._store = store
+        self._provider = embedding_provider
+        self._model = embedding_model
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.embed_concurrency = embed_concurrency
+        self.upsert_concurrency = upsert_concurrency
+        if chunker is None and max_tokens:
+            chunker = SemanticChunker(max_tokens=max_tokens, overlap_tokens=min(overlap_tokens, max_tokens - 1))
+        if chunker is None:
+            chunker = (lambda chunk: split_chunk(chunk, max_chars=max_chars)) if max_chars else (lambda chunk: (chunk,))
+        self._chunker = chunker
+        self.checkpoint = checkpoint
+        self._on_progress = on_progress
+        self._owns_executor = executor is None
+        self._executor = executor or StoreExecutor(max_workers=embed_concurrency, name="memory37-ingest")
+        self.incremental = incremental or dry_run
+        self.knowledge_version_id = knowledge_version_id
+        self.source_id = source_id
+        self.dry_run = dry_run
+        self.progress = IngestProgress()
+        self._expiring: dict[tuple[str, str], list[str]] = {}
+
+    async def run(self, source: Source) -> IngestProgress:
+        self.progress = progress = IngestProgress()
+        start_offset = self.checkpoint.offset if self.checkpoint else 0
+        progress.skipped_items = start_offset
+        started = time.perf_counter()
+        to_embed: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        to_upsert: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        committed: dict[int, tuple[int, int]] = {}
+        next_seq = [0]
+        existing: dict[tuple[str, str], str | None] = {}
+        seen: set[tuple[str, str]] | None = None
+        self._expiring = {}
+        if self.incremental:
+            existing = await self._store.content_hashes(
+                knowledge_version_id=self.knowledge_version_id, source=self.source_id
+            )
+            seen = set()
+
+        async def produce() -> None:
+            seq = 0
+            batch: list[Chunk] = []
+            offset = start_offset
+            async for chunk, item_done in self._chunks(source, start_offset, seen):
+                progress.chunks += 1
+                if self._needs_write(chunk, existing, seen) and not self.dry_run:
+                    batch.append(chunk)
+                if item_done:
+                    offset += 1
+                    progress.items += 1
+                    if len(batch) >= self.batch_size:
+                        await to_embed.put(_Batch(seq, batch, offset))
+                        seq, batch = seq + 1, []
+            if batch:
+                await to_embed.put(_Batch(seq, batch, offset))
+            for _ in range(self.embed_concurrency):
+                await to_embed.put(_DONE)
+
+        async def embed_worker() -> None:
+            while (batch := await to_embed.get()) is not _DONE:
+                began = time.perf_counter()
+                batch.vectors = await embed_async(
+                    self._provider, [chunk.text for chunk in batch.chunks], model=self._model, executor=self._executor
+                )
+                progress.embed_seconds += time.perf_counter() - began
+                await to_upsert.put(batch)
+
+        async def upsert_worker() -> None:
+            while (batch := await to_upsert.get()) is not _DONE:
+                began = time.perf_counter()
+                by_domain: dict[str, list[Chunk]] = {}
+                for chunk, vector in zip(batch.chunks, batch.vectors, strict=True):
+                    chunk.payload["embedding"] = vector
+                    by_domain.setdefault(chunk.domain, []).append(chunk)
+                for domain, chunks in by_domain.items():
+                    await self._store.upsert(domain=domain, items=chunks)
+                progress.upsert_seconds += time.perf_counter() - began
+                progress.upserted += len(batch.chunks)
+                progress.batches += 1
+                progress.seconds = time.perf_counter() - started
+                committed[batch.seq] = (batch.end_offset, len(batch.chunks))
+                self._advance(committed, next_seq)
+                if self._on_progress is not None:
+                    self._on_progress(progress)
+
+        async def embed_stage() -> None:
+            await asyncio.gather(*(embed_worker() for _ in range(self.embed_concurrency)))
+            for _ in range(self.upsert_concurrency):
+                await to_upsert.put(_DONE)
+
+        tasks = [
+            asyncio.ensure_future(produce()),
+            asyncio.ensure_future(embed_stage()),
+            *(asyncio.ensure_future(upsert_worker()) for _ in range(self.upsert_concurrency)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            if self._owns_executor:
+                self._executor.shutdown(wait=False)
+        if seen is not None:
+            await self._delete_missing(existing, seen)
+            await self._refresh_expiry()
+        progress.seconds = time.perf_counter() - started
+        logger.info(
+            "Streaming ingest: %d items, %d chunks in %d batches, %.1fs (%.0f chunks/s; embed %.1fs, upsert %.1fs)",
+            progress.items,
+            progress.upserted,
+            progress.batches,
+            progress.seconds,
+            progress.chunks_per_second,
+            progress.embed_seconds,
+            progress.upsert_seconds,
+        )
+        if seen is not None:
+            logger.info(
+                "Incremental ingest%s: %d new, %d changed, %d unchanged (%d TTL refreshed), %d deleted",
+                " (dry run)" if self.dry_run else "",
+                progress.new,
+                progress.changed,
+                progress.unchanged,
+                progress.refreshed,
+                progress.deleted,
+            )
+        return progress
+
+    def _needs_write(
+        self, chunk: Chunk, existing: dict[tuple[str, str], str | None], seen: set[tuple[str, str]] | None
+    ) -> bool:
+        digest = chunk.metadata["content_hash"] = content_hash(chunk)
+        if seen is None:
+            return True
+        key = (chunk.domain, chunk.id)
+        seen.add(key)
+        if key not in existing:
+            self.progress.new += 1
+            return True
+        if existing[key] != digest:
+            self.progress.changed += 1
+            return True
+        self.progress.unchanged += 1
+        # expires_at не входит в хэш: TTL неизменившейся строки продлевается отдельно.
+        expires_at = chunk.metadata.get("expires_at")
+        if expires_at:
+            self._expiring.setdefault((chunk.domain, expires_at), []).append(chunk.id)
+        return False
+
+    async def _delete_missing(self, existing: dict[tuple[str, str], str | None], seen: set[tuple[str, str]]) -> None:
+        """Tombstone pass: rows of the version that the source no longer yields.
+
+        Only domains the source yielded in this run are swept, so a partial source
+        (or one that skips a domain) never deletes rows it does not own.
+        """
+
+        read_domains = {domain for domain, _ in seen}
+        missing: dict[str, list[str]] = {}
+        for domain, item_id in existing.keys() - seen:
+            if domain in read_domains:
+                missing.setdefault(domain, []).append(item_id)
+        for domain, ids in missing.items():
+            if self.dry_run:
+                self.progress.deleted += len(ids)
+            else:
+                self.progress.deleted += await self._store.delete(domain=domain, ids=sorted(ids))
+
+    async def _refresh_expiry(self) -> None:
+        """Move ``expires_at`` of unchanged rows to the value the source has now."""
+
+        for (domain, expires_at), ids in self._expiring.items():
+            if self.dry_run:
+                self.progress.refreshed += len(ids)
+            else:
+                self.progress.refreshed += await self._store.refresh_expiry(domain=domain, ids=ids, expires_at=expires_at)
+        self._expiring = {}
+
+    def _advance(self, committed: dict[int, tuple[int, int]], next_seq: list[int]) -> None:
+        """Move the checkpoint over batches committed without gaps; later ones wait."""
+
+        checkpoint = self.checkpoint
+        moved = False
+        while next_seq[0] in committed:
+            end_offset, count = committed.pop(next_seq[0])
+            next_seq[0] += 1
+            if checkpoint is not None:
+                checkpoint.offset = end_offset
+                checkpoint.chunks += count
+                moved = True
+        if moved:
+            checkpoint.save()
+
+    async def _chunks(self, source: Source, skip: int, seen: set[tuple[str, str]] | None):
+        """``(chunk, is_last_chunk_of_item)`` pairs for source items after ``skip``.
+
+        Skipped items still count as present in the source for the tombstone pass.
+        """
+
+        position = 0
+        async for entry in _aiter(source):
+            position += 1
+            if position <= skip:
+                if seen is not None:
+                    seen.update((part.domain, part.id) for part in self._chunker(to_chunk(entry)))
+                continue
+            chunk = to_chunk(entry)
+            if self.source_id:
+                chunk = chunk.model_copy(update={"metadata": {**chunk.metadata, "ingest_source": self.source_id}})
+            parts = list(self._chunker(chunk))
+            for idx, part in enumerate(parts):
+                yield part, idx == len(parts) - 1
+
+
+def to_chunk(entry: KnowledgeItem | Chunk) -> Chunk:
+    """Normalize a source entry to a Chunk with version and expiry in its metadata."""
+
+    if isinstance(entry, Chunk):
+        return entry
+    metadata = dict(entry.metadata)
+    if entry.knowledge_version_id:
+        metadata["knowledge_version_id"] = entry.knowledge_version_id
+    if entry.expires_at:
+        metadata["expires_at"] = entry.expires_at.isoformat()
+    return Chunk(id=entry.item_id, domain=entry.domain, text=entry.content, payload={}, metadata=metadata)
+
+
+def content_hash(chunk: Chunk) -> str:
+    """Digest of what a row stores for the chunk; expiry and the hash itself are left out."""
+
+    metadata = {key: value for key, value in chunk.metadata.items() if key not in ("content_hash", "expires_at")}
+    digest = hashlib.sha256()
+    digest.update(chunk.domain.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(chunk.text.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def split_chunk(chunk: Chunk, *, max_chars: int = 2000) -> Iterator[Chunk]:
+    """Split an over-long chunk into ``::part{n}`` pieces of at most ``max_chars``."""
+
+    text = chunk.text
+    if len(text) <= max_chars:
+        yield chunk
+        return
+    parts = [text[start : start + max_chars] for start in range(0, len(text), max_chars)]
+    for idx, part in enumerate(parts):
+        yield Chunk(
+            id=f"{chunk.id}::part{idx}",
+            domain=chunk.domain,
+            text=part,
+            payload=dict(chunk.payload),
+            metadata=dict(chunk.metadata),
+        )
+
+
+async def _aiter(source: Source):
+    if hasattr(source, "__aiter__"):
+        async for entry in source:  # type: ignore[union-attr]
+            yield entry
+        return
+    for entry in source:  # type: ignore[union-attr]
+        yield entry
+        # Let embed/upsert workers run between reads of a synchronous source.
+        await asyncio.sleep(0)
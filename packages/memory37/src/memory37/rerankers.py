@@ -1,19 +1,33 @@
-"""LLM-based rerank providers."""
+"""Rerank providers: OpenAI LLM ranking, a local fallback and a cached, time-budgeted wrapper."""
 
 from __future__ import annotations
 
+import hashlib
 import json
+import logging
 import os
-from typing import Sequence
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Callable, Sequence
+
+import numpy as np
 
 from .domain import KnowledgeItem
-from .retrieval import RerankProvider
+from .lexical import tokenize
+from .retrieval import RerankProvider, mmr_select
+from .vector_store import EmbeddingProvider
 
 try:  # pragma: no cover - optional dependency
     from openai import OpenAI  # type: ignore
 except ImportError:  # pragma: no cover - optional dependency
     OpenAI = None  # type: ignore
 
+logger = logging.getLogger(__name__)
+
 
 class OpenAIChatRerankProvider(RerankProvider):
     """Use OpenAI responses API to rerank retrieval results."""
@@ -24,6 +38,7 @@ class OpenAIChatRerankProvider(RerankProvider):
         api_key: str | None = None,
         model: str | None = None,
         client: object | None = None,
+        timeout: float | None = None,
     ) -> None:
         if client is not None:
             self._client = client
@@ -35,6 +50,7 @@ class OpenAIChatRerankProvider(RerankProvider):
                 raise RuntimeError("OPENAI_API_KEY is not configured")
             self._client = OpenAI(api_key=api_key)
         self._model = model or os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+        self._timeout = timeout
 
     def rerank(self, query: str, items: Sequence[KnowledgeItem]) -> list[tuple[KnowledgeItem, float]]:
         if not items:
@@ -59,7 +75,9 @@ class OpenAIChatRerankProvider(RerankProvider):
             "sorted by relevance (higher score first). If unsure, output original order."  # noqa: E501
         )
 
+        options = {"timeout": self._timeout} if self._timeout is not None else {}
         response = self._client.responses.create(  # type: ignore[attr-defined]
+            **options,
             model=self._model,
             input=[
                 {
@@ -107,3 +125,224 @@ class OpenAIChatRerankProvider(RerankProvider):
         ]
         ordered.sort(key=lambda entry: entry[1], reverse=True)
         return ordered
+
+
+class LocalRerankProvider(RerankProvider):
+    """Network-free reranker for when the LLM is slow or unavailable.
+
+    Each item is scored by query-term coverage and proximity (the shortest token
+    window holding all matched terms), plus a small prior for its incoming hybrid
+    rank. With an ``embedding_provider`` the score is blended with query cosine
+    similarity and the order is diversified by maximal marginal relevance
+    (``mmr_lambda`` trades relevance for novelty), so near-duplicates sink.
+    """
+
+    def __init__(
+        self,
+        *,
+        embedding_provider: EmbeddingProvider | None = None,
+        embedding_model: str | None = None,
+        lexical_weight: float = 0.5,
+        order_weight: float = 0.1,
+        mmr_lambda: float = 0.7,
+    ) -> None:
+        self._embedding_provider = embedding_provider
+        self._embedding_model = embedding_model
+        self._lexical_weight = lexical_weight
+        self._order_weight = order_weight
+        self._mmr_lambda = mmr_lambda
+
+    def rerank(self, query: str, items: Sequence[KnowledgeItem]) -> list[tuple[KnowledgeItem, float]]:
+        if not items:
+            return []
+        terms = list(dict.fromkeys(tokenize(query)))
+        lexical = np.array([proximity_score(terms, tokenize(item.content)) for item in items], dtype=np.float32)
+        prior = 1.0 - np.arange(len(items), dtype=np.float32) / len(items)
+        if self._embedding_provider is None:
+            relevance = lexical + self._order_weight * prior
+            order = np.argsort(-relevance, kind="stable")
+        else:
+            texts = [query, *(item.content for item in items)]
+            vectors = np.asarray(self._embedding_provider.embed(texts, model=self._embedding_model), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+            docs = vectors[1:]
+            dense = docs @ vectors[0]
+            relevance = (
+                self._lexical_weight * lexical + (1.0 - self._lexical_weight) * dense + self._order_weight * prior
+            )
+            order = mmr_select(relevance, docs, k=len(items), mmr_lambda=self._mmr_lambda)
+        return [(items[idx], float(relevance[idx])) for idx in order]
+
+
+def proximity_score(terms: Sequence[str], tokens: Sequence[str]) -> float:
+    """``coverage * (0.5 + 0.5 * density)`` of query ``terms`` in ``tokens``.
+
+    Coverage is the share of distinct terms present; density is the number of
+    matched terms over the length of the shortest window containing all of them.
+    """
+
+    if not terms:
+        return 0.0
+    wanted = set(terms)
+    hits = [(pos, token) for pos, token in enumerate(tokens) if token in wanted]
+    found = len({token for _, token in hits})
+    if not found:
+        return 0.0
+    counts: dict[str, int] = {}
+    covered = 0
+    span = len(tokens)
+    left = 0
+    for right_pos, token in hits:
+        counts[token] = counts.get(token, 0) + 1
+        if counts[token] == 1:
+            covered += 1
+        while covered == found:
+            left_pos, left_token = hits[left]
+            span = min(span, right_pos - left_pos + 1)
+            counts[left_token] -= 1
+            if not counts[left_token]:
+                covered -= 1
+            left += 1
+    return found / len(wanted) * (0.5 + 0.5 * found / span)
+
+
+@dataclass
+class RerankStats:
+    """Counters of a BudgetedRerankProvider."""
+
+    calls: int = 0
+    cache_hits: int = 0
+    shared_calls: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    late_results: int = 0
+
+    @property
+    def fallbacks(self) -> int:
+        return self.timeouts + self.errors
+
+
+def rerank_cache_key(query: str, items: Sequence[KnowledgeItem]) -> str:
+    """Key of a ranking: normalized query and the candidate id set, order ignored."""
+
+    digest = hashlib.sha256(" ".join(query.lower().split()).encode("utf-8"))
+    for item_id in sorted(item.item_id for item in items):
+        digest.update(b"\0" + item_id.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class BudgetedRerankProvider(RerankProvider):
+    """Cache and a hard latency budget in front of a slow (LLM) rerank provider.
+
+    Rankings are cached by query and candidate id set (LRU of ``max_entries`` with
+    ``ttl_seconds``). On a miss the wrapped provider runs in a worker thread; when it
+    has not answered within ``budget_seconds`` or fails, ``fallback`` ranks the items
+    instead, or the incoming hybrid order is kept when there is no fallback. A call
+    that finishes after its budget still fills the cache, and concurrent misses for
+    the same key share one upstream call.
+    """
+
+    def __init__(
+        self,
+        provider: RerankProvider,
+        *,
+        budget_seconds: float = 1.0,
+        fallback: RerankProvider | None = None,
+        max_entries: int = 1024,
+        ttl_seconds: float | None = 600.0,
+        max_workers: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if budget_seconds <= 0:
+            raise ValueError("budget_seconds must be positive")
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self._provider = provider
+        self._budget = budget_seconds
+        self._fallback = fallback
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float | None, list[tuple[str, float]]]] = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        # Reentrant: a future that is already done runs its callback in the submitting thread.
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="memory37-rerank")
+        self.stats = RerankStats()
+
+    def rerank(self, query: str, items: Sequence[KnowledgeItem]) -> list[tuple[KnowledgeItem, float]]:
+        if not items:
+            return []
+        items = list(items)
+        key = rerank_cache_key(query, items)
+        with self._lock:
+            self.stats.calls += 1
+            ranking = self._get(key)
+            if ranking is not None:
+                self.stats.cache_hits += 1
+                return _apply_ranking(ranking, items)
+            future = self._inflight.get(key)
+            if future is None:
+                deadline = self._clock() + self._budget
+                future = self._pool.submit(self._provider.rerank, query, items)
+                self._inflight[key] = future
+                future.add_done_callback(lambda done: self._finish(key, done, deadline))
+            else:
+                self.stats.shared_calls += 1
+        try:
+            return list(future.result(timeout=self._budget))
+        except FutureTimeoutError:
+            with self._lock:
+                self.stats.timeouts += 1
+            logger.info("Rerank exceeded %.2fs budget; using fallback order", self._budget)
+        except Exception as exc:
+            with self._lock:
+                self.stats.errors += 1
+            logger.warning("Rerank failed (%s); using fallback order", exc)
+        return self._fallback_order(query, items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _fallback_order(self, query: str, items: list[KnowledgeItem]) -> list[tuple[KnowledgeItem, float]]:
+        if self._fallback is not None:
+            try:
+                return self._fallback.rerank(query, items)
+            except Exception as exc:  # pragma: no cover - the local fallback does not do I/O
+                logger.warning("Fallback rerank failed (%s); keeping hybrid order", exc)
+        return [(item, float(len(items) - idx)) for idx, item in enumerate(items)]
+
+    def _finish(self, key: str, future: Future, deadline: float) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            if self._clock() > deadline:
+                self.stats.late_results += 1
+            expires_at = self._clock() + self._ttl if self._ttl else None
+            ranking = [(item.item_id, float(score)) for item, score in future.result()]
+            self._entries[key] = (expires_at, ranking)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _get(self, key: str) -> list[tuple[str, float]] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, ranking = entry
+        if expires_at is not None and expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return ranking
+
+
+def _apply_ranking(ranking: list[tuple[str, float]], items: list[KnowledgeItem]) -> list[tuple[KnowledgeItem, float]]:
+    by_id = {item.item_id: item for item in items}
+    return [(by_id[item_id], score) for item_id, score in ranking if item_id in by_id]
@@ -2,28 +2,18 @@
 
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass, field
 from math import sqrt
 from typing import Dict, Iterable, List, Protocol, Sequence
 
+import numpy as np
+
 from .domain import KnowledgeItem
+from .lexical import BM25Index, normalize_scores
 from .vector_store import EmbeddingProvider, VectorRecord, VectorStore
 
 
-def _tokenize(text: str) -> list[str]:
-    return [token for token in text.lower().split() if token]
-
-
-def _lexical_score(text: str, query_terms: Sequence[str]) -> float:
-    tokens = _tokenize(text)
-    score = 0.0
-    for term in query_terms:
-        for token in tokens:
-            if token == term or token.startswith(term):
-                score += 1.0
-    return score
-
-
 @dataclass
 class HybridRetriever:
     """Hybrid retriever using vector similarity + lexical scoring."""
@@ -34,12 +24,17 @@ class HybridRetriever:
     alpha: float = 0.6
     documents: Dict[str, KnowledgeItem] = field(default_factory=dict)
     rerank_provider: "RerankProvider" | None = None
+    lexical_index: BM25Index = field(default_factory=BM25Index)
+    mmr_lambda: float | None = None
+    max_per_parent: int | None = None
 
     def index(self, items: Iterable[KnowledgeItem]) -> None:
         items = list(items)
         if not items:
             return
         self.documents.update({item.item_id: item for item in items})
+        for item in items:
+            self.lexical_index.add(item.domain, item.item_id, item.content)
         embeddings = self.embedding_provider.embed([item.content for item in items], model=self.embedding_model)
         records: List[VectorRecord] = []
         for item, vector in zip(items, embeddings, strict=True):
@@ -55,22 +50,44 @@ class HybridRetriever:
         if version_id:
             metadata_filter.setdefault("knowledge_version_id", version_id)
         vector_candidates = self.vector_store.query(query_embedding, top_k=top_k * 3, metadata_filter=metadata_filter or None)
-        query_terms = _tokenize(text)
 
-        results: list[tuple[KnowledgeItem, float]] = []
+        candidates: list[tuple[KnowledgeItem, float]] = []
+        vectors: dict[str, Sequence[float]] = {}
         for record in vector_candidates:
             item = self.documents.get(record.item_id)
             if not item:
                 item = _record_to_item(record)
                 if not item:
                     continue
+            if not self.lexical_index.contains(item.domain, item.item_id):
+                self.lexical_index.add(item.domain, item.item_id, item.content)
+            dense_score = record.score if record.score is not None else _cosine(query_embedding, record.vector)
+            candidates.append((item, dense_score))
+            vectors[item.item_id] = record.vector
+
+        lexical_by_domain: dict[str, dict[str, float]] = {}
+        for domain in {item.domain for item, _ in candidates}:
+            domain_ids = [item.item_id for item, _ in candidates if item.domain == domain]
+            lexical_by_domain[domain] = normalize_scores(self.lexical_index.score(domain, text, doc_ids=domain_ids))
 
-            dense_score = _cosine(query_embedding, record.vector)
-            lexical = _lexical_score(item.content, query_terms)
+        results: list[tuple[KnowledgeItem, float]] = []
+        for item, dense_score in candidates:
+            lexical = lexical_by_domain[item.domain].get(item.item_id, 0.0)
             combined = self.alpha * dense_score + (1 - self.alpha) * lexical
             results.append((item, combined))
 
         results.sort(key=lambda entry: entry[1], reverse=True)
+        if self.mmr_lambda is not None or self.max_per_parent:
+            ids = [item.item_id for item, _ in results]
+            order = mmr_select(
+                [score for _, score in results],
+                vector_matrix([vectors.get(item_id) for item_id in ids]),
+                k=top_k * 2,
+                mmr_lambda=1.0 if self.mmr_lambda is None else self.mmr_lambda,
+                parents=[parent_id(item_id) for item_id in ids],
+                max_per_parent=self.max_per_parent,
+            )
+            results = [results[idx] for idx in order]
         results = results[: top_k * 2]
 
         if self.rerank_provider:
@@ -80,6 +97,94 @@ class HybridRetriever:
         return results[:top_k]
 
 
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], *, k: int = 60) -> dict[str, float]:
+    """Fuse ranked id lists: ``score(id) = sum(1 / (k + rank))`` with 1-based ranks."""
+
+    fused: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, 1):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+_PART_SUFFIX = re.compile(r"::part\d+$")
+
+
+def parent_id(item_id: str) -> str:
+    """Id of the source entry a ``{id}::part{n}`` chunk was split from (the id itself otherwise)."""
+
+    return _PART_SUFFIX.sub("", item_id)
+
+
+def vector_matrix(vectors: Sequence[Sequence[float] | None]) -> np.ndarray:
+    """Stack candidate vectors into a float32 matrix; missing vectors become zero rows."""
+
+    dimension = max((len(vector) for vector in vectors if vector is not None), default=0)
+    matrix = np.zeros((len(vectors), dimension), dtype=np.float32)
+    for row, vector in enumerate(vectors):
+        if vector is not None and len(vector) == dimension:
+            matrix[row] = vector
+    return matrix
+
+
+def mmr_select(
+    relevance: Sequence[float] | np.ndarray,
+    vectors: np.ndarray,
+    *,
+    k: int,
+    mmr_lambda: float = 0.7,
+    parents: Sequence[str] | None = None,
+    max_per_parent: int | None = None,
+) -> list[int]:
+    """Greedy maximal marginal relevance over a candidate pool; returns picked indices in order.
+
+    Each step takes the candidate maximizing ``mmr_lambda * relevance - (1 - mmr_lambda) *
+    max cosine similarity to the picks so far``. Relevance is min-max scaled within the
+    pool so that ``mmr_lambda`` weighs it against similarity on the same 0..1 range; the
+    scaling is monotonic and does not make scores of different fusion methods comparable,
+    so callers must pass a pool ranked on one scale. A zero row (no vector) is similar to
+    nothing and never penalised. Rows of the pool's similarity matrix are computed only for
+    picked candidates, so a step is one matrix-vector product and a few vector operations.
+    With ``max_per_parent`` at most that many candidates of one parent are picked.
+    """
+
+    scores = np.asarray(relevance, dtype=np.float32)
+    size = len(scores)
+    if size == 0 or k <= 0:
+        return []
+    spread = float(scores.max() - scores.min())
+    scores = (scores - scores.min()) / spread if spread > 0 else np.ones(size, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(size, -1)
+    norms = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+    unit = vectors / np.where(norms > 0, norms, 1.0)[:, None]
+
+    weighted = mmr_lambda * scores
+    penalty = 1.0 - mmr_lambda
+    closest = np.zeros(size, dtype=np.float32)
+    blocked = np.zeros(size, dtype=np.float32)
+    groups: np.ndarray | None = None
+    if parents is not None and max_per_parent:
+        codes: dict[str, int] = {}
+        groups = np.fromiter((codes.setdefault(parent, len(codes)) for parent in parents), dtype=np.int64, count=size)
+        counts = np.zeros(len(codes), dtype=np.int64)
+
+    picked: list[int] = []
+    for _ in range(min(k, size)):
+        marginal = weighted - penalty * closest + blocked
+        pick = int(np.argmax(marginal))
+        if blocked[pick]:
+            break
+        picked.append(pick)
+        blocked[pick] = -np.inf
+        np.maximum(closest, unit @ unit[pick], out=closest)
+        if groups is not None:
+            group = groups[pick]
+            counts[group] += 1
+            if counts[group] >= max_per_parent:
+                blocked[groups == group] = -np.inf
+    return picked
+
+
 def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
     if not a or not b or len(a) != len(b):
         return 0.0
@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from typing import Protocol
+from typing import Protocol, Sequence
 
-from ..types import Chunk, ChunkScore, GraphFact
+from ..types import Chunk, ChunkScore, GraphFact, SearchRequest
 
 
 class VectorStore(Protocol):
@@ -18,6 +18,27 @@ class VectorStore(Protocol):
         filters: dict | None = None,
     ) -> list[ChunkScore]: ...
 
+    async def search_domains(
+        self,
+        *,
+        domains: Sequence[str],
+        query: str,
+        k: int,
+        per_domain_k: int | None = None,
+        k_keyword: int | None = None,
+        filters: dict | None = None,
+    ) -> list[ChunkScore]: ...
+
+    async def search_many(self, requests: Sequence[SearchRequest]) -> list[list[ChunkScore]]: ...
+
+    async def content_hashes(
+        self, *, knowledge_version_id: str | None, domain: str | None = None, source: str | None = None
+    ) -> dict[tuple[str, str], str | None]: ...
+
+    async def refresh_expiry(self, *, domain: str, ids: Sequence[str], expires_at: str | None) -> int: ...
+
+    async def delete(self, *, domain: str, ids: Sequence[str]) -> int: ...
+
 
 class GraphStore(Protocol):
     async def upsert_facts(self, facts: list[GraphFact]) -> None: ...
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence, TypeVar
+
+from ..vector_store import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class ExecutorStats:
+    """Счётчики StoreExecutor: очередь (ожидание слота и потока) и время работы."""
+
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    in_flight: int = 0
+    queue_seconds_total: float = 0.0
+    queue_seconds_max: float = 0.0
+    run_seconds_total: float = 0.0
+
+    @property
+    def mean_queue_seconds(self) -> float:
+        done = self.completed + self.failed
+        return self.queue_seconds_total / done if done else 0.0
+
+    @property
+    def mean_run_seconds(self) -> float:
+        done = self.completed + self.failed
+        return self.run_seconds_total / done if done else 0.0
+
+
+class StoreExecutor:
+    """Ограниченный пул потоков для блокирующей работы хранилищ знаний.
+
+    CPU-скоринг, синхронный psycopg и синхронные embedding-провайдеры уходят сюда,
+    а не в event loop. ``max_concurrency`` ограничивает число одновременно
+    ожидающих корутин (лишние ждут в очереди и не занимают потоки); время от вызова
+    ``run`` до старта в потоке учитывается как queue time. Пул создаётся лениво и
+    после ``shutdown`` пересоздаётся при следующем вызове.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int = 4,
+        max_concurrency: int | None = None,
+        slow_queue_seconds: float = 0.5,
+        name: str = "memory37-store",
+    ) -> None:
+        if max_workers <= 0:
+            raise ValueError("max_workers must be positive")
+        if max_concurrency is not None and max_concurrency <= 0:
+            raise ValueError("max_concurrency must be positive")
+        self._max_workers = max_workers
+        self._max_concurrency = max_concurrency or max_workers
+        self._slow_queue_seconds = slow_queue_seconds
+        self._name = name
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # Семафор привязан к event loop; gateway использует разные loop на старте и в работе.
+        self._semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = (
+            weakref.WeakKeyDictionary()
+        )
+        self.stats = ExecutorStats()
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        started: list[float] = []
+
+        def call() -> T:
+            started.append(time.perf_counter())
+            return fn(*args, **kwargs)
+
+        with self._stats_lock:
+            self.stats.submitted += 1
+        async with self._semaphore(loop):
+            with self._stats_lock:
+                self.stats.in_flight += 1
+            try:
+                result = await loop.run_in_executor(self._get_pool(), call)
+            except BaseException:
+                self._record(submitted, started, failed=True)
+                raise
+        self._record(submitted, started, failed=False)
+        return result
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self._max_concurrency)
+        return semaphore
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=self._name)
+            return self._pool
+
+    def _record(self, submitted: float, started: list[float], *, failed: bool) -> None:
+        finished = time.perf_counter()
+        queued = (started[0] if started else finished) - submitted
+        with self._stats_lock:
+            stats = self.stats
+            stats.in_flight -= 1
+            if failed:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+            stats.queue_seconds_total += queued
+            stats.queue_seconds_max = max(stats.queue_seconds_max, queued)
+            stats.run_seconds_total += finished - (started[0] if started else finished)
+        if queued > self._slow_queue_seconds:
+            logger.warning("%s: задача ждала в очереди %.3fs (max_concurrency=%d)", self._name, queued, self._max_concurrency)
+
+
+async def embed_async(
+    provider: EmbeddingProvider,
+    texts: Sequence[str],
+    *,
+    model: str | None,
+    executor: StoreExecutor,
+) -> list[list[float]]:
+    """Эмбеддинги без блокировки loop: нативный ``aembed`` провайдера или поток executor."""
+
+    aembed = getattr(provider, "aembed", None)
+    if aembed is not None:
+        return await aembed(texts, model=model)
+    return await executor.run(functools.partial(provider.embed, texts, model=model))
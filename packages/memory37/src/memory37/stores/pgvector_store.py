@@ -1,47 +1,277 @@
 from __future__ import annotations
 
-from typing import Callable, Iterable
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Sequence
 
+import numpy as np
 from psycopg import Connection
 
+from ..config import KnowledgeConfig, RetrievalConfig
 from ..embedding import TokenFrequencyEmbeddingProvider
-from ..vector_store import EmbeddingProvider, MemoryVectorStore, PgVectorStore as LegacyPgVectorStore, VectorRecord
-from ..types import Chunk, ChunkScore
+from ..lexical import BM25Index, normalize_scores
+from ..retrieval import mmr_select, parent_id, reciprocal_rank_fusion, vector_matrix
+from ..vector_store import (
+    AsyncPgVectorStore,
+    BulkUpsertStats,
+    EmbeddingProvider,
+    MemoryVectorStore,
+    PgVectorStore as LegacyPgVectorStore,
+    VectorPrecision,
+    VectorRecord,
+)
+from ..types import Chunk, ChunkScore, SearchRequest
 from .base import VectorStore
+from .executor import StoreExecutor, embed_async
 
+logger = logging.getLogger(__name__)
 
-def _lexical_score(text: str, query: str) -> float:
-    """Примитивный lexical/BM25-like скорер (по совпадению токенов)."""
+# Версия формата снапшота InMemoryVectorStore; несовпадение — снапшот игнорируется.
+SNAPSHOT_FORMAT = 1
 
-    tokens = [t for t in text.lower().split() if t]
-    q_tokens = [t for t in query.lower().split() if t]
-    score = 0.0
-    for qt in q_tokens:
-        score += sum(1.0 for tok in tokens if tok.startswith(qt))
-    return score
+# Попытки чтения снапшота, который другой воркер подменяет прямо сейчас.
+_SNAPSHOT_LOAD_ATTEMPTS = 3
+_SNAPSHOT_RETRY_DELAY = 0.05
+
+# Во сколько раз больше кандидатов на домен берётся под MMR-отбор.
+_MMR_POOL_FACTOR = 3
 
 
 def _combine_scores(vector_score: float, lexical_score: float, *, alpha: float = 0.7) -> float:
     return alpha * vector_score + (1 - alpha) * lexical_score
 
 
+def _domain_retrieval(config: KnowledgeConfig | None, domain: str) -> RetrievalConfig | None:
+    if config is None:
+        return None
+    domain_config = config.knowledge.get(domain)
+    return domain_config.retrieval if domain_config is not None else None
+
+
+def _keyword_budget(config: KnowledgeConfig | None, domain: str, k_keyword: int | None) -> int | None:
+    """Размер keyword-ветки: явный k_keyword или k_keyword домена в hybrid-режиме."""
+
+    if k_keyword:
+        return k_keyword
+    retrieval = _domain_retrieval(config, domain)
+    if retrieval is None or retrieval.mode != "hybrid":
+        return None
+    return retrieval.k_keyword
+
+
+def _dense_budget(config: KnowledgeConfig | None, domain: str, k: int) -> int:
+    """Сколько dense-кандидатов брать: не меньше ``k`` и не меньше k_vector домена."""
+
+    retrieval = _domain_retrieval(config, domain)
+    return max(k, retrieval.k_vector) if retrieval is not None else k
+
+
+def _fuse(
+    domain: str,
+    dense: Sequence[VectorRecord],
+    keyword: Sequence[VectorRecord],
+    *,
+    config: KnowledgeConfig | None,
+    limit: int,
+    rrf_k: int,
+    alpha: float,
+) -> list[ChunkScore]:
+    """Слияние веток hybrid-поиска по ``fuse`` домена.
+
+    ``fuse: rrf`` (и явный ``k_keyword`` без конфига домена) — RRF по рангам. Hybrid-домен
+    без ``fuse`` смешивает оценки линейно: alpha · dense + (1 − alpha) · keyword, где
+    оценка keyword-ветки нормирована на лучшую, а отсутствующая в ветке оценка равна 0.
+    """
+
+    retrieval = _domain_retrieval(config, domain)
+    if retrieval is None or retrieval.mode != "hybrid" or retrieval.fuse == "rrf":
+        return _fuse_rrf(domain, [dense, keyword], limit=limit, rrf_k=rrf_k)
+    lexical = normalize_scores({rec.item_id: rec.score or 0.0 for rec in keyword})
+    vector_scores = {rec.item_id: rec.score or 0.0 for rec in dense}
+    records = {rec.item_id: rec for rec in keyword}
+    records.update((rec.item_id, rec) for rec in dense)
+    results = [
+        ChunkScore(
+            chunk=_to_chunk(domain, rec),
+            score=_combine_scores(vector_scores.get(item_id, 0.0), lexical.get(item_id, 0.0), alpha=alpha),
+        )
+        for item_id, rec in records.items()
+    ]
+    results.sort(key=lambda r: r.score, reverse=True)
+    return results[:limit]
+
+
+def _fuse_rrf(domain: str, rankings: Sequence[Sequence[VectorRecord]], *, limit: int, rrf_k: int) -> list[ChunkScore]:
+    fused = reciprocal_rank_fusion(([rec.item_id for rec in ranking] for ranking in rankings), k=rrf_k)
+    records: dict[str, VectorRecord] = {}
+    for ranking in rankings:
+        for rec in ranking:
+            records.setdefault(rec.item_id, rec)
+    ordered = sorted(fused.items(), key=lambda pair: pair[1], reverse=True)[:limit]
+    return [ChunkScore(chunk=_to_chunk(domain, records[item_id]), score=score) for item_id, score in ordered]
+
+
+def _rescore_lexically(
+    domain: str,
+    query: str,
+    query_vec: list[float],
+    raw: Sequence[VectorRecord],
+    *,
+    lexical: BM25Index,
+    alpha: float,
+    limit: int,
+) -> list[ChunkScore]:
+    lexical_scores = normalize_scores(lexical.score(domain, query, doc_ids=[rec.item_id for rec in raw]))
+    results: list[ChunkScore] = []
+    for rec in raw:
+        vector_score = rec.score if rec.score is not None else _cosine(query_vec, rec.vector)
+        combined = _combine_scores(vector_score, lexical_scores.get(rec.item_id, 0.0), alpha=alpha)
+        results.append(ChunkScore(chunk=_to_chunk(domain, rec), score=combined))
+    results.sort(key=lambda r: r.score, reverse=True)
+    return results[:limit]
+
+
+def _read_manifest(directory: Path) -> dict:
+    return json.loads((directory / "manifest.json").read_text(encoding="utf-8"))
+
+
+def _merge_ranked(results: Iterable[ChunkScore], *, limit: int) -> list[ChunkScore]:
+    """Общий рейтинг по нескольким доменам (квоты уже применены на уровне домена).
+
+    Шкалы доменов несравнимы: hybrid-домены дают RRF (~1/60), dense — косинус со
+    смешанным BM25. Поэтому оценки каждого домена сначала min-max нормируются в
+    [0, 1] (лучший результат домена — 1), и только потом сортируются вместе.
+    """
+
+    by_domain: dict[str, list[ChunkScore]] = {}
+    for result in results:
+        by_domain.setdefault(result.chunk.domain, []).append(result)
+    merged: list[ChunkScore] = []
+    for group in by_domain.values():
+        low = min(result.score for result in group)
+        span = max(result.score for result in group) - low
+        merged.extend(
+            ChunkScore(chunk=result.chunk, score=(result.score - low) / span if span else 1.0) for result in group
+        )
+    return sorted(merged, key=lambda r: r.score, reverse=True)[:limit]
+
+
+async def _gather_isolated(branches: dict[str, Awaitable[list[ChunkScore]]]) -> tuple[list[ChunkScore], set[str]]:
+    """Выполняет ветки поиска параллельно; ошибка ветки логируется и не обнуляет остальные."""
+
+    outcomes = await asyncio.gather(*branches.values(), return_exceptions=True)
+    merged: list[ChunkScore] = []
+    failed: set[str] = set()
+    for label, outcome in zip(branches, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning("Поиск по домену %s не удался: %s", label, outcome)
+            failed.add(label)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            merged.extend(outcome)
+    return merged, failed
+
+
+def _diversify(
+    results: Sequence[ChunkScore],
+    vectors: np.ndarray,
+    *,
+    k: int,
+    mmr_lambda: float | None,
+    max_per_parent: int | None,
+) -> list[ChunkScore]:
+    """MMR-отбор ``k`` результатов из пула (см. ``retrieval.mmr_select``) с лимитом на исходную запись."""
+
+    order = mmr_select(
+        [result.score for result in results],
+        vectors,
+        k=k,
+        mmr_lambda=1.0 if mmr_lambda is None else mmr_lambda,
+        parents=[parent_id(result.chunk.id) for result in results],
+        max_per_parent=max_per_parent,
+    )
+    return [results[idx] for idx in order]
+
+
+def _collect_vectors(vectors: dict[str, list[float]] | None, records: Iterable[VectorRecord]) -> None:
+    if vectors is not None:
+        vectors.update((rec.item_id, rec.vector) for rec in records if len(rec.vector))
+
+
+def _to_chunk(domain: str, rec: VectorRecord) -> Chunk:
+    return Chunk(id=rec.item_id, domain=domain, text=rec.metadata.get("content", ""), payload={}, metadata=rec.metadata)
+
+
 class PgVectorWrapper(VectorStore):
-    """Адаптер PgVectorStore с реальными embedding и гибридным скорингом."""
+    """Адаптер PgVectorStore с реальными embedding и гибридным скорингом.
+
+    Работает либо поверх синхронного PgVectorStore (``connection_factory``; вызовы
+    уходят в ограниченный пул ``executor``, чтобы не блокировать event loop), либо
+    поверх нативно асинхронного ``AsyncPgVectorStore`` с пулом соединений (``store``).
+    Эмбеддинги считаются через ``aembed`` провайдера или в том же executor; запросы —
+    через ``query_embedding_provider``, если он задан (ingest идёт мимо кеша запросов).
+    """
 
     def __init__(
         self,
-        connection_factory: Callable[[], Connection],
+        connection_factory: Callable[[], Connection] | None = None,
         *,
         table: str = "memory37_vectors",
         dimension: int = 1536,
         embedding_provider: EmbeddingProvider | None = None,
+        query_embedding_provider: EmbeddingProvider | None = None,
         embedding_model: str | None = None,
         alpha: float = 0.7,
+        knowledge_config: KnowledgeConfig | None = None,
+        rrf_k: int = 60,
+        bulk_batch_size: int | None = None,
+        store: AsyncPgVectorStore | None = None,
+        rescore_fetch_k: int | None = None,
+        ef_search: int | None = None,
+        probes: int | None = None,
+        partitions: Sequence[str] | None = None,
+        executor: StoreExecutor | None = None,
+        mmr_lambda: float | None = None,
+        max_per_parent: int | None = None,
     ) -> None:
-        self._store = LegacyPgVectorStore(connection_factory, table=table, dimension=dimension)
+        if store is None and connection_factory is None:
+            raise ValueError("PgVectorWrapper требует connection_factory или store")
+        # partitions — домены с собственной LIST-партицией (см. LegacyPgVectorStore).
+        self._store: LegacyPgVectorStore | AsyncPgVectorStore = store or LegacyPgVectorStore(
+            connection_factory, table=table, dimension=dimension, partitions=partitions
+        )
+        self._native_async = store is not None
+        self._executor = executor or StoreExecutor()
+        # bulk_batch_size включает COPY-путь загрузки (см. LegacyPgVectorStore.upsert_bulk).
+        self._bulk_batch_size = bulk_batch_size
+        self.last_bulk_stats: BulkUpsertStats | None = None
+        # Сколько dense-кандидатов брать под лексический пересчёт (не меньше запрошенного k).
+        self._rescore_fetch_k = rescore_fetch_k or 0
+        # Параметры recall ANN-индекса (SET LOCAL на время запроса).
+        self._ann_settings = {"ef_search": ef_search, "probes": probes}
         self._embedder = embedding_provider or TokenFrequencyEmbeddingProvider()
+        # Эмбеддер поисковых запросов (например, с кешем); ingest идёт мимо него.
+        self._query_embedder = query_embedding_provider or self._embedder
         self._embedding_model = embedding_model
         self._alpha = alpha
+        self._knowledge_config = knowledge_config
+        self._rrf_k = rrf_k
+        self._lexical = BM25Index()
+        # MMR-стадия search_domains: разнообразие выдачи и лимит частей одной записи.
+        self._mmr_lambda = mmr_lambda
+        self._max_per_parent = max_per_parent
+
+    @property
+    def executor(self) -> StoreExecutor:
+        return self._executor
 
     async def upsert(self, *, domain: str, items: list[Chunk]) -> None:
         records = []
@@ -53,7 +283,7 @@ class PgVectorWrapper(VectorStore):
                 need_embed.append(idx)
                 texts.append(item.text)
         if need_embed:
-            embeddings = self._embedder.embed(texts, model=self._embedding_model)
+            embeddings = await self._embed(texts)
             for idx, emb in zip(need_embed, embeddings, strict=True):
                 items[idx].payload["embedding"] = emb
 
@@ -61,7 +291,11 @@ class PgVectorWrapper(VectorStore):
             vector = item.payload.get("embedding") or []
             metadata = {**item.metadata, "domain": domain, "content": item.text}
             records.append(VectorRecord(item_id=item.id, vector=vector, metadata=metadata))
-        self._store.upsert(records)
+        if self._bulk_batch_size:
+            self.last_bulk_stats = await self._call("upsert_bulk", records, batch_size=self._bulk_batch_size)
+        else:
+            await self._call("upsert", records)
+        self._lexical.add_many(domain, ((item.id, item.text) for item in items))
 
     async def search(
         self,
@@ -72,53 +306,309 @@ class PgVectorWrapper(VectorStore):
         k_keyword: int | None = None,
         filters: dict | None = None,
     ) -> list[ChunkScore]:
+        """Поиск по домену.
+
+        В hybrid-режиме (явный ``k_keyword`` или ``mode: hybrid`` домена в KnowledgeConfig)
+        dense- и full-text-кандидаты выбираются независимо и параллельно, затем сливаются
+        по ``fuse`` домена (RRF или alpha-смешивание). Иначе vector-кандидаты пересчитываются
+        лексически (alpha-смешивание). Dense-ветка берёт не меньше ``k_vector`` домена.
+        """
+
+        query_vec = (await self._embed_queries([query]))[0]
+        return await self._search_embedded(domain, query, query_vec, k_vector=k_vector, k_keyword=k_keyword, filters=filters)
+
+    async def search_domains(
+        self,
+        *,
+        domains: Sequence[str],
+        query: str,
+        k: int,
+        per_domain_k: int | None = None,
+        k_keyword: int | None = None,
+        filters: dict | None = None,
+    ) -> list[ChunkScore]:
+        """Поиск по нескольким доменам с одним эмбеддингом запроса.
+
+        Vector-домены обслуживаются одним SQL-запросом (LATERAL по списку доменов),
+        hybrid-домены — параллельно. Результат — общий рейтинг длиной ``k`` с квотой
+        ``per_domain_k`` (по умолчанию ``k``) на домен. С ``mmr_lambda``/``max_per_parent``
+        кандидатов берётся больше, и ``k`` из них отбираются MMR по их векторам.
+        """
+
+        if not domains:
+            return []
+        diversify = self._mmr_lambda is not None or bool(self._max_per_parent)
+        quota = (per_domain_k or k) * (_MMR_POOL_FACTOR if diversify else 1)
+        vectors: dict[str, list[float]] | None = {} if diversify else None
+        query_vec = (await self._embed_queries([query]))[0]
+        dense_domains = [d for d in domains if not _keyword_budget(self._knowledge_config, d, k_keyword)]
+
+        def search_one(domain: str):
+            return self._search_embedded(
+                domain, query, query_vec, k_vector=quota, k_keyword=k_keyword, filters=filters, vectors=vectors
+            )
+
+        branches = {domain: search_one(domain) for domain in domains if domain not in dense_domains}
+        if dense_domains:
+            branches[", ".join(dense_domains)] = self._search_dense_domains(
+                dense_domains, query, query_vec, k=quota, filters=filters, vectors=vectors
+            )
+        merged, failed = await _gather_isolated(branches)
+        if dense_domains and len(dense_domains) > 1 and ", ".join(dense_domains) in failed:
+            # Общий запрос по dense-доменам упал: повторяем их по одному, чтобы изолировать сбойный.
+            retried, _ = await _gather_isolated({domain: search_one(domain) for domain in dense_domains})
+            merged.extend(retried)
+        if vectors is None:
+            return _merge_ranked(merged, limit=k)
+        pool = _merge_ranked(merged, limit=quota * len(domains))
+        return _diversify(
+            pool,
+            vector_matrix([vectors.get(result.chunk.id) for result in pool]),
+            k=k,
+            mmr_lambda=self._mmr_lambda,
+            max_per_parent=self._max_per_parent,
+        )
+
+    async def search_many(self, requests: Sequence[SearchRequest]) -> list[list[ChunkScore]]:
+        """Пакетный поиск: один вызов эмбеддера и один SQL-запрос на все dense-ветки.
+
+        Keyword-ветки hybrid-доменов идут параллельно с dense-запросом; результат —
+        список результатов в порядке ``requests``.
+        """
+
+        if not requests:
+            return []
+        texts = list(dict.fromkeys(request.query for request in requests))
+        vectors = dict(zip(texts, await self._embed_queries(texts), strict=True))
+        budgets = [_keyword_budget(self._knowledge_config, r.domain, r.k_keyword) for r in requests]
+        dense_requests = [
+            (
+                r.domain,
+                vectors[r.query],
+                r.filters,
+                self._dense_k(r.domain, r.k) if keyword_k else max(self._dense_k(r.domain, r.k), self._rescore_fetch_k),
+            )
+            for r, keyword_k in zip(requests, budgets)
+        ]
+        keyword_tasks = [
+            self._call("keyword_query", r.query, top_k=keyword_k, metadata_filter={**(r.filters or {}), "domain": r.domain})
+            for r, keyword_k in zip(requests, budgets)
+            if keyword_k
+        ]
+        dense, *keyword = await asyncio.gather(
+            self._call("query_many", dense_requests, with_vectors=False, **self._ann_settings),
+            *keyword_tasks,
+        )
+        keyword_results = iter(keyword)
+        results: list[list[ChunkScore]] = []
+        for request, keyword_k, raw in zip(requests, budgets, dense):
+            if keyword_k:
+                results.append(self._fuse(request.domain, raw, next(keyword_results), limit=request.k))
+            else:
+                results.append(self._rescore(request.domain, request.query, vectors[request.query], raw, limit=request.k))
+        return results
+
+    async def _search_embedded(
+        self,
+        domain: str,
+        query: str,
+        query_vec: list[float],
+        *,
+        k_vector: int,
+        k_keyword: int | None,
+        filters: dict | None,
+        vectors: dict[str, list[float]] | None = None,
+    ) -> list[ChunkScore]:
+        # vectors — словарь для MMR: dense-кандидаты приходят вместе с векторами.
         meta = {**(filters or {}), "domain": domain}
-        query_vec = self._embedder.embed([query], model=self._embedding_model)[0]
-        raw = self._store.query(query_vec, top_k=max(k_vector, k_keyword or k_vector), metadata_filter=meta)
+        keyword_k = _keyword_budget(self._knowledge_config, domain, k_keyword)
+        if keyword_k:
+            dense, keyword = await asyncio.gather(
+                self._call(
+                    "query",
+                    query_vec,
+                    top_k=self._dense_k(domain, k_vector),
+                    metadata_filter=meta,
+                    with_vectors=vectors is not None,
+                    **self._ann_settings,
+                ),
+                self._call("keyword_query", query, top_k=keyword_k, metadata_filter=meta),
+            )
+            _collect_vectors(vectors, dense)
+            fused = self._fuse(domain, dense, keyword, limit=k_vector)
+            if vectors is not None:
+                # Кандидаты только из keyword-ветки приходят без векторов: без них MMR счёл бы их
+                # максимально новыми. Добираем векторы одним запросом по id.
+                missing = [result.chunk.id for result in fused if result.chunk.id not in vectors]
+                if missing:
+                    _collect_vectors(vectors, await self._call("fetch_vectors", missing, domain=domain))
+            return fused
+
+        raw = await self._call(
+            "query",
+            query_vec,
+            top_k=max(self._dense_k(domain, k_vector), self._rescore_fetch_k),
+            metadata_filter=meta,
+            with_vectors=vectors is not None,
+            **self._ann_settings,
+        )
+        _collect_vectors(vectors, raw)
+        return self._rescore(domain, query, query_vec, raw, limit=k_vector)
 
+    async def _search_dense_domains(
+        self,
+        domains: Sequence[str],
+        query: str,
+        query_vec: list[float],
+        *,
+        k: int,
+        filters: dict | None,
+        vectors: dict[str, list[float]] | None = None,
+    ) -> list[ChunkScore]:
+        by_domain = await self._call(
+            "query_domains",
+            query_vec,
+            domains=domains,
+            top_k=max(max(self._dense_k(domain, k) for domain in domains), self._rescore_fetch_k),
+            metadata_filter=filters or None,
+            with_vectors=vectors is not None,
+            **self._ann_settings,
+        )
         results: list[ChunkScore] = []
-        for rec in raw:
-            text = rec.metadata.get("content", "")
-            vector_score = _cosine(query_vec, rec.vector)
-            lexical = _lexical_score(text, query)
-            combined = _combine_scores(vector_score, lexical, alpha=self._alpha)
-            chunk = Chunk(id=rec.item_id, domain=domain, text=text, payload={}, metadata=rec.metadata)
-            results.append(ChunkScore(chunk=chunk, score=combined))
+        for domain, raw in by_domain.items():
+            _collect_vectors(vectors, raw)
+            results.extend(self._rescore(domain, query, query_vec, raw, limit=k))
+        return results
+
+    def _dense_k(self, domain: str, k: int) -> int:
+        return _dense_budget(self._knowledge_config, domain, k)
+
+    def _fuse(self, domain: str, dense: list[VectorRecord], keyword: list[VectorRecord], *, limit: int) -> list[ChunkScore]:
+        return _fuse(
+            domain, dense, keyword, config=self._knowledge_config, limit=limit, rrf_k=self._rrf_k, alpha=self._alpha
+        )
+
+    def _rescore(self, domain: str, query: str, query_vec: list[float], raw: list[VectorRecord], *, limit: int) -> list[ChunkScore]:
+        # Строки, загруженные в БД другим процессом, индексируем при первом появлении в выдаче.
+        self._lexical.add_many(
+            domain,
+            ((rec.item_id, rec.metadata.get("content", "")) for rec in raw if not self._lexical.contains(domain, rec.item_id)),
+        )
+        return _rescore_lexically(domain, query, query_vec, raw, lexical=self._lexical, alpha=self._alpha, limit=limit)
+
+    async def content_hashes(
+        self, *, knowledge_version_id: str | None, domain: str | None = None, source: str | None = None
+    ) -> dict[tuple[str, str], str | None]:
+        """``(domain, item_id) -> content_hash`` строк версии знаний (и источника ``source``)."""
+
+        return await self._call(
+            "content_hashes", knowledge_version_id=knowledge_version_id, domain=domain, source=source
+        )
+
+    async def refresh_expiry(self, *, domain: str, ids: Sequence[str], expires_at: str | None) -> int:
+        """Продлевает TTL строк домена без повторного эмбеддинга."""
 
-        results.sort(key=lambda r: r.score, reverse=True)
-        return results[:k_vector]
+        return await self._call("refresh_expiry", ids, domain=domain, expires_at=expires_at)
+
+    async def delete(self, *, domain: str, ids: Sequence[str]) -> int:
+        """Удаляет строки домена одним запросом и убирает их из лексического индекса."""
+
+        deleted = await self._call("delete", ids, domain=domain)
+        for item_id in ids:
+            self._lexical.remove(domain, item_id)
+        return deleted
 
     def cleanup_expired(self) -> None:
-        """Вызывает очистку просроченных записей, если реализована."""
+        """Вызывает очистку просроченных записей, если реализована (только синхронный store)."""
 
+        if self._native_async:
+            raise RuntimeError("AsyncPgVectorStore: используйте acleanup_expired()")
         try:
             self._store.cleanup_expired()
         except AttributeError:
             return
 
+    async def acleanup_expired(self) -> None:
+        await self._call("cleanup_expired")
+
+    async def aclose(self) -> None:
+        """Закрывает пул соединений асинхронного store (следующий запрос откроет новый)."""
+
+        if self._native_async:
+            await self._store.close()
+
+    async def _embed(self, texts: Sequence[str]) -> list[list[float]]:
+        return await embed_async(self._embedder, texts, model=self._embedding_model, executor=self._executor)
+
+    async def _embed_queries(self, texts: Sequence[str]) -> list[list[float]]:
+        return await embed_async(self._query_embedder, texts, model=self._embedding_model, executor=self._executor)
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        # Нативно асинхронный store ожидаем напрямую, синхронный уводим в executor.
+        fn = getattr(self._store, method)
+        if self._native_async:
+            return await fn(*args, **kwargs)
+        return await self._executor.run(fn, *args, **kwargs)
+
 
 class InMemoryVectorStore(VectorStore):
-    """In-memory реализация VectorStore с гибридным скорингом для тестов/CLI."""
+    """In-memory реализация VectorStore с гибридным скорингом для тестов/CLI.
+
+    Скоринг (NumPy + BM25) и обновление индексов выполняются в ``executor`` под
+    общей блокировкой, event loop только ждёт результат. ``vector_precision`` и
+    ``rescore_precision`` задают компактный формат векторов (см. MemoryVectorStore).
+    """
 
     def __init__(
         self,
         *,
         embedding_provider: EmbeddingProvider | None = None,
+        query_embedding_provider: EmbeddingProvider | None = None,
         embedding_model: str | None = None,
         alpha: float = 0.7,
+        knowledge_config: KnowledgeConfig | None = None,
+        rrf_k: int = 60,
+        executor: StoreExecutor | None = None,
+        vector_precision: VectorPrecision = "float32",
+        rescore_precision: VectorPrecision | None = None,
+        mmr_lambda: float | None = None,
+        max_per_parent: int | None = None,
     ) -> None:
-        self._store = MemoryVectorStore()
+        self._executor = executor or StoreExecutor()
+        self._lock = threading.Lock()
+        self._store = MemoryVectorStore(precision=vector_precision, rescore_precision=rescore_precision)
         self._embedder = embedding_provider or TokenFrequencyEmbeddingProvider()
+        # Эмбеддер поисковых запросов (например, с кешем); ingest идёт мимо него.
+        self._query_embedder = query_embedding_provider or self._embedder
         self._embedding_model = embedding_model
         self._alpha = alpha
+        self._knowledge_config = knowledge_config
+        self._rrf_k = rrf_k
+        self._lexical = BM25Index()
+        self._mmr_lambda = mmr_lambda
+        self._max_per_parent = max_per_parent
+
+    @property
+    def executor(self) -> StoreExecutor:
+        return self._executor
 
     async def upsert(self, *, domain: str, items: list[Chunk]) -> None:
         records: list[VectorRecord] = []
-        vectors = self._embedder.embed([item.text for item in items], model=self._embedding_model)
+        vectors = [item.payload.get("embedding") for item in items]
+        need_embed = [idx for idx, vector in enumerate(vectors) if not vector]
+        if need_embed:
+            embeddings = await self._embed([items[idx].text for idx in need_embed])
+            for idx, vector in zip(need_embed, embeddings, strict=True):
+                vectors[idx] = vector
         for item, vector in zip(items, vectors, strict=True):
             metadata = {**item.metadata, "domain": domain, "content": item.text}
             records.append(VectorRecord(item_id=item.id, vector=vector, metadata=metadata))
-        self._store.upsert(records)
+        await self._executor.run(self._apply_upsert, domain, records, items)
+
+    def _apply_upsert(self, domain: str, records: list[VectorRecord], items: list[Chunk]) -> None:
+        with self._lock:
+            self._store.upsert(records)
+            self._lexical.add_many(domain, ((item.id, item.text) for item in items))
 
     async def search(
         self,
@@ -129,21 +619,271 @@ class InMemoryVectorStore(VectorStore):
         k_keyword: int | None = None,
         filters: dict | None = None,
     ) -> list[ChunkScore]:
-        query_vec = self._embedder.embed([query], model=self._embedding_model)[0]
-        raw = self._store.query(query_vec, top_k=max(k_vector, k_keyword or k_vector), metadata_filter={**(filters or {}), "domain": domain})
-        results: list[ChunkScore] = []
-        for rec in raw:
-            text = rec.metadata.get("content", "")
-            vector_score = _cosine(query_vec, rec.vector)
-            lexical = _lexical_score(text, query)
-            combined = _combine_scores(vector_score, lexical, alpha=self._alpha)
-            chunk = Chunk(id=rec.item_id, domain=domain, text=text, payload={}, metadata=rec.metadata)
-            results.append(ChunkScore(chunk=chunk, score=combined))
-        results.sort(key=lambda r: r.score, reverse=True)
-        return results[:k_vector]
+        query_vec = (await self._embed_queries([query]))[0]
+        return await self._executor.run(
+            self._search_locked, [domain], query, query_vec, k=k_vector, k_keyword=k_keyword, filters=filters
+        )
 
-    def cleanup_expired(self) -> None:
-        return
+    async def search_domains(
+        self,
+        *,
+        domains: Sequence[str],
+        query: str,
+        k: int,
+        per_domain_k: int | None = None,
+        k_keyword: int | None = None,
+        filters: dict | None = None,
+    ) -> list[ChunkScore]:
+        """Поиск по нескольким доменам с одним эмбеддингом запроса и квотой на домен.
+
+        С ``mmr_lambda``/``max_per_parent`` ``k`` результатов отбираются MMR из расширенного пула.
+        """
+
+        if not domains:
+            return []
+        diversify = self._mmr_lambda is not None or bool(self._max_per_parent)
+        quota = (per_domain_k or k) * (_MMR_POOL_FACTOR if diversify else 1)
+        query_vec = (await self._embed_queries([query]))[0]
+        results = await self._executor.run(
+            self._search_locked, domains, query, query_vec, k=quota, k_keyword=k_keyword, filters=filters, isolate=True
+        )
+        if not diversify:
+            return _merge_ranked(results, limit=k)
+        return await self._executor.run(self._diversify_locked, _merge_ranked(results, limit=len(results)), k)
+
+    def _diversify_locked(self, pool: list[ChunkScore], k: int) -> list[ChunkScore]:
+        with self._lock:
+            vectors = self._store.get_vectors([result.chunk.id for result in pool])
+        return _diversify(pool, vectors, k=k, mmr_lambda=self._mmr_lambda, max_per_parent=self._max_per_parent)
+
+    async def search_many(self, requests: Sequence[SearchRequest]) -> list[list[ChunkScore]]:
+        """Пакетный поиск: один вызов эмбеддера и одно матричное умножение на все запросы."""
+
+        if not requests:
+            return []
+        texts = list(dict.fromkeys(request.query for request in requests))
+        vectors = dict(zip(texts, await self._embed_queries(texts), strict=True))
+        return await self._executor.run(self._search_many_locked, list(requests), vectors)
+
+    async def _embed(self, texts: Sequence[str]) -> list[list[float]]:
+        return await embed_async(self._embedder, texts, model=self._embedding_model, executor=self._executor)
+
+    async def _embed_queries(self, texts: Sequence[str]) -> list[list[float]]:
+        return await embed_async(self._query_embedder, texts, model=self._embedding_model, executor=self._executor)
+
+    def _search_many_locked(self, requests: list[SearchRequest], vectors: dict[str, list[float]]) -> list[list[ChunkScore]]:
+        metas = [{**(request.filters or {}), "domain": request.domain} for request in requests]
+        with self._lock:
+            dense = self._store.query_many(
+                [vectors[request.query] for request in requests],
+                top_k=[_dense_budget(self._knowledge_config, request.domain, request.k) for request in requests],
+                metadata_filters=metas,
+            )
+            return [
+                self._finish(request.domain, request.query, vectors[request.query], raw, meta, k=request.k, k_keyword=request.k_keyword)
+                for request, raw, meta in zip(requests, dense, metas)
+            ]
+
+    def _search_locked(
+        self,
+        domains: Sequence[str],
+        query: str,
+        query_vec: list[float],
+        *,
+        k: int,
+        k_keyword: int | None,
+        filters: dict | None,
+        isolate: bool = False,
+    ) -> list[ChunkScore]:
+        # isolate — ошибка одного домена логируется, остальные домены отвечают (search_domains).
+        with self._lock:
+            results: list[ChunkScore] = []
+            for domain in domains:
+                try:
+                    results.extend(
+                        self._search_embedded(domain, query, query_vec, k_vector=k, k_keyword=k_keyword, filters=filters)
+                    )
+                except Exception as exc:
+                    if not isolate:
+                        raise
+                    logger.warning("Поиск по домену %s не удался: %s", domain, exc)
+            return results
+
+    def _search_embedded(
+        self,
+        domain: str,
+        query: str,
+        query_vec: list[float],
+        *,
+        k_vector: int,
+        k_keyword: int | None,
+        filters: dict | None,
+    ) -> list[ChunkScore]:
+        meta = {**(filters or {}), "domain": domain}
+        raw = self._store.query(
+            query_vec, top_k=_dense_budget(self._knowledge_config, domain, k_vector), metadata_filter=meta
+        )
+        return self._finish(domain, query, query_vec, raw, meta, k=k_vector, k_keyword=k_keyword)
+
+    def _finish(
+        self,
+        domain: str,
+        query: str,
+        query_vec: list[float],
+        dense: list[VectorRecord],
+        meta: dict,
+        *,
+        k: int,
+        k_keyword: int | None,
+    ) -> list[ChunkScore]:
+        keyword_k = _keyword_budget(self._knowledge_config, domain, k_keyword)
+        if keyword_k:
+            keyword = self._keyword_candidates(domain, query, keyword_k, meta)
+            return _fuse(
+                domain, dense, keyword, config=self._knowledge_config, limit=k, rrf_k=self._rrf_k, alpha=self._alpha
+            )
+        return _rescore_lexically(domain, query, query_vec, dense, lexical=self._lexical, alpha=self._alpha, limit=k)
+
+    def _keyword_candidates(self, domain: str, query: str, k: int, meta: dict) -> list[VectorRecord]:
+        wanted = meta.items()
+
+        def accept(item_id: str) -> bool:
+            metadata = self._store.get_metadata(item_id)
+            return metadata is not None and wanted <= metadata.items()
+
+        return [
+            VectorRecord(item_id=item_id, vector=[], metadata=self._store.get_metadata(item_id) or {}, score=score)
+            for item_id, score in self._lexical.top_k(domain, query, k, accept=accept)
+        ]
+
+    async def content_hashes(
+        self, *, knowledge_version_id: str | None, domain: str | None = None, source: str | None = None
+    ) -> dict[tuple[str, str], str | None]:
+        return await self._executor.run(self._content_hashes_locked, knowledge_version_id, domain, source)
+
+    async def refresh_expiry(self, *, domain: str, ids: Sequence[str], expires_at: str | None) -> int:
+        return await self._executor.run(self._refresh_expiry_locked, domain, list(ids), expires_at)
+
+    async def delete(self, *, domain: str, ids: Sequence[str]) -> int:
+        return await self._executor.run(self._delete_locked, domain, list(ids))
+
+    def _content_hashes_locked(
+        self, knowledge_version_id: str | None, domain: str | None, source: str | None
+    ) -> dict[tuple[str, str], str | None]:
+        with self._lock:
+            return self._store.content_hashes(knowledge_version_id=knowledge_version_id, domain=domain, source=source)
+
+    def _refresh_expiry_locked(self, domain: str, ids: list[str], expires_at: str | None) -> int:
+        with self._lock:
+            return self._store.refresh_expiry(ids, domain=domain, expires_at=expires_at)
+
+    def _delete_locked(self, domain: str, ids: list[str]) -> int:
+        with self._lock:
+            deleted = self._store.delete(ids, domain=domain)
+            for item_id in ids:
+                self._lexical.remove(domain, item_id)
+            return deleted
+
+    def save_snapshot(self, path: str | Path, *, fingerprint: str = "") -> None:
+        """Сохраняет векторы, metadata и BM25-индекс в каталог ``path``.
+
+        Каталог собирается рядом под временным именем и подменяется переименованием,
+        поэтому воркеры, читающие старый снапшот, не видят его наполовину записанным.
+        ``fingerprint`` (хэш источника, модель эмбеддингов) сверяется при загрузке.
+        """
+
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = target.with_name(f".{target.name}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        try:
+            with self._lock:
+                self._store.save(staging)
+                with (staging / "lexical.json").open("w", encoding="utf-8") as handle:
+                    json.dump(self._lexical.to_state(), handle, ensure_ascii=False)
+                manifest = {
+                    "format": SNAPSHOT_FORMAT,
+                    "fingerprint": fingerprint,
+                    "items": len(self._store),
+                    "generation": uuid.uuid4().hex,
+                }
+            (staging / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+            retired = target.with_name(f".{target.name}.old-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+            if target.exists():
+                os.replace(target, retired)
+            os.replace(staging, target)
+            shutil.rmtree(retired, ignore_errors=True)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def load_snapshot(self, path: str | Path, *, fingerprint: str | None = None, mmap: bool = True) -> bool:
+        """Подменяет содержимое store снапшотом; ``False``, если его нет или он устарел.
+
+        С ``mmap`` массивы векторов отображаются в память (copy-on-write): старт не
+        читает их целиком, а воркеры одного хоста делят страницы через page cache.
+
+        Другой воркер может подменить каталог посреди чтения (``save_snapshot``).
+        Поэтому ``generation`` из manifest сверяется до и после чтения файлов: если
+        она сменилась или файлы пропали на время переименования, чтение повторяется.
+        Массивы, не совпадающие по форме с manifest, дают ``False``.
+        """
+
+        target = Path(path)
+        for attempt in range(_SNAPSHOT_LOAD_ATTEMPTS):
+            if attempt:
+                time.sleep(_SNAPSHOT_RETRY_DELAY)
+            last = attempt == _SNAPSHOT_LOAD_ATTEMPTS - 1
+            try:
+                manifest = _read_manifest(target)
+            except FileNotFoundError:
+                if last:
+                    return False
+                continue
+            except (OSError, ValueError) as exc:
+                logger.warning("Снапшот знаний %s не читается: %s", target, exc)
+                return False
+            if manifest.get("format") != SNAPSHOT_FORMAT:
+                logger.info("Снапшот знаний %s в формате %s, ожидается %s", target, manifest.get("format"), SNAPSHOT_FORMAT)
+                return False
+            if fingerprint is not None and manifest.get("fingerprint") != fingerprint:
+                logger.info("Снапшот знаний %s устарел (fingerprint не совпадает)", target)
+                return False
+            try:
+                store = MemoryVectorStore.load(target, mmap=mmap)
+                lexical = BM25Index.from_state(json.loads((target / "lexical.json").read_text(encoding="utf-8")))
+                swapped = _read_manifest(target).get("generation") != manifest.get("generation")
+            except (OSError, ValueError, KeyError) as exc:
+                if last:
+                    logger.warning("Снапшот знаний %s повреждён: %s", target, exc)
+                    return False
+                continue
+            if not swapped:
+                break
+            logger.info("Снапшот знаний %s подменён во время чтения, читаем заново", target)
+        else:
+            return False
+        if (store.precision, store.rescore_precision) != (self._store.precision, self._store.rescore_precision):
+            logger.info("Снапшот знаний %s сохранён в другом формате векторов", target)
+            return False
+        with self._lock:
+            self._store = store
+            self._lexical = lexical
+        return True
+
+    def cleanup_expired(self) -> int:
+        """Удаляет записи с истёкшим ``expires_at`` из векторов и BM25; возвращает их число.
+
+        Просроченные записи не попадают в выдачу и до очистки; она только освобождает
+        память и стоит O(expired log n) за счёт кучи сроков в MemoryVectorStore.
+        """
+
+        with self._lock:
+            removed = self._store.remove_expired()
+            for domain, item_id in removed:
+                self._lexical.remove(domain, item_id)
+        return len(removed)
+
+    async def acleanup_expired(self) -> int:
+        return await self._executor.run(self.cleanup_expired)
 
 
 def _cosine(a: Iterable[float], b: Iterable[float]) -> float:
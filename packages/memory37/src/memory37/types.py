@@ -88,6 +88,16 @@ class ChunkScore(BaseModel):
     score: float
 
 
+class SearchRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    domain: str
+    query: str
+    k: int = 8
+    k_keyword: int | None = None
+    filters: dict[str, Any] | None = None
+
+
 class GraphFact(BaseModel):
     node_id: str
     type: str
@@ -2,13 +2,35 @@
 
 from __future__ import annotations
 
+import heapq
 import json
-from dataclasses import dataclass
-from math import sqrt
-from typing import Callable, Iterable, Protocol, Sequence
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Literal, Protocol, Sequence
 
-from psycopg import Connection
+import numpy as np
+import psycopg
+from psycopg import AsyncConnection, Connection
 from psycopg import sql
+from psycopg.types import TypeInfo
+
+try:  # pragma: no cover - optional dependency
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:  # pragma: no cover - pooling is only needed by AsyncPgVectorStore
+    AsyncConnectionPool = None  # type: ignore[assignment,misc]
+
+try:  # pragma: no cover - optional dependency
+    from pgvector.psycopg.vector import register_vector_info
+except ImportError:  # pragma: no cover - fall back to text literals
+    register_vector_info = None  # type: ignore[assignment]
+
+from .lexical import tokenize
+
+logger = logging.getLogger(__name__)
 
 
 class EmbeddingProvider(Protocol):
@@ -20,11 +42,15 @@ class EmbeddingProvider(Protocol):
 
 @dataclass
 class VectorRecord:
-    """Single vector record for storage."""
+    """Single vector record for storage.
+
+    ``score`` is filled by stores on query results (cosine similarity to the query).
+    """
 
     item_id: str
     vector: list[float]
     metadata: dict[str, str]
+    score: float | None = None
 
 
 class VectorStore(Protocol):
@@ -37,17 +63,353 @@ class VectorStore(Protocol):
         """Return nearest neighbours."""
 
 
+VectorPrecision = Literal["float32", "float16", "int8"]
+
+_PRECISION_DTYPES: dict[str, type[np.generic]] = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
 class MemoryVectorStore(VectorStore):
-    """In-memory implementation used for tests and prototyping."""
+    """In-memory implementation used for tests and prototyping.
+
+    Vectors live in a contiguous matrix (one row per record) with norms
+    precomputed at upsert, so a query is a single matrix product followed by
+    ``argpartition`` top-k selection.
+
+    ``precision`` selects the row format: ``float32`` (4 bytes per dimension),
+    ``float16`` (2 bytes) or ``int8`` with one float32 scale per row (1 byte).
+    Compact rows are widened to float32 block by block while scoring, so the
+    query never materializes a full-precision copy of the matrix. With
+    ``rescore_precision`` a second matrix in that format is kept and the best
+    ``top_k * rescore_factor`` candidates of the compact scan are re-scored with
+    it before the final cut.
+
+    Records whose ``expires_at`` metadata has passed are skipped by queries as
+    soon as they expire and physically dropped by :meth:`remove_expired`, which
+    pops them from a min-heap of deadlines kept up to date by upserts.
+    """
+
+    _INITIAL_CAPACITY = 64
+    _SCORE_BLOCK = 16_384
+
+    def __init__(
+        self,
+        *,
+        precision: VectorPrecision = "float32",
+        rescore_precision: VectorPrecision | None = None,
+        rescore_factor: int = 4,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if precision not in _PRECISION_DTYPES or (rescore_precision and rescore_precision not in _PRECISION_DTYPES):
+            raise ValueError(f"precision must be one of {sorted(_PRECISION_DTYPES)}")
+        if rescore_factor < 1:
+            raise ValueError("rescore_factor must be at least 1")
+        self._precision = precision
+        self._rescore_precision = rescore_precision if rescore_precision != precision else None
+        self._rescore_factor = rescore_factor
+        self._ids: list[str] = []
+        self._metadata: list[dict[str, str]] = []
+        self._positions: dict[str, int] = {}
+        self._matrix: np.ndarray = np.zeros((0, 0), dtype=_PRECISION_DTYPES[precision])
+        self._scales: np.ndarray = np.zeros(0, dtype=np.float32)
+        self._norms: np.ndarray = np.zeros(0, dtype=np.float32)
+        self._rescore: _QuantizedRows | None = None
+        self._dimension: int | None = None
+        self._clock = clock
+        # Expiry index: per-row deadlines (inf = never) for query-time filtering and a
+        # min-heap of (deadline, item_id) for sweeps. Re-upserts leave stale heap
+        # entries behind; ``_deadlines_by_id`` tells them apart.
+        self._deadlines: np.ndarray = np.zeros(0, dtype=np.float64)
+        self._deadlines_by_id: dict[str, float] = {}
+        self._expiry_heap: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dimension(self) -> int | None:
+        return self._dimension
+
+    @property
+    def precision(self) -> str:
+        return self._precision
 
-    def __init__(self) -> None:
-        self._records: list[VectorRecord] = []
+    @property
+    def rescore_precision(self) -> str | None:
+        return self._rescore_precision
+
+    @property
+    def vector_bytes(self) -> int:
+        """Bytes held by vector rows, scales, norms and the rescoring matrix (excluding spare capacity)."""
+
+        size = len(self._ids)
+        total = size * (self._matrix.itemsize * (self._dimension or 0) + self._norms.itemsize)
+        if self._precision == "int8":
+            total += size * self._scales.itemsize
+        if self._rescore is not None:
+            total += self._rescore.nbytes(size)
+        return total
 
     def upsert(self, records: Iterable[VectorRecord]) -> None:
-        existing = {record.item_id: record for record in self._records}
-        for record in records:
-            existing[record.item_id] = record
-        self._records = list(existing.values())
+        records = list(records)
+        if not records:
+            return
+        vectors = np.asarray([record.vector for record in records], dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("All vectors in a batch must have the same dimension")
+        if self._dimension is None:
+            self._dimension = int(vectors.shape[1])
+            self._matrix = np.zeros((self._INITIAL_CAPACITY, self._dimension), dtype=self._matrix.dtype)
+            self._scales = np.zeros(self._INITIAL_CAPACITY, dtype=np.float32)
+            self._norms = np.zeros(self._INITIAL_CAPACITY, dtype=np.float32)
+            self._deadlines = np.full(self._INITIAL_CAPACITY, np.inf)
+            if self._rescore_precision:
+                self._rescore = _QuantizedRows(self._rescore_precision, self._INITIAL_CAPACITY, self._dimension)
+        elif vectors.shape[1] != self._dimension:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match store dimension {self._dimension}")
+
+        rows = np.empty(len(records), dtype=np.intp)
+        for offset, record in enumerate(records):
+            position = self._positions.get(record.item_id)
+            if position is None:
+                position = len(self._ids)
+                self._positions[record.item_id] = position
+                self._ids.append(record.item_id)
+                self._metadata.append(record.metadata)
+            else:
+                self._metadata[position] = record.metadata
+            rows[offset] = position
+
+        self._reserve(len(self._ids))
+        stored, scales = quantize_vectors(vectors, self._precision)
+        self._matrix[rows] = stored
+        if scales is not None:
+            self._scales[rows] = scales
+        # Norms of the stored (rounded) rows keep cosine consistent with what is scored.
+        self._norms[rows] = np.linalg.norm(dequantize_vectors(stored, scales), axis=1)
+        if self._rescore is not None:
+            self._rescore.assign(rows, vectors)
+        for row, record in zip(rows, records):
+            self._deadlines[row] = self._track_expiry(record.item_id, record.metadata)
+
+    def get_metadata(self, item_id: str) -> dict[str, str] | None:
+        """Metadata of a live record; ``None`` for unknown and expired ids."""
+
+        position = self._positions.get(item_id)
+        if position is None or self._deadlines[position] <= self._clock():
+            return None
+        return self._metadata[position]
+
+    def get_vectors(self, item_ids: Sequence[str]) -> np.ndarray:
+        """Stored vectors of ``item_ids`` as float32 rows; unknown ids get zero rows."""
+
+        positions = [self._positions.get(item_id, -1) for item_id in item_ids]
+        rows = np.array(positions, dtype=np.int64)
+        found = rows >= 0
+        result = np.zeros((len(rows), self.dimension or 0), dtype=np.float32)
+        if found.any():
+            picked = rows[found]
+            if self._rescore is not None:
+                result[found] = self._rescore.rows(picked)
+            else:
+                scales = self._scales[picked] if self._precision == "int8" else None
+                result[found] = dequantize_vectors(self._matrix[picked], scales)
+        return result
+
+    def save(self, directory: str | Path) -> None:
+        """Write rows as ``.npy`` arrays plus ids and metadata as JSON into ``directory``."""
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        size = len(self._ids)
+        arrays = {"vectors": self._matrix, "scales": self._scales, "norms": self._norms}
+        if self._rescore is not None:
+            arrays.update(
+                rescore_vectors=self._rescore.matrix, rescore_scales=self._rescore.scales, rescore_norms=self._rescore.norms
+            )
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(array[:size]))
+        layout = {
+            "precision": self._precision,
+            "rescore_precision": self._rescore_precision,
+            "rescore_factor": self._rescore_factor,
+            "dimension": self._dimension,
+            "count": size,
+        }
+        (directory / "vectors.json").write_text(json.dumps(layout), encoding="utf-8")
+        with (directory / "records.json").open("w", encoding="utf-8") as handle:
+            json.dump({"ids": self._ids, "metadata": self._metadata}, handle, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str | Path, *, mmap: bool = True) -> "MemoryVectorStore":
+        """Open a store written by :meth:`save`.
+
+        With ``mmap`` the arrays are mapped copy-on-write: pages are read lazily and
+        shared between processes that map the same files until a process modifies
+        them (an upsert past the mapped size moves the rows to private memory).
+        """
+
+        directory = Path(directory)
+        layout = json.loads((directory / "vectors.json").read_text(encoding="utf-8"))
+        store = cls(
+            precision=layout["precision"],
+            rescore_precision=layout["rescore_precision"],
+            rescore_factor=layout["rescore_factor"],
+        )
+        records = json.loads((directory / "records.json").read_text(encoding="utf-8"))
+        if len(records["ids"]) != layout["count"]:
+            raise ValueError(f"snapshot {directory} is inconsistent: {len(records['ids'])} ids for {layout['count']} rows")
+        store._ids = records["ids"]
+        store._metadata = records["metadata"]
+        store._positions = {item_id: idx for idx, item_id in enumerate(store._ids)}
+        store._deadlines = np.array(
+            [store._track_expiry(item_id, metadata) for item_id, metadata in zip(store._ids, store._metadata)],
+            dtype=np.float64,
+        )
+        if not layout["count"]:
+            return store
+
+        def read(name: str) -> np.ndarray:
+            return np.load(directory / f"{name}.npy", mmap_mode="c" if mmap else None)
+
+        store._dimension = layout["dimension"]
+        store._matrix, store._scales, store._norms = read("vectors"), read("scales"), read("norms")
+        _check_rows(directory, "vectors", store._matrix, store._scales, store._norms, layout, store._precision)
+        if store._rescore_precision:
+            rescore = _QuantizedRows(store._rescore_precision, 0, store._dimension)
+            rescore.matrix, rescore.scales, rescore.norms = read("rescore_vectors"), read("rescore_scales"), read("rescore_norms")
+            _check_rows(
+                directory, "rescore_vectors", rescore.matrix, rescore.scales, rescore.norms, layout, store._rescore_precision
+            )
+            store._rescore = rescore
+        return store
+
+    def content_hashes(
+        self, *, knowledge_version_id: str | None, domain: str | None = None, source: str | None = None
+    ) -> dict[tuple[str, str], str | None]:
+        """``(domain, item_id) -> content_hash`` of the live records of one knowledge version.
+
+        ``source`` keeps only records whose ``ingest_source`` metadata matches. Expired
+        records are left out, so an incremental ingest writes them again with a fresh
+        ``expires_at``.
+        """
+
+        now = self._clock()
+        return {
+            (metadata.get("domain", ""), item_id): metadata.get("content_hash")
+            for item_id, metadata, deadline in zip(self._ids, self._metadata, self._deadlines)
+            if metadata.get("knowledge_version_id") == knowledge_version_id
+            and (domain is None or metadata.get("domain") == domain)
+            and (source is None or metadata.get("ingest_source") == source)
+            and deadline > now
+        }
+
+    def refresh_expiry(self, item_ids: Iterable[str], *, domain: str | None = None, expires_at: str | None) -> int:
+        """Set ``expires_at`` of existing records without touching their vectors; returns the count."""
+
+        refreshed = 0
+        for item_id in item_ids:
+            position = self._positions.get(item_id)
+            if position is None or (domain is not None and self._metadata[position].get("domain") != domain):
+                continue
+            metadata = {key: value for key, value in self._metadata[position].items() if key != "expires_at"}
+            if expires_at is not None:
+                metadata["expires_at"] = expires_at
+            self._metadata[position] = metadata
+            self._deadlines[position] = self._track_expiry(item_id, metadata)
+            refreshed += 1
+        return refreshed
+
+    def delete(self, item_ids: Iterable[str], *, domain: str | None = None) -> int:
+        """Remove records by id (optionally only within ``domain``); returns the number removed."""
+
+        doomed = {
+            position
+            for item_id in item_ids
+            if (position := self._positions.get(item_id)) is not None
+            and (domain is None or self._metadata[position].get("domain") == domain)
+        }
+        if not doomed:
+            return 0
+        count = len(self._ids)
+        keep = np.fromiter((idx not in doomed for idx in range(count)), dtype=bool, count=count)
+        size = int(keep.sum())
+        self._matrix[:size] = self._matrix[:count][keep]
+        self._scales[:size] = self._scales[:count][keep]
+        self._norms[:size] = self._norms[:count][keep]
+        self._deadlines[:size] = self._deadlines[:count][keep]
+        if self._rescore is not None:
+            self._rescore.compact(keep)
+        for position in doomed:
+            self._deadlines_by_id.pop(self._ids[position], None)
+        self._ids = [item_id for item_id, kept in zip(self._ids, keep) if kept]
+        self._metadata = [metadata for metadata, kept in zip(self._metadata, keep) if kept]
+        self._positions = {item_id: idx for idx, item_id in enumerate(self._ids)}
+        return len(doomed)
+
+    def remove_expired(self, now: float | None = None) -> list[tuple[str, str]]:
+        """Drop records whose ``expires_at`` is at or before ``now``; returns their ``(domain, item_id)``.
+
+        Expired ids are popped from the deadline heap and each hole is filled with
+        the current last row, so a sweep costs O(expired * (log n + dimension))
+        instead of a scan and compaction of the whole matrix. The moved rows change
+        position, which only affects the order of exactly tied scores.
+        """
+
+        now = self._clock() if now is None else now
+        heap = self._expiry_heap
+        doomed: list[int] = []
+        while heap and heap[0][0] <= now:
+            deadline, item_id = heapq.heappop(heap)
+            if self._deadlines_by_id.get(item_id) == deadline:
+                del self._deadlines_by_id[item_id]
+                doomed.append(self._positions[item_id])
+        removed: list[tuple[str, str]] = []
+        # Highest positions first: the last row is then never a hole still to be filled.
+        for position in sorted(doomed, reverse=True):
+            item_id = self._ids[position]
+            removed.append((self._metadata[position].get("domain", ""), item_id))
+            last = len(self._ids) - 1
+            if position != last:
+                self._move_row(last, position)
+            self._ids.pop()
+            self._metadata.pop()
+            del self._positions[item_id]
+        return removed
+
+    def _move_row(self, source: int, target: int) -> None:
+        self._matrix[target] = self._matrix[source]
+        self._scales[target] = self._scales[source]
+        self._norms[target] = self._norms[source]
+        self._deadlines[target] = self._deadlines[source]
+        if self._rescore is not None:
+            self._rescore.move(source, target)
+        item_id = self._ids[source]
+        self._ids[target] = item_id
+        self._metadata[target] = self._metadata[source]
+        self._positions[item_id] = target
+
+    def _track_expiry(self, item_id: str, metadata: dict[str, str]) -> float:
+        """Record the deadline of ``item_id`` in the expiry index and return it (inf if none)."""
+
+        deadline = _expiry_timestamp(metadata.get("expires_at"))
+        if deadline is None:
+            self._deadlines_by_id.pop(item_id, None)
+            return np.inf
+        if self._deadlines_by_id.get(item_id) != deadline:
+            self._deadlines_by_id[item_id] = deadline
+            heapq.heappush(self._expiry_heap, (deadline, item_id))
+            if len(self._expiry_heap) > 2 * len(self._deadlines_by_id) + 64:
+                self._expiry_heap = [(value, key) for key, value in self._deadlines_by_id.items()]
+                heapq.heapify(self._expiry_heap)
+        return deadline
+
+    def _next_expiry(self) -> float:
+        """Earliest live deadline (inf if none); stale heap entries on top are discarded."""
+
+        heap = self._expiry_heap
+        while heap and self._deadlines_by_id.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else np.inf
 
     def query(
         self,
@@ -56,30 +418,1064 @@ class MemoryVectorStore(VectorStore):
         top_k: int,
         metadata_filter: dict[str, str] | None = None,
     ) -> list[VectorRecord]:
-        candidates = self._records
-        if metadata_filter:
-            candidates = [r for r in candidates if metadata_filter.items() <= r.metadata.items()]
-
-        scored = []
-        for record in candidates:
-            score = _cosine_similarity(vector, record.vector)
-            scored.append((score, record))
-        scored.sort(key=lambda pair: pair[0], reverse=True)
-        return [record for _, record in scored[:top_k]]
-
-
-def _cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
-    if not a or not b or len(a) != len(b):
-        return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    norm_a = sqrt(sum(x * x for x in a))
-    norm_b = sqrt(sum(y * y for y in b))
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
-
-
-class PgVectorStore(VectorStore):
+        return self.query_batch([vector], top_k=top_k, metadata_filter=metadata_filter)[0]
+
+    def query_batch(
+        self,
+        vectors: Sequence[Sequence[float]] | np.ndarray,
+        *,
+        top_k: int,
+        metadata_filter: dict[str, str] | None = None,
+    ) -> list[list[VectorRecord]]:
+        """Return top-k neighbours for every query vector using one matrix product."""
+
+        queries = np.asarray(vectors, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if not len(queries):
+            return []
+        rows = self._candidate_rows(metadata_filter)
+        if top_k <= 0 or not len(rows):
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self._dimension:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match store dimension {self._dimension}")
+
+        scores = self._score(queries, rows)
+        return [self._select(query, query_scores, rows, top_k) for query, query_scores in zip(queries, scores)]
+
+    def query_many(
+        self,
+        vectors: Sequence[Sequence[float]] | np.ndarray,
+        *,
+        top_k: Sequence[int],
+        metadata_filters: Sequence[dict[str, str] | None],
+    ) -> list[list[VectorRecord]]:
+        """Top-k neighbours for queries that each carry their own ``top_k`` and filter.
+
+        All queries are scored against the whole matrix in one product; each filter's
+        candidate rows are computed once and shared by the queries that use it.
+        """
+
+        queries = np.asarray(vectors, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if len(top_k) != len(queries) or len(metadata_filters) != len(queries):
+            raise ValueError("top_k and metadata_filters must have one entry per query")
+        if not len(queries) or not self._ids:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != self._dimension:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match store dimension {self._dimension}")
+
+        all_rows = np.arange(len(self._ids), dtype=np.intp)
+        scores = self._score(queries, all_rows)
+        candidates: dict[tuple, np.ndarray] = {}
+        results: list[list[VectorRecord]] = []
+        for query, query_scores, k, metadata_filter in zip(queries, scores, top_k, metadata_filters):
+            key = tuple(sorted((metadata_filter or {}).items()))
+            rows = candidates.get(key)
+            if rows is None:
+                rows = candidates[key] = self._candidate_rows(metadata_filter)
+            if k <= 0 or not len(rows):
+                results.append([])
+                continue
+            selected = query_scores if len(rows) == len(all_rows) else query_scores[rows]
+            results.append(self._select(query, selected, rows, k))
+        return results
+
+    def _select(self, query: np.ndarray, scores: np.ndarray, rows: np.ndarray, top_k: int) -> list[VectorRecord]:
+        """Best ``top_k`` of ``rows``; with a rescoring matrix the compact scan only pre-selects."""
+
+        if self._rescore is None:
+            order = _top_k_order(scores, top_k)
+            return [self._record(int(rows[idx]), float(scores[idx])) for idx in order]
+        shortlist = rows[_top_k_order(scores, top_k * self._rescore_factor)]
+        exact = _cosine_scores(query.reshape(1, -1), self._rescore.rows(shortlist), self._rescore.norms[shortlist])[0]
+        order = _top_k_order(exact, top_k)
+        return [self._record(int(shortlist[idx]), float(exact[idx])) for idx in order]
+
+    def _score(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query against the selected rows; zero-norm pairs score 0."""
+
+        full = len(rows) == len(self._ids)
+        if self._precision == "float32":
+            if full:
+                return _cosine_scores(queries, self._matrix[: len(rows)], self._norms[: len(rows)])
+            return _cosine_scores(queries, self._matrix[rows], self._norms[rows])
+        scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+        for start in range(0, len(rows), self._SCORE_BLOCK):
+            stop = min(start + self._SCORE_BLOCK, len(rows))
+            block = slice(start, stop) if full else rows[start:stop]
+            scales = self._scales[block] if self._precision == "int8" else None
+            matrix = dequantize_vectors(self._matrix[block], scales)
+            scores[:, start:stop] = _cosine_scores(queries, matrix, self._norms[block])
+        return scores
+
+    def _candidate_rows(self, metadata_filter: dict[str, str] | None) -> np.ndarray:
+        if not metadata_filter:
+            rows = np.arange(len(self._ids), dtype=np.intp)
+        else:
+            wanted = metadata_filter.items()
+            rows = np.fromiter(
+                (idx for idx, metadata in enumerate(self._metadata) if wanted <= metadata.items()),
+                dtype=np.intp,
+            )
+        # Expired rows stay in the matrix until the next sweep; hide them meanwhile.
+        now = self._clock()
+        if self._next_expiry() <= now:
+            rows = rows[self._deadlines[rows] > now]
+        return rows
+
+    def _vector(self, row: int) -> np.ndarray:
+        if self._rescore is not None:
+            return self._rescore.rows(np.array([row]))[0]
+        scales = self._scales[row : row + 1] if self._precision == "int8" else None
+        return dequantize_vectors(self._matrix[row : row + 1], scales)[0]
+
+    def _record(self, row: int, score: float) -> VectorRecord:
+        return VectorRecord(
+            item_id=self._ids[row],
+            vector=self._vector(row).tolist(),
+            metadata=self._metadata[row],
+            score=score,
+        )
+
+    def _reserve(self, size: int) -> None:
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        self._matrix = _grow(self._matrix, capacity)
+        self._scales = _grow(self._scales, capacity)
+        self._norms = _grow(self._norms, capacity)
+        self._deadlines = _grow(self._deadlines, capacity)
+        if self._rescore is not None:
+            self._rescore.grow(capacity)
+
+
+class _QuantizedRows:
+    """Row matrix in one precision (plus int8 scales and norms) used to re-score shortlists."""
+
+    def __init__(self, precision: str, capacity: int, dimension: int) -> None:
+        self.precision = precision
+        self.matrix = np.zeros((capacity, dimension), dtype=_PRECISION_DTYPES[precision])
+        self.scales = np.zeros(capacity, dtype=np.float32)
+        self.norms = np.zeros(capacity, dtype=np.float32)
+
+    def assign(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        stored, scales = quantize_vectors(vectors, self.precision)
+        self.matrix[rows] = stored
+        if scales is not None:
+            self.scales[rows] = scales
+        self.norms[rows] = np.linalg.norm(dequantize_vectors(stored, scales), axis=1)
+
+    def rows(self, rows: np.ndarray) -> np.ndarray:
+        scales = self.scales[rows] if self.precision == "int8" else None
+        return dequantize_vectors(self.matrix[rows], scales)
+
+    def grow(self, capacity: int) -> None:
+        self.matrix = _grow(self.matrix, capacity)
+        self.scales = _grow(self.scales, capacity)
+        self.norms = _grow(self.norms, capacity)
+
+    def move(self, source: int, target: int) -> None:
+        for array in (self.matrix, self.scales, self.norms):
+            array[target] = array[source]
+
+    def compact(self, keep: np.ndarray) -> None:
+        size = int(keep.sum())
+        for array in (self.matrix, self.scales, self.norms):
+            array[:size] = array[: len(keep)][keep]
+
+    def nbytes(self, size: int) -> int:
+        per_row = self.matrix.itemsize * self.matrix.shape[1] + self.norms.itemsize
+        if self.precision == "int8":
+            per_row += self.scales.itemsize
+        return size * per_row
+
+
+def quantize_vectors(vectors: np.ndarray, precision: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Rows in ``precision``; int8 rows are scaled per vector so the largest component maps to 127."""
+
+    if precision == "float32":
+        return vectors.astype(np.float32, copy=False), None
+    if precision == "float16":
+        return vectors.astype(np.float16), None
+    peaks = np.abs(vectors).max(axis=1)
+    scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def dequantize_vectors(stored: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+    matrix = stored.astype(np.float32, copy=False)
+    if scales is not None:
+        matrix = matrix * scales[:, None]
+    return matrix
+
+
+def _cosine_scores(queries: np.ndarray, matrix: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    query_norms = np.linalg.norm(queries, axis=1)
+    dots = queries @ matrix.T
+    denom = np.outer(query_norms, norms)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(denom > 0, dots / denom, 0.0)
+    return scores.astype(np.float32, copy=False)
+
+
+def _expiry_timestamp(value: object) -> float | None:
+    """POSIX time of an ``expires_at`` value (datetime, ISO string or number); naive times are UTC."""
+
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            logger.warning("Ignoring unparsable expires_at %r", value)
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _grow(array: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+    grown[: array.shape[0]] = array
+    return grown
+
+
+def _top_k_order(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the ``top_k`` highest scores, best first; ties keep insertion order."""
+
+    if top_k < len(scores):
+        # argpartition breaks ties at the k-th score arbitrarily: keep every index that
+        # reaches it and let the stable sort decide between them.
+        kth = -np.partition(-scores, top_k - 1)[top_k - 1]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:top_k]
+
+
+@dataclass
+class QuantizationReport:
+    """Memory and recall of one MemoryVectorStore precision mode against exact float32 search."""
+
+    precision: str
+    rescore_precision: str | None
+    vectors: int
+    vector_bytes: int
+    recall: float
+
+    @property
+    def bytes_per_vector(self) -> float:
+        return self.vector_bytes / self.vectors if self.vectors else 0.0
+
+
+def quantization_report(
+    vectors: np.ndarray | Sequence[Sequence[float]],
+    queries: np.ndarray | Sequence[Sequence[float]],
+    *,
+    top_k: int = 10,
+    modes: Sequence[tuple[VectorPrecision, VectorPrecision | None]] = (
+        ("float32", None),
+        ("float16", None),
+        ("int8", None),
+        ("int8", "float16"),
+    ),
+) -> list[QuantizationReport]:
+    """Load ``vectors`` in each ``(precision, rescore_precision)`` mode and measure recall@top_k.
+
+    Recall is the share of the exact float32 top-k ids (per query) that the mode returns.
+    """
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    records = [VectorRecord(item_id=str(idx), vector=row, metadata={}) for idx, row in enumerate(matrix)]
+    reports: list[QuantizationReport] = []
+    expected: list[set[str]] | None = None
+    for precision, rescore_precision in modes:
+        store = MemoryVectorStore(precision=precision, rescore_precision=rescore_precision)
+        store.upsert(records)
+        found = [{record.item_id for record in result} for result in store.query_batch(queries, top_k=top_k)]
+        if expected is None:
+            exact = MemoryVectorStore()
+            exact.upsert(records)
+            expected = [{record.item_id for record in result} for result in exact.query_batch(queries, top_k=top_k)]
+        hits = sum(len(got & want) for got, want in zip(found, expected))
+        total = sum(len(want) for want in expected)
+        reports.append(
+            QuantizationReport(
+                precision=precision,
+                rescore_precision=rescore_precision,
+                vectors=len(store),
+                vector_bytes=store.vector_bytes,
+                recall=hits / total if total else 1.0,
+            )
+        )
+    return reports
+
+
+@dataclass
+class BulkUpsertStats:
+    """Outcome of PgVectorStore.upsert_bulk."""
+
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class SchemaMigrationStats:
+    """Outcome of PgVectorStore.migrate_schema."""
+
+    backfilled_rows: int = 0
+    copied_rows: int = 0
+    created_partitions: list[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class VectorIndexSpec:
+    """ANN index definition for the embedding column.
+
+    The operator class follows the store's distance metric, so the index serves the
+    ``ORDER BY`` the queries actually use. ``m``/``ef_construction`` apply to HNSW,
+    ``lists`` to IVFFlat (roughly ``rows / 1000`` up to 1M rows, ``sqrt(rows)`` above).
+    """
+
+    method: Literal["hnsw", "ivfflat"] = "hnsw"
+    m: int = 16
+    ef_construction: int = 64
+    lists: int = 100
+
+
+@dataclass
+class VectorIndexStats:
+    """Size and state of an ANN or full-text index; ``build_seconds`` is known for builds run by this store."""
+
+    name: str
+    method: str
+    size_bytes: int
+    valid: bool
+    build_seconds: float | None = None
+
+
+_ANN_METHODS = ("hnsw", "ivfflat")
+
+
+class _PgVectorSQL:
+    """Statements and row mapping shared by the sync and async pgvector stores."""
+
+    _COPY_TYPES = ["text", "text", "float4[]", "jsonb", "text", "text"]
+    _BACKFILL_BATCH = 10_000
+
+    def __init__(
+        self,
+        *,
+        table: str,
+        dimension: int,
+        bulk_batch_size: int,
+        binary_vectors: bool,
+        distance: str,
+        partitions: Sequence[str] | None,
+    ) -> None:
+        if distance not in _DISTANCE_OPERATORS:
+            raise ValueError(f"Unsupported distance {distance!r}; expected one of {sorted(_DISTANCE_OPERATORS)}")
+        self._table = table
+        self._dimension = dimension
+        self._distance_metric = distance
+        # LIST-партиционирование по domain: item_id уникален внутри домена.
+        self._partitions = list(dict.fromkeys(partitions)) if partitions is not None else None
+        self._bulk_batch_size = bulk_batch_size
+        self._binary_vectors = binary_vectors and register_vector_info is not None
+        self._vector_info: TypeInfo | None = None
+        self._index_build_seconds: dict[str, float] = {}
+        self._schema_initialized = False
+
+    def _vector_param(self, vector: Sequence[float], binary: bool) -> object:
+        if binary:
+            return np.asarray(vector, dtype=np.float32)
+        return _format_vector_literal(vector)
+
+    def _use_vector_info(self, conn: Connection | AsyncConnection, info: TypeInfo | None) -> bool:
+        if info is None:  # extension not created yet
+            return False
+        self._vector_info = info
+        register_vector_info(conn, info)
+        return True
+
+    def _disable_binary_vectors(self, exc: Exception) -> bool:
+        logger.warning("pgvector binary format unavailable (%s); using text literals", exc)
+        self._binary_vectors = False
+        return False
+
+    @property
+    def partitioned(self) -> bool:
+        return self._partitions is not None
+
+    def _partition_name(self, domain: str | None) -> str:
+        if domain is None:
+            return f"{self._table}_default"
+        return f"{self._table}_p_{re.sub(r'[^0-9a-zA-Z_]', '_', domain.lower())}"
+
+    def _schema_statements(self, table_name: str | None = None, *, text_index: bool = True) -> list[sql.Composable]:
+        """DDL of the current layout: ``domain`` column, B-tree and full-text indexes, partitions.
+
+        ``text_index=False`` leaves out the GIN index: on a populated table it is built
+        by ``create_text_index`` (``CREATE INDEX CONCURRENTLY``) rather than at startup.
+        """
+
+        name = table_name or self._table
+        table = sql.Identifier(name)
+        if self._partitions is None:
+            key, partitioning = sql.SQL("PRIMARY KEY (item_id)"), sql.SQL("")
+        else:
+            key, partitioning = sql.SQL("PRIMARY KEY (domain, item_id)"), sql.SQL("PARTITION BY LIST (domain)")
+        statements: list[sql.Composable] = [
+            sql.SQL("CREATE EXTENSION IF NOT EXISTS vector"),
+            sql.SQL(
+                """
+                CREATE TABLE IF NOT EXISTS {table} (
+                    item_id TEXT NOT NULL,
+                    domain TEXT NOT NULL DEFAULT '',
+                    embedding vector({dimension}),
+                    metadata JSONB NOT NULL DEFAULT '{{}}',
+                    knowledge_version_id TEXT NULL,
+                    expires_at TIMESTAMPTZ NULL,
+                    {key}
+                ) {partitioning}
+                """
+            ).format(table=table, dimension=sql.Literal(self._dimension), key=key, partitioning=partitioning),
+        ]
+        if self._partitions is not None:
+            statements.append(
+                sql.SQL("CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} DEFAULT").format(
+                    partition=sql.Identifier(self._partition_name(None)), table=table
+                )
+            )
+            statements.extend(self._partition_statement(domain, table_name=name) for domain in self._partitions)
+        statements.append(
+            sql.SQL("CREATE INDEX IF NOT EXISTS {index} ON {table} (domain, knowledge_version_id)").format(
+                index=sql.Identifier(f"{name}_domain_version"), table=table
+            )
+        )
+        if text_index:
+            statements.append(
+                sql.SQL("CREATE INDEX IF NOT EXISTS {index} ON {table} USING GIN ({document})").format(
+                    index=sql.Identifier(f"{name}_content_fts"), table=table, document=_FTS_DOCUMENT
+                )
+            )
+        return statements
+
+    def _partition_statement(self, domain: str, *, table_name: str | None = None) -> sql.Composed:
+        return sql.SQL("CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} FOR VALUES IN ({domain})").format(
+            partition=sql.Identifier(self._partition_name(domain)),
+            table=sql.Identifier(table_name or self._table),
+            domain=sql.Literal(domain),
+        )
+
+    @property
+    def _conflict_clause(self) -> sql.SQL:
+        return sql.SQL("ON CONFLICT (domain, item_id)" if self._partitions is not None else "ON CONFLICT (item_id)")
+
+    @staticmethod
+    def _filter_conditions(metadata_filter: dict[str, str] | None) -> tuple[list[sql.Composable], list[object]]:
+        """``domain`` and ``knowledge_version_id`` become column predicates (B-tree index,
+        partition pruning); the remaining keys a ``metadata @>`` containment test."""
+
+        conditions: list[sql.Composable] = []
+        params: list[object] = []
+        rest = dict(metadata_filter or {})
+        for column in _FILTER_COLUMNS:
+            if column in rest:
+                conditions.append(sql.SQL("{} = %s").format(sql.Identifier(column)))
+                params.append(rest.pop(column))
+        if rest:
+            conditions.append(sql.SQL("metadata @> %s::jsonb"))
+            params.append(json.dumps(rest))
+        return conditions, params
+
+    def _layout_sql(self) -> tuple[sql.Composed, list[object]]:
+        """``(relkind, has_domain_column, attached_partitions)`` of the table; no row when it does not exist yet."""
+
+        query_sql = sql.SQL(
+            """
+            SELECT c.relkind,
+                   EXISTS (
+                       SELECT 1 FROM pg_attribute a
+                       WHERE a.attrelid = c.oid AND a.attname = 'domain' AND NOT a.attisdropped
+                   ),
+                   ARRAY(
+                       SELECT child.relname::text FROM pg_inherits i
+                       JOIN pg_class child ON child.oid = i.inhrelid
+                       WHERE i.inhparent = c.oid
+                   )
+            FROM pg_class c
+            WHERE c.oid = to_regclass(%s)
+            """
+        ).format()
+        return query_sql, [self._table]
+
+    def _check_layout(self, layout: tuple | None) -> None:
+        """Refuse an existing table that needs ``migrate_schema`` before it can be used.
+
+        Backfilling the ``domain`` column, turning a plain table into a partitioned one
+        and moving rows into a new partition touch every row or take heavy locks, so
+        they never run implicitly when a connection first initialises the schema.
+        """
+
+        if layout is None:
+            return
+        relkind, has_domain, attached = layout
+        hint = "run PgVectorStore.migrate_schema() (memory37 migrate-schema)"
+        if not has_domain:
+            raise RuntimeError(f"Table {self._table} has no domain column; {hint} first")
+        if self._partitions is None:
+            return
+        if relkind != "p":
+            raise RuntimeError(f"Table {self._table} is not partitioned; {hint} before using partitions")
+        missing = [name for name in map(self._partition_name, self._partitions) if name not in set(attached or ())]
+        if missing:
+            raise RuntimeError(f"Table {self._table} lacks partitions {', '.join(missing)}; {hint} to create them")
+
+    def _add_domain_sql(self) -> sql.Composed:
+        return sql.SQL("ALTER TABLE {table} ADD COLUMN IF NOT EXISTS domain TEXT NOT NULL DEFAULT ''").format(
+            table=sql.Identifier(self._table)
+        )
+
+    def _move_domain_sql(self, domain: str, partition: str, batch_size: int) -> sql.Composed:
+        """One batch moving rows of ``domain`` from the default partition into the standalone ``partition``."""
+
+        return sql.SQL(
+            """
+            WITH moved AS (
+                DELETE FROM {default}
+                WHERE ctid IN (SELECT ctid FROM {default} WHERE domain = {domain} LIMIT {limit})
+                RETURNING {columns}
+            )
+            INSERT INTO {partition} ({columns}) SELECT {columns} FROM moved
+            """
+        ).format(
+            default=sql.Identifier(self._partition_name(None)),
+            partition=sql.Identifier(partition),
+            domain=sql.Literal(domain),
+            limit=sql.Literal(int(batch_size)),
+            columns=_ROW_COLUMNS,
+        )
+
+    def _backfill_domain_sql(self, batch_size: int) -> sql.Composed:
+        """One backfill batch: copy ``metadata->>'domain'`` into the column for up to ``batch_size`` rows."""
+
+        return sql.SQL(
+            """
+            UPDATE {table} SET domain = metadata->>'domain'
+            WHERE item_id IN (
+                SELECT item_id FROM {table}
+                WHERE domain = '' AND coalesce(metadata->>'domain', '') <> ''
+                LIMIT {limit}
+            )
+            """
+        ).format(table=sql.Identifier(self._table), limit=sql.Literal(int(batch_size)))
+
+    def _upsert_sql(self) -> sql.Composed:
+        return sql.SQL(
+            """
+            INSERT INTO {table} (item_id, domain, embedding, metadata, knowledge_version_id, expires_at)
+            VALUES (%s, %s, %s::vector, %s::jsonb, %s, %s)
+            {conflict} DO UPDATE
+            SET embedding = EXCLUDED.embedding,
+                metadata = EXCLUDED.metadata,
+                knowledge_version_id = EXCLUDED.knowledge_version_id,
+                expires_at = EXCLUDED.expires_at
+            """
+        ).format(table=sql.Identifier(self._table), conflict=self._conflict_clause)
+
+    def _upsert_params(self, record: VectorRecord, *, binary: bool = False) -> tuple[object, ...]:
+        metadata, version, expires_at = _split_metadata(record)
+        return (
+            record.item_id,
+            str(metadata.get("domain", "")),
+            self._vector_param(record.vector, binary),
+            json.dumps(metadata),
+            version,
+            expires_at,
+        )
+
+    def _bulk_sql(self) -> tuple[sql.Composed, sql.Composed, sql.Composed]:
+        """``CREATE TEMP TABLE``, binary ``COPY`` and merge statements of the bulk path."""
+
+        staging = sql.Identifier(f"{self._table}_staging")
+        create_sql = sql.SQL(
+            """
+            CREATE TEMP TABLE {staging} (
+                item_id TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                embedding REAL[] NOT NULL,
+                metadata JSONB NOT NULL,
+                knowledge_version_id TEXT NULL,
+                expires_at TEXT NULL
+            ) ON COMMIT DROP
+            """
+        ).format(staging=staging)
+        copy_sql = sql.SQL(
+            "COPY {staging} (item_id, domain, embedding, metadata, knowledge_version_id, expires_at) FROM STDIN (FORMAT BINARY)"
+        ).format(staging=staging)
+        merge_sql = sql.SQL(
+            """
+            INSERT INTO {table} (item_id, domain, embedding, metadata, knowledge_version_id, expires_at)
+            SELECT item_id, domain, embedding::vector, metadata, knowledge_version_id, expires_at::timestamptz
+            FROM {staging}
+            {conflict} DO UPDATE
+            SET embedding = EXCLUDED.embedding,
+                metadata = EXCLUDED.metadata,
+                knowledge_version_id = EXCLUDED.knowledge_version_id,
+                expires_at = EXCLUDED.expires_at
+            """
+        ).format(table=sql.Identifier(self._table), staging=staging, conflict=self._conflict_clause)
+        return create_sql, copy_sql, merge_sql
+
+    def _bulk_batches(self, records: Iterable[VectorRecord], batch_size: int | None) -> list[list[VectorRecord]]:
+        """Split records into COPY batches.
+
+        When an item id repeats, the last record wins (``ON CONFLICT`` cannot touch the
+        same row twice in one statement).
+        """
+
+        size = batch_size or self._bulk_batch_size
+        if size <= 0:
+            raise ValueError("batch_size must be positive")
+        unique = list({record.item_id: record for record in records}.values())
+        return [unique[start : start + size] for start in range(0, len(unique), size)]
+
+    @staticmethod
+    def _copy_row(record: VectorRecord) -> tuple[object, ...]:
+        metadata, version, expires_at = _split_metadata(record)
+        return (
+            record.item_id,
+            str(metadata.get("domain", "")),
+            [float(x) for x in record.vector],
+            metadata,
+            None if version is None else str(version),
+            None if expires_at is None else str(expires_at),
+        )
+
+    def _log_bulk(self, stats: BulkUpsertStats) -> None:
+        logger.info(
+            "Bulk upsert into %s: %d rows in %d batches, %.0f rows/s",
+            self._table,
+            stats.rows,
+            stats.batches,
+            stats.rows_per_second,
+        )
+
+    def _distance(self, placeholder: str = "%s::vector") -> sql.Composed:
+        return sql.SQL("embedding {op} {q}").format(
+            op=sql.SQL(_DISTANCE_OPERATORS[self._distance_metric]), q=sql.SQL(placeholder)
+        )
+
+    def _score(self, distance: object) -> float | None:
+        """Similarity from the distance column: ``1 - <=>`` for cosine, ``-(<#>)`` for inner product."""
+
+        if distance is None:
+            return None
+        if self._distance_metric == "cosine":
+            return 1.0 - float(distance)
+        return -float(distance)
+
+    def _query_sql(
+        self,
+        metadata_filter: dict[str, str] | None,
+        vector: list[float],
+        top_k: int,
+        *,
+        binary: bool = False,
+        with_vectors: bool = True,
+    ) -> tuple[sql.Composed, list[object]]:
+        conditions, filter_params = self._filter_conditions(metadata_filter)
+        where_clause = sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL("")
+        params: list[object] = [self._vector_param(vector, binary), *filter_params]
+
+        query_sql = sql.SQL(
+            """
+            SELECT item_id, {embedding}, metadata, knowledge_version_id, expires_at, {distance} AS distance
+            FROM {table}
+            {where}
+            ORDER BY distance
+            LIMIT %s
+            """
+        ).format(
+            table=sql.Identifier(self._table),
+            where=where_clause,
+            embedding=_EMBEDDING_COLUMN if with_vectors else _NO_EMBEDDING,
+            distance=self._distance(),
+        )
+
+        params.append(top_k)
+        return query_sql, params
+
+    def _query_records(self, rows: Iterable[tuple]) -> list[VectorRecord]:
+        return [
+            VectorRecord(
+                item_id=item_id,
+                vector=_parse_vector(embedding),
+                metadata=_row_metadata(metadata, version, expires_at),
+                score=self._score(distance),
+            )
+            for item_id, embedding, metadata, version, expires_at, distance in rows
+        ]
+
+    def _query_domains_sql(
+        self,
+        domains: Sequence[str],
+        metadata_filter: dict[str, str] | None,
+        vector: list[float],
+        top_k: int,
+        *,
+        binary: bool = False,
+        with_vectors: bool = True,
+    ) -> tuple[sql.Composed, list[object]]:
+        scoped = {key: value for key, value in (metadata_filter or {}).items() if key != "domain"}
+        conditions, filter_params = self._filter_conditions(scoped)
+        filter_clause = sql.SQL("").join(sql.SQL("AND ") + condition for condition in conditions)
+        params: list[object] = [list(domains), self._vector_param(vector, binary), *filter_params, top_k]
+
+        query_sql = sql.SQL(
+            """
+            SELECT d.domain, v.item_id, v.embedding, v.metadata, v.knowledge_version_id, v.expires_at, v.distance
+            FROM unnest(%s::text[]) AS d(domain)
+            CROSS JOIN LATERAL (
+                SELECT item_id, {embedding}, metadata, knowledge_version_id, expires_at, {distance} AS distance
+                FROM {table}
+                WHERE domain = d.domain
+                {filter}
+                ORDER BY distance
+                LIMIT %s
+            ) AS v
+            """
+        ).format(
+            table=sql.Identifier(self._table),
+            filter=filter_clause,
+            embedding=_EMBEDDING_COLUMN if with_vectors else _NO_EMBEDDING,
+            distance=self._distance(),
+        )
+        return query_sql, params
+
+    def _domain_records(self, domains: Sequence[str], rows: Iterable[tuple]) -> dict[str, list[VectorRecord]]:
+        results: dict[str, list[VectorRecord]] = {domain: [] for domain in domains}
+        for domain, item_id, embedding, metadata, version, expires_at, distance in rows:
+            results[domain].append(
+                VectorRecord(
+                    item_id=item_id,
+                    vector=_parse_vector(embedding),
+                    metadata=_row_metadata(metadata, version, expires_at),
+                    score=self._score(distance),
+                )
+            )
+        return results
+
+    def _query_many_sql(
+        self,
+        requests: Sequence[tuple[str, Sequence[float], dict[str, str] | None, int]],
+        *,
+        binary: bool = False,
+        with_vectors: bool = True,
+    ) -> tuple[sql.Composed, list[object]]:
+        """All ``(domain, vector, filter, top_k)`` requests in one statement.
+
+        The requests are unnested into rows and each drives its own LATERAL top-k scan,
+        so the round-trip count does not grow with the batch. With ``binary`` the query
+        vectors are bound as one ``vector[]`` parameter through pgvector's binary dumper;
+        without it they fall back to text literals (``text[]``) cast per request.
+        """
+
+        versions: list[str | None] = []
+        filters: list[str | None] = []
+        for _domain, _vector, metadata_filter, _top_k in requests:
+            rest = {key: value for key, value in (metadata_filter or {}).items() if key not in _FILTER_COLUMNS}
+            versions.append((metadata_filter or {}).get("knowledge_version_id"))
+            filters.append(json.dumps(rest) if rest else None)
+        params: list[object] = [
+            list(range(len(requests))),
+            [domain for domain, *_ in requests],
+            [self._vector_param(vector, binary) for _domain, vector, *_ in requests],
+            versions,
+            filters,
+            [int(top_k) for *_, top_k in requests],
+        ]
+        query_sql = sql.SQL(
+            """
+            SELECT q.ord, v.item_id, v.embedding, v.metadata, v.knowledge_version_id, v.expires_at, v.distance
+            FROM unnest(%s::int[], %s::text[], %s::{vectors}, %s::text[], %s::jsonb[], %s::int[])
+                 AS q(ord, domain, vec, version, filter, k)
+            CROSS JOIN LATERAL (
+                SELECT item_id, {embedding}, metadata, knowledge_version_id, expires_at, {distance} AS distance
+                FROM {table}
+                WHERE domain = q.domain
+                  AND (q.version IS NULL OR knowledge_version_id = q.version)
+                  AND (q.filter IS NULL OR metadata @> q.filter)
+                ORDER BY distance
+                LIMIT q.k
+            ) AS v
+            ORDER BY q.ord, v.distance
+            """
+        ).format(
+            table=sql.Identifier(self._table),
+            vectors=sql.SQL("vector[]" if binary else "text[]"),
+            embedding=_EMBEDDING_COLUMN if with_vectors else _NO_EMBEDDING,
+            distance=self._distance("q.vec" if binary else "q.vec::vector"),
+        )
+        return query_sql, params
+
+    def _many_records(self, count: int, rows: Iterable[tuple]) -> list[list[VectorRecord]]:
+        results: list[list[VectorRecord]] = [[] for _ in range(count)]
+        for ordinal, item_id, embedding, metadata, version, expires_at, distance in rows:
+            results[ordinal].append(
+                VectorRecord(
+                    item_id=item_id,
+                    vector=_parse_vector(embedding),
+                    metadata=_row_metadata(metadata, version, expires_at),
+                    score=self._score(distance),
+                )
+            )
+        return results
+
+    def _keyword_sql(
+        self,
+        text: str,
+        metadata_filter: dict[str, str] | None,
+        top_k: int,
+    ) -> tuple[sql.Composed, list[object]] | None:
+        """Full-text statement; ``None`` when the query has no terms.
+
+        Query terms are OR-ed; terms of three or more characters match by prefix.
+        """
+
+        terms = dict.fromkeys(tokenize(text))
+        if not terms or top_k <= 0:
+            return None
+        ts_query = " | ".join(f"{term}:*" if len(term) >= 3 else term for term in terms)
+
+        conditions, filter_params = self._filter_conditions(metadata_filter)
+        filter_clause = sql.SQL("").join(sql.SQL("AND ") + condition for condition in conditions)
+        params: list[object] = [ts_query, *filter_params, top_k]
+
+        query_sql = sql.SQL(
+            """
+            SELECT item_id, metadata, knowledge_version_id, expires_at,
+                   ts_rank_cd({document}, q) AS rank
+            FROM {table}, to_tsquery('simple', %s) AS q
+            WHERE {document} @@ q
+            {filter}
+            ORDER BY rank DESC
+            LIMIT %s
+            """
+        ).format(table=sql.Identifier(self._table), document=_FTS_DOCUMENT, filter=filter_clause)
+        return query_sql, params
+
+    @staticmethod
+    def _keyword_records(rows: Iterable[tuple]) -> list[VectorRecord]:
+        return [
+            VectorRecord(
+                item_id=item_id,
+                vector=[],
+                metadata=_row_metadata(metadata, version, expires_at),
+                score=float(rank),
+            )
+            for item_id, metadata, version, expires_at, rank in rows
+        ]
+
+    @staticmethod
+    def _search_settings_sql(ef_search: int | None, probes: int | None) -> list[sql.Composed]:
+        """``SET LOCAL`` recall knobs; they only live until the end of the query transaction."""
+
+        statements: list[sql.Composed] = []
+        if ef_search is not None:
+            statements.append(sql.SQL("SET LOCAL hnsw.ef_search = {}").format(sql.Literal(int(ef_search))))
+        if probes is not None:
+            statements.append(sql.SQL("SET LOCAL ivfflat.probes = {}").format(sql.Literal(int(probes))))
+        return statements
+
+    def _index_name(self, spec: VectorIndexSpec, domain: str | None = None) -> str:
+        base = self._partition_name(domain) if domain is not None else self._table
+        return f"{base}_embedding_{spec.method}_{_OPCLASS_SUFFIXES[self._distance_metric]}"
+
+    def _text_index_name(self, domain: str | None = None) -> str:
+        base = self._partition_name(domain) if domain is not None else self._table
+        return f"{base}_content_fts"
+
+    def _index_target(self, domain: str | None, *, concurrently: bool) -> tuple[sql.Identifier, sql.Composable]:
+        """Relation and ``WHERE`` clause of an ANN or full-text index.
+
+        A per-domain index goes on the domain's partition when the table is partitioned
+        and is a partial index (``WHERE domain = ...``) otherwise.
+        """
+
+        if domain is None:
+            if self._partitions is not None and concurrently:
+                raise ValueError(
+                    "CREATE INDEX CONCURRENTLY is not supported on a partitioned table; "
+                    "build per-domain indexes or pass concurrently=False"
+                )
+            return sql.Identifier(self._table), sql.SQL("")
+        if self._partitions is not None:
+            if domain not in self._partitions:
+                raise ValueError(f"Domain {domain!r} has no partition; known partitions: {self._partitions}")
+            return sql.Identifier(self._partition_name(domain)), sql.SQL("")
+        return sql.Identifier(self._table), sql.SQL("WHERE domain = {}").format(sql.Literal(domain))
+
+    def _create_index_sql(
+        self,
+        spec: VectorIndexSpec,
+        *,
+        concurrently: bool,
+        domain: str | None = None,
+    ) -> sql.Composed:
+        if spec.method == "hnsw":
+            options = sql.SQL("m = {}, ef_construction = {}").format(
+                sql.Literal(int(spec.m)), sql.Literal(int(spec.ef_construction))
+            )
+        elif spec.method == "ivfflat":
+            options = sql.SQL("lists = {}").format(sql.Literal(int(spec.lists)))
+        else:
+            raise ValueError(f"Unsupported index method {spec.method!r}")
+        table, where = self._index_target(domain, concurrently=concurrently)
+        return sql.SQL(
+            "CREATE INDEX {concurrently} IF NOT EXISTS {index} ON {table} USING {method} (embedding {opclass}) WITH ({options}) {where}"
+        ).format(
+            concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+            index=sql.Identifier(self._index_name(spec, domain)),
+            table=table,
+            method=sql.SQL(spec.method),
+            opclass=sql.SQL(f"vector_{_OPCLASS_SUFFIXES[self._distance_metric]}_ops"),
+            options=options,
+            where=where,
+        )
+
+    def _create_text_index_sql(self, *, concurrently: bool, domain: str | None = None) -> sql.Composed:
+        table, where = self._index_target(domain, concurrently=concurrently)
+        return sql.SQL("CREATE INDEX {concurrently} IF NOT EXISTS {index} ON {table} USING GIN ({document}) {where}").format(
+            concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+            index=sql.Identifier(self._text_index_name(domain)),
+            table=table,
+            document=_FTS_DOCUMENT,
+            where=where,
+        )
+
+    def _index_stats_sql(
+        self, name: str | None = None, methods: tuple[str, ...] = _ANN_METHODS
+    ) -> tuple[sql.Composed, list[object]]:
+        """ANN (or ``methods``) indexes on the table and, when it is partitioned, on its partitions."""
+
+        params: list[object] = [self._table, self._table, list(methods)]
+        name_clause = sql.SQL("")
+        if name is not None:
+            name_clause = sql.SQL("AND c.relname = %s")
+            params.append(name)
+        query_sql = sql.SQL(
+            """
+            SELECT c.relname, am.amname, pg_relation_size(c.oid), i.indisvalid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE (i.indrelid = to_regclass(%s)
+                   OR i.indrelid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s)))
+              AND am.amname = ANY(%s)
+            {name}
+            ORDER BY c.relname
+            """
+        ).format(name=name_clause)
+        return query_sql, params
+
+    def _index_stats(self, rows: Iterable[tuple]) -> list[VectorIndexStats]:
+        return [
+            VectorIndexStats(
+                name=name,
+                method=method,
+                size_bytes=int(size),
+                valid=bool(valid),
+                build_seconds=self._index_build_seconds.get(name),
+            )
+            for name, method, size, valid in rows
+        ]
+
+    def _content_hashes_sql(
+        self, knowledge_version_id: str | None, domain: str | None, source: str | None = None
+    ) -> tuple[sql.Composed, list[object]]:
+        conditions: list[sql.Composable] = []
+        params: list[object] = []
+        if knowledge_version_id is None:
+            conditions.append(sql.SQL("knowledge_version_id IS NULL"))
+        else:
+            conditions.append(sql.SQL("knowledge_version_id = %s"))
+            params.append(knowledge_version_id)
+        if domain is not None:
+            conditions.append(sql.SQL("domain = %s"))
+            params.append(domain)
+        if source is not None:
+            conditions.append(sql.SQL("metadata->>'ingest_source' = %s"))
+            params.append(source)
+        statement = sql.SQL(
+            "SELECT domain, item_id, metadata->>'content_hash' FROM {table} WHERE {conditions}"
+        ).format(table=sql.Identifier(self._table), conditions=sql.SQL(" AND ").join(conditions))
+        return statement, params
+
+    @staticmethod
+    def _content_hashes(rows: Iterable[tuple]) -> dict[tuple[str, str], str | None]:
+        return {(domain, item_id): content_hash for domain, item_id, content_hash in rows}
+
+    def _delete_sql(self, item_ids: Sequence[str], domain: str | None) -> tuple[sql.Composed, list[object]]:
+        # Один DELETE на батч id; с domain запрос попадает только в партицию домена.
+        if domain is None:
+            statement = sql.SQL("DELETE FROM {table} WHERE item_id = ANY(%s)")
+            params: list[object] = [list(item_ids)]
+        else:
+            statement = sql.SQL("DELETE FROM {table} WHERE domain = %s AND item_id = ANY(%s)")
+            params = [domain, list(item_ids)]
+        return statement.format(table=sql.Identifier(self._table)), params
+
+    def _refresh_expiry_sql(
+        self, item_ids: Sequence[str], domain: str | None, expires_at: str | None
+    ) -> tuple[sql.Composed, list[object]]:
+        params: list[object] = [expires_at, list(item_ids)]
+        domain_clause = sql.SQL("")
+        if domain is not None:
+            domain_clause = sql.SQL("AND domain = %s")
+            params.append(domain)
+        statement = sql.SQL("UPDATE {table} SET expires_at = %s WHERE item_id = ANY(%s) {domain}").format(
+            table=sql.Identifier(self._table), domain=domain_clause
+        )
+        return statement, params
+
+    def _vectors_sql(self, item_ids: Sequence[str], domain: str | None) -> tuple[sql.Composed, list[object]]:
+        params: list[object] = [list(item_ids)]
+        domain_clause = sql.SQL("")
+        if domain is not None:
+            domain_clause = sql.SQL("AND domain = %s")
+            params.append(domain)
+        statement = sql.SQL(
+            """
+            SELECT item_id, embedding, metadata, knowledge_version_id, expires_at, NULL AS distance
+            FROM {table}
+            WHERE item_id = ANY(%s) {domain}
+            """
+        ).format(table=sql.Identifier(self._table), domain=domain_clause)
+        return statement, params
+
+    def _cleanup_sql(self) -> sql.Composed:
+        return sql.SQL("DELETE FROM {table} WHERE expires_at IS NOT NULL AND expires_at < NOW()").format(
+            table=sql.Identifier(self._table)
+        )
+
+
+class PgVectorStore(_PgVectorSQL, VectorStore):
     """PostgreSQL pgvector-backed store."""
 
     def __init__(
@@ -88,11 +1484,20 @@ class PgVectorStore(VectorStore):
         *,
         table: str = "memory37_vectors",
         dimension: int = 1536,
+        bulk_batch_size: int = 1000,
+        binary_vectors: bool = True,
+        distance: str = "inner_product",
+        partitions: Sequence[str] | None = None,
     ) -> None:
+        super().__init__(
+            table=table,
+            dimension=dimension,
+            bulk_batch_size=bulk_batch_size,
+            binary_vectors=binary_vectors,
+            distance=distance,
+            partitions=partitions,
+        )
         self._connection_factory = connection_factory
-        self._table = table
-        self._dimension = dimension
-        self._schema_initialized = False
 
     def upsert(self, records: Iterable[VectorRecord]) -> None:
         records = list(records)
@@ -101,132 +1506,814 @@ class PgVectorStore(VectorStore):
         conn = self._connection_factory()
         try:
             self._ensure_schema(conn)
-            insert_sql = sql.SQL(
-                """
-                INSERT INTO {table} (item_id, embedding, metadata, knowledge_version_id, expires_at)
-                VALUES (%s, %s::vector, %s::jsonb, %s, %s)
-                ON CONFLICT (item_id) DO UPDATE
-                SET embedding = EXCLUDED.embedding,
-                    metadata = EXCLUDED.metadata,
-                    knowledge_version_id = EXCLUDED.knowledge_version_id,
-                    expires_at = EXCLUDED.expires_at
-                """
-            ).format(table=sql.Identifier(self._table))
-
+            binary = self._register_vector(conn)
+            insert_sql = self._upsert_sql()
             with conn.cursor() as cur:
                 for record in records:
-                    version = None
-                    if "knowledge_version_id" in record.metadata:
-                        version = record.metadata.get("knowledge_version_id")
-                    metadata = dict(record.metadata)
-                    metadata.pop("knowledge_version_id", None)
-                    expires_at = metadata.pop("expires_at", None)
-                    cur.execute(
-                        insert_sql,
-                        (
-                            record.item_id,
-                            _format_vector_literal(record.vector),
-                            json.dumps(metadata),
-                            version,
-                            expires_at,
-                        ),
-                    )
+                    cur.execute(insert_sql, self._upsert_params(record, binary=binary))
             conn.commit()
         finally:
             conn.close()
 
+    def upsert_bulk(self, records: Iterable[VectorRecord], *, batch_size: int | None = None) -> BulkUpsertStats:
+        """Bulk upsert: binary ``COPY`` into a temp table, then one ``INSERT ... SELECT`` per batch.
+
+        Each batch is its own transaction. When an item id repeats, the last record wins.
+        """
+
+        batches = self._bulk_batches(records, batch_size)
+        stats = BulkUpsertStats()
+        if not batches:
+            return stats
+        create_sql, copy_sql, merge_sql = self._bulk_sql()
+
+        started = time.perf_counter()
+        conn = self._connection_factory()
+        try:
+            self._ensure_schema(conn)
+            for batch in batches:
+                with conn.cursor() as cur:
+                    cur.execute(create_sql)
+                    with cur.copy(copy_sql) as copy:
+                        copy.set_types(self._COPY_TYPES)
+                        for record in batch:
+                            copy.write_row(self._copy_row(record))
+                    cur.execute(merge_sql)
+                conn.commit()
+                stats.rows += len(batch)
+                stats.batches += 1
+        finally:
+            conn.close()
+        stats.seconds = time.perf_counter() - started
+        self._log_bulk(stats)
+        return stats
+
     def query(
         self,
         vector: list[float],
         *,
         top_k: int,
         metadata_filter: dict[str, str] | None = None,
+        with_vectors: bool = True,
+        ef_search: int | None = None,
+        probes: int | None = None,
     ) -> list[VectorRecord]:
+        """Nearest neighbours with ``score`` computed by the database.
+
+        ``with_vectors=False`` leaves the embedding column out of the result (records get
+        ``vector=[]``), which is all callers that only rank need. ``ef_search`` (HNSW) and
+        ``probes`` (IVFFlat) trade latency for recall for this call only.
+        """
+
         conn = self._connection_factory()
         try:
-            where_clause = sql.SQL("")
-            params: list[object] = []
-            if metadata_filter:
-                where_clause = sql.SQL("WHERE metadata @> %s::jsonb")
-                params.append(json.dumps(metadata_filter))
+            binary = self._register_vector(conn)
+            query_sql, params = self._query_sql(
+                metadata_filter, vector, top_k, binary=binary, with_vectors=with_vectors
+            )
+            with conn.cursor(binary=binary) as cur:
+                for statement in self._search_settings_sql(ef_search, probes):
+                    cur.execute(statement)
+                cur.execute(query_sql, params)
+                rows = cur.fetchall()
+            return self._query_records(rows)
+        finally:
+            conn.close()
 
-            query_sql = sql.SQL(
-                """
-                SELECT item_id, embedding, metadata, knowledge_version_id, expires_at
-                FROM {table}
-                {where}
-                ORDER BY embedding <#> %s::vector
-                LIMIT %s
-                """
-            ).format(table=sql.Identifier(self._table), where=where_clause)
+    def query_domains(
+        self,
+        vector: list[float],
+        *,
+        domains: Sequence[str],
+        top_k: int,
+        metadata_filter: dict[str, str] | None = None,
+        with_vectors: bool = True,
+        ef_search: int | None = None,
+        probes: int | None = None,
+    ) -> dict[str, list[VectorRecord]]:
+        """Nearest neighbours for several domains in one round-trip (``top_k`` per domain)."""
+
+        if not domains or top_k <= 0:
+            return {domain: [] for domain in domains}
+        conn = self._connection_factory()
+        try:
+            binary = self._register_vector(conn)
+            query_sql, params = self._query_domains_sql(
+                domains, metadata_filter, vector, top_k, binary=binary, with_vectors=with_vectors
+            )
+            with conn.cursor(binary=binary) as cur:
+                for statement in self._search_settings_sql(ef_search, probes):
+                    cur.execute(statement)
+                cur.execute(query_sql, params)
+                rows = cur.fetchall()
+            return self._domain_records(domains, rows)
+        finally:
+            conn.close()
 
-            params.extend([_format_vector_literal(vector), top_k])
+    def query_many(
+        self,
+        requests: Sequence[tuple[str, Sequence[float], dict[str, str] | None, int]],
+        *,
+        with_vectors: bool = True,
+        ef_search: int | None = None,
+        probes: int | None = None,
+    ) -> list[list[VectorRecord]]:
+        """Nearest neighbours for many ``(domain, vector, filter, top_k)`` requests in one round-trip."""
 
-            with conn.cursor() as cur:
+        if not requests:
+            return []
+        conn = self._connection_factory()
+        try:
+            binary = self._register_vector(conn)
+            query_sql, params = self._query_many_sql(requests, binary=binary, with_vectors=with_vectors)
+            with conn.cursor(binary=binary) as cur:
+                for statement in self._search_settings_sql(ef_search, probes):
+                    cur.execute(statement)
                 cur.execute(query_sql, params)
                 rows = cur.fetchall()
+            return self._many_records(len(requests), rows)
+        finally:
+            conn.close()
+
+    def keyword_query(
+        self,
+        text: str,
+        *,
+        top_k: int,
+        metadata_filter: dict[str, str] | None = None,
+    ) -> list[VectorRecord]:
+        """Full-text candidates ranked by ``ts_rank_cd`` (vectors are not fetched).
+
+        Query terms are OR-ed; terms of three or more characters match by prefix.
+        """
+
+        statement = self._keyword_sql(text, metadata_filter, top_k)
+        if statement is None:
+            return []
+        conn = self._connection_factory()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(*statement)
+                rows = cur.fetchall()
+            return self._keyword_records(rows)
+        finally:
+            conn.close()
+
+    def create_vector_index(
+        self,
+        spec: VectorIndexSpec | None = None,
+        *,
+        concurrently: bool = True,
+        domain: str | None = None,
+    ) -> VectorIndexStats:
+        """Create the ANN index described by ``spec`` (HNSW by default) and return its stats.
+
+        The build runs with ``CREATE INDEX CONCURRENTLY`` in autocommit mode, so writes
+        continue meanwhile. The call is idempotent and resumable: a valid index is left as
+        is, and an invalid one left behind by an interrupted build is dropped and rebuilt.
+        With ``domain`` the index covers only that domain: its partition, or a partial
+        index on an unpartitioned table.
+        """
+
+        spec = spec or VectorIndexSpec()
+        return self._build_index(
+            self._index_name(spec, domain),
+            self._create_index_sql(spec, concurrently=concurrently, domain=domain),
+            concurrently=concurrently,
+            methods=_ANN_METHODS,
+        )
+
+    def create_text_index(self, *, concurrently: bool = True, domain: str | None = None) -> VectorIndexStats:
+        """Create the GIN full-text index used by keyword search and return its stats.
+
+        Schema initialisation builds it only together with a new table; an existing
+        table gets it here, with the same concurrent, resumable build as
+        ``create_vector_index``. ``domain`` limits it to one partition (or a partial index).
+        """
 
-            results: list[VectorRecord] = []
-            for item_id, embedding, metadata, version, expires_at in rows:
-                results.append(
-                    VectorRecord(
-                        item_id=item_id,
-                        vector=_parse_vector(embedding),
-                        metadata={
-                            **(dict(metadata) if isinstance(metadata, dict) else json.loads(metadata)),
-                            **({"knowledge_version_id": version} if version else {}),
-                            **({"expires_at": expires_at} if expires_at else {}),
-                        },
+        return self._build_index(
+            self._text_index_name(domain),
+            self._create_text_index_sql(concurrently=concurrently, domain=domain),
+            concurrently=concurrently,
+            methods=("gin",),
+        )
+
+    def _build_index(
+        self, name: str, create_sql: sql.Composed, *, concurrently: bool, methods: tuple[str, ...]
+    ) -> VectorIndexStats:
+        conn = self._connection_factory()
+        try:
+            self._ensure_schema(conn)
+            conn.autocommit = True
+            stats_sql, stats_params = self._index_stats_sql(name, methods)
+            with conn.cursor() as cur:
+                cur.execute(stats_sql, stats_params)
+                existing = self._index_stats(cur.fetchall())
+                if existing and not existing[0].valid:
+                    logger.warning("Index %s is invalid (interrupted build), rebuilding", name)
+                    cur.execute(
+                        sql.SQL("DROP INDEX {concurrently} IF EXISTS {index}").format(
+                            concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+                            index=sql.Identifier(name),
+                        )
                     )
-                )
-            return results
+                if not existing or not existing[0].valid:
+                    started = time.perf_counter()
+                    cur.execute(create_sql)
+                    self._index_build_seconds[name] = time.perf_counter() - started
+                    logger.info("Built index %s in %.1fs", name, self._index_build_seconds[name])
+                cur.execute(stats_sql, stats_params)
+                stats = self._index_stats(cur.fetchall())
+            if not stats:
+                raise RuntimeError(f"Index {name} was not created")
+            return stats[0]
+        finally:
+            conn.close()
+
+    def vector_index_stats(self) -> list[VectorIndexStats]:
+        """HNSW/IVFFlat indexes on the table with size and validity."""
+
+        conn = self._connection_factory()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(*self._index_stats_sql())
+                return self._index_stats(cur.fetchall())
+        finally:
+            conn.close()
+
+    def _register_vector(self, conn: Connection) -> bool:
+        """Enable pgvector's binary dumper/loader on ``conn``; ``False`` means text literals.
+
+        The ``vector`` type oid is looked up once per store and reused for every connection.
+        """
+
+        if not self._binary_vectors:
+            return False
+        if self._vector_info is not None:
+            return self._use_vector_info(conn, self._vector_info)
+        try:
+            info = TypeInfo.fetch(conn, "vector")
+        except (TypeError, psycopg.Error) as exc:
+            return self._disable_binary_vectors(exc)
+        return self._use_vector_info(conn, info)
+
+    def migrate_schema(self, *, batch_size: int = _PgVectorSQL._BACKFILL_BATCH) -> SchemaMigrationStats:
+        """Bring an existing table to the current layout.
+
+        Adds the ``domain`` column and backfills it from ``metadata->>'domain'`` in
+        batches of ``batch_size`` rows (one transaction each). When the store is
+        configured with ``partitions``, a plain table is rebuilt as ``PARTITION BY LIST
+        (domain)`` in a single transaction, and a partitioned one gets the missing
+        partitions: their rows are moved out of the default partition ``batch_size`` at
+        a time before the partition is attached (see ``_add_partitions``). ANN indexes
+        of a rebuilt table are dropped with it and have to be created again.
+
+        Normal startup never does any of this; it refuses a table that needs it.
+        """
+
+        stats = SchemaMigrationStats()
+        conn = self._connection_factory()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(*self._layout_sql())
+                layout = cur.fetchone()
+            if layout is not None and not layout[1]:
+                stats.backfilled_rows = self._backfill_domain(conn, batch_size)
+            if layout is not None and self._partitions is not None:
+                if layout[0] != "p":
+                    stats.copied_rows = self._convert_to_partitioned(conn)
+                    stats.created_partitions = [self._partition_name(None)] + [
+                        self._partition_name(domain) for domain in self._partitions
+                    ]
+                else:
+                    stats.created_partitions, stats.copied_rows = self._add_partitions(
+                        conn, set(layout[2] or ()), batch_size
+                    )
+            self._create_schema(conn, text_index=layout is None)
         finally:
             conn.close()
+        logger.info(
+            "Migrated %s: %d rows backfilled, %d rows copied, partitions created: %s",
+            self._table,
+            stats.backfilled_rows,
+            stats.copied_rows,
+            ", ".join(stats.created_partitions) or "none",
+        )
+        return stats
+
+    def _backfill_domain(self, conn: Connection, batch_size: int) -> int:
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        with conn.cursor() as cur:
+            cur.execute(self._add_domain_sql())
+        conn.commit()
+        return self._run_batches(conn, self._backfill_domain_sql(batch_size), batch_size)
+
+    @staticmethod
+    def _run_batches(conn: Connection, statement: sql.Composed, batch_size: int) -> int:
+        """Repeat ``statement`` (one transaction each) until it touches fewer than ``batch_size`` rows."""
+
+        total = 0
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(statement)
+                updated = cur.rowcount
+            conn.commit()
+            total += max(updated, 0)
+            if updated < batch_size:
+                return total
+
+    def _convert_to_partitioned(self, conn: Connection) -> int:
+        legacy = f"{self._table}_legacy"
+        columns = _ROW_COLUMNS
+        with conn.cursor() as cur:
+            cur.execute(
+                sql.SQL("ALTER TABLE {table} RENAME TO {legacy}").format(
+                    table=sql.Identifier(self._table), legacy=sql.Identifier(legacy)
+                )
+            )
+            # Имена индексов (и PK) должны освободиться для новой таблицы.
+            cur.execute(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = to_regclass(%s)",
+                [legacy],
+            )
+            for (index,) in cur.fetchall():
+                cur.execute(
+                    sql.SQL("ALTER INDEX {index} RENAME TO {renamed}").format(
+                        index=sql.Identifier(index), renamed=sql.Identifier(f"{index}_legacy"[:63])
+                    )
+                )
+            for statement in self._schema_statements():
+                cur.execute(statement)
+            cur.execute(
+                sql.SQL("INSERT INTO {table} ({columns}) SELECT {columns} FROM {legacy}").format(
+                    table=sql.Identifier(self._table), columns=columns, legacy=sql.Identifier(legacy)
+                )
+            )
+            copied = cur.rowcount
+            cur.execute(sql.SQL("DROP TABLE {legacy}").format(legacy=sql.Identifier(legacy)))
+        conn.commit()
+        return max(copied, 0)
+
+    def _add_partitions(self, conn: Connection, attached: set[str], batch_size: int) -> tuple[list[str], int]:
+        """Create the missing partitions; returns their names and the number of rows moved.
+
+        The domain's rows already live in the default partition. The new partition is
+        filled as a standalone table, ``batch_size`` rows per transaction, and attached
+        afterwards. A validated ``CHECK (domain <> ...)`` on the default partition lets
+        ``ATTACH PARTITION`` skip scanning it, so the parent table is never locked for
+        the duration of the move. Moved rows are invisible to queries until the attach,
+        and writes to the domain are rejected only during the short final step. An
+        interrupted run can simply be repeated.
+        """
+
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        table = sql.Identifier(self._table)
+        default = sql.Identifier(self._partition_name(None))
+        created: list[str] = []
+        moved = 0
+        for domain in self._partitions or ():
+            name = self._partition_name(domain)
+            if name in attached:
+                continue
+            partition, value = sql.Identifier(name), sql.Literal(domain)
+            guard = sql.Identifier(f"{name}_excluded"[:63])
+            move_sql = self._move_domain_sql(domain, name, batch_size)
+            with conn.cursor() as cur:
+                cur.execute(
+                    sql.SQL("CREATE TABLE IF NOT EXISTS {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING INDEXES)").format(
+                        partition=partition, table=table
+                    )
+                )
+                cur.execute(sql.SQL("ALTER TABLE {default} DROP CONSTRAINT IF EXISTS {guard}").format(default=default, guard=guard))
+            conn.commit()
+            moved += self._run_batches(conn, move_sql, batch_size)
+            with conn.cursor() as cur:
+                # NOT VALID: новые строки домена в DEFAULT запрещены сразу, старые проверит VALIDATE.
+                cur.execute(
+                    sql.SQL("ALTER TABLE {default} ADD CONSTRAINT {guard} CHECK (domain <> {value}) NOT VALID").format(
+                        default=default, guard=guard, value=value
+                    )
+                )
+            conn.commit()
+            # Строки, записанные между последней пачкой и ограничением.
+            moved += self._run_batches(conn, move_sql, batch_size)
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("ALTER TABLE {default} VALIDATE CONSTRAINT {guard}").format(default=default, guard=guard))
+                cur.execute(
+                    sql.SQL("ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES IN ({value})").format(
+                        table=table, partition=partition, value=value
+                    )
+                )
+                cur.execute(sql.SQL("ALTER TABLE {default} DROP CONSTRAINT {guard}").format(default=default, guard=guard))
+            conn.commit()
+            created.append(name)
+        return created, moved
 
     def _ensure_schema(self, conn: Connection) -> None:
         if self._schema_initialized:
             return
         with conn.cursor() as cur:
-            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
-            create_table_sql = sql.SQL(
-                """
-                CREATE TABLE IF NOT EXISTS {table} (
-                    item_id TEXT PRIMARY KEY,
-                    embedding vector({dimension}),
-                    metadata JSONB NOT NULL DEFAULT '{{}}',
-                    knowledge_version_id TEXT NULL,
-                    expires_at TIMESTAMPTZ NULL
-                )
-                """
-            ).format(
-                table=sql.Identifier(self._table),
-                dimension=sql.Literal(self._dimension),
-            )
-            cur.execute(create_table_sql)
+            cur.execute(*self._layout_sql())
+            layout = cur.fetchone()
+            self._check_layout(layout)
+        self._create_schema(conn, text_index=layout is None)
+
+    def _create_schema(self, conn: Connection, *, text_index: bool) -> None:
+        with conn.cursor() as cur:
+            for statement in self._schema_statements(text_index=text_index):
+                cur.execute(statement)
         conn.commit()
         self._schema_initialized = True
 
+    def content_hashes(
+        self, *, knowledge_version_id: str | None, domain: str | None = None, source: str | None = None
+    ) -> dict[tuple[str, str], str | None]:
+        """``(domain, item_id) -> content_hash`` строк версии знаний (для инкрементального ingest)."""
+
+        conn = self._connection_factory()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(*self._content_hashes_sql(knowledge_version_id, domain, source))
+                rows = cur.fetchall()
+            return self._content_hashes(rows)
+        finally:
+            conn.close()
+
+    def delete(self, item_ids: Iterable[str], *, domain: str | None = None) -> int:
+        """Удаляет строки по item_id одним запросом; возвращает число удалённых."""
+
+        ids = list(dict.fromkeys(item_ids))
+        if not ids:
+            return 0
+        conn = self._connection_factory()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(*self._delete_sql(ids, domain))
+                deleted = cur.rowcount
+            conn.commit()
+            return max(deleted, 0)
+        finally:
+            conn.close()
+
+    def refresh_expiry(self, item_ids: Iterable[str], *, domain: str | None = None, expires_at: str | None) -> int:
+        """Обновляет expires_at строк без перезаписи векторов; возвращает число обновлённых."""
+
+        ids = list(dict.fromkeys(item_ids))
+        if not ids:
+            return 0
+        conn = self._connection_factory()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(*self._refresh_expiry_sql(ids, domain, expires_at))
+                refreshed = cur.rowcount
+            conn.commit()
+            return max(refreshed, 0)
+        finally:
+            conn.close()
+
+    def fetch_vectors(self, item_ids: Iterable[str], *, domain: str | None = None) -> list[VectorRecord]:
+        """Записи с векторами по id (без скоринга); отсутствующие id пропускаются."""
+
+        ids = list(dict.fromkeys(item_ids))
+        if not ids:
+            return []
+        conn = self._connection_factory()
+        try:
+            binary = self._register_vector(conn)
+            with conn.cursor(binary=binary) as cur:
+                cur.execute(*self._vectors_sql(ids, domain))
+                rows = cur.fetchall()
+            return self._query_records(rows)
+        finally:
+            conn.close()
+
     def cleanup_expired(self) -> None:
         """Удаляет записи с просроченным expires_at."""
 
         conn = self._connection_factory()
         try:
             with conn.cursor() as cur:
-                cur.execute(
-                    sql.SQL(
-                        "DELETE FROM {table} WHERE expires_at IS NOT NULL AND expires_at < NOW()"
-                    ).format(table=sql.Identifier(self._table))
-                )
+                cur.execute(self._cleanup_sql())
             conn.commit()
         finally:
             conn.close()
 
 
+class AsyncPgVectorStore(_PgVectorSQL):
+    """Natively async pgvector store on top of a psycopg ``AsyncConnectionPool``.
+
+    Exposes the same operations as PgVectorStore as coroutines. The pool is opened
+    lazily on first use (so it binds to the event loop that serves requests) and
+    checks connections before handing them out. Read statements are sent as
+    server-side prepared statements unless ``prepare`` is ``False`` (needed behind
+    pgbouncer in transaction mode); ``None`` leaves psycopg's automatic threshold.
+    """
+
+    def __init__(
+        self,
+        conninfo: str = "",
+        *,
+        table: str = "memory37_vectors",
+        dimension: int = 1536,
+        bulk_batch_size: int = 1000,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_idle: float = 300.0,
+        timeout: float = 30.0,
+        prepare: bool | None = True,
+        binary_vectors: bool = True,
+        distance: str = "inner_product",
+        partitions: Sequence[str] | None = None,
+        pool: AsyncConnectionPool | None = None,
+    ) -> None:
+        super().__init__(
+            table=table,
+            dimension=dimension,
+            bulk_batch_size=bulk_batch_size,
+            binary_vectors=binary_vectors,
+            distance=distance,
+            partitions=partitions,
+        )
+        if pool is None and AsyncConnectionPool is None:
+            raise RuntimeError("psycopg_pool is not installed; AsyncPgVectorStore needs it")
+        self._conninfo = conninfo
+        self._pool_options = {"min_size": min_size, "max_size": max_size, "max_idle": max_idle, "timeout": timeout}
+        self._prepare = prepare
+        self._pool = pool
+
+    @property
+    def pool(self) -> AsyncConnectionPool | None:
+        return self._pool
+
+    async def open(self) -> None:
+        """Open the pool (idempotent); called implicitly by every operation."""
+
+        await self._get_pool()
+
+    async def close(self) -> None:
+        """Close the pool; the next operation opens a fresh one."""
+
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await pool.close()
+
+    async def upsert(self, records: Iterable[VectorRecord]) -> None:
+        records = list(records)
+        if not records:
+            return
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            await self._ensure_schema(conn)
+            insert_sql = self._upsert_sql()
+            binary = await self._register_vector(conn)
+            async with conn.cursor() as cur:
+                await cur.executemany(insert_sql, [self._upsert_params(record, binary=binary) for record in records])
+
+    async def upsert_bulk(self, records: Iterable[VectorRecord], *, batch_size: int | None = None) -> BulkUpsertStats:
+        """Async counterpart of PgVectorStore.upsert_bulk."""
+
+        batches = self._bulk_batches(records, batch_size)
+        stats = BulkUpsertStats()
+        if not batches:
+            return stats
+        create_sql, copy_sql, merge_sql = self._bulk_sql()
+
+        started = time.perf_counter()
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            await self._ensure_schema(conn)
+            for batch in batches:
+                async with conn.cursor() as cur:
+                    await cur.execute(create_sql)
+                    async with cur.copy(copy_sql) as copy:
+                        copy.set_types(self._COPY_TYPES)
+                        for record in batch:
+                            await copy.write_row(self._copy_row(record))
+                    await cur.execute(merge_sql)
+                await conn.commit()
+                stats.rows += len(batch)
+                stats.batches += 1
+        stats.seconds = time.perf_counter() - started
+        self._log_bulk(stats)
+        return stats
+
+    async def query(
+        self,
+        vector: list[float],
+        *,
+        top_k: int,
+        metadata_filter: dict[str, str] | None = None,
+        with_vectors: bool = True,
+        ef_search: int | None = None,
+        probes: int | None = None,
+    ) -> list[VectorRecord]:
+        rows = await self._fetch(
+            lambda binary: self._query_sql(metadata_filter, vector, top_k, binary=binary, with_vectors=with_vectors),
+            settings=self._search_settings_sql(ef_search, probes),
+        )
+        return self._query_records(rows)
+
+    async def query_domains(
+        self,
+        vector: list[float],
+        *,
+        domains: Sequence[str],
+        top_k: int,
+        metadata_filter: dict[str, str] | None = None,
+        with_vectors: bool = True,
+        ef_search: int | None = None,
+        probes: int | None = None,
+    ) -> dict[str, list[VectorRecord]]:
+        if not domains or top_k <= 0:
+            return {domain: [] for domain in domains}
+        rows = await self._fetch(
+            lambda binary: self._query_domains_sql(
+                domains, metadata_filter, vector, top_k, binary=binary, with_vectors=with_vectors
+            ),
+            settings=self._search_settings_sql(ef_search, probes),
+        )
+        return self._domain_records(domains, rows)
+
+    async def query_many(
+        self,
+        requests: Sequence[tuple[str, Sequence[float], dict[str, str] | None, int]],
+        *,
+        with_vectors: bool = True,
+        ef_search: int | None = None,
+        probes: int | None = None,
+    ) -> list[list[VectorRecord]]:
+        if not requests:
+            return []
+        rows = await self._fetch(
+            lambda binary: self._query_many_sql(requests, binary=binary, with_vectors=with_vectors),
+            settings=self._search_settings_sql(ef_search, probes),
+        )
+        return self._many_records(len(requests), rows)
+
+    async def keyword_query(
+        self,
+        text: str,
+        *,
+        top_k: int,
+        metadata_filter: dict[str, str] | None = None,
+    ) -> list[VectorRecord]:
+        statement = self._keyword_sql(text, metadata_filter, top_k)
+        if statement is None:
+            return []
+        return self._keyword_records(await self._fetch(lambda _binary: statement, vectors=False))
+
+    async def content_hashes(
+        self, *, knowledge_version_id: str | None, domain: str | None = None, source: str | None = None
+    ) -> dict[tuple[str, str], str | None]:
+        statement = self._content_hashes_sql(knowledge_version_id, domain, source)
+        return self._content_hashes(await self._fetch(lambda _binary: statement, vectors=False))
+
+    async def refresh_expiry(self, item_ids: Iterable[str], *, domain: str | None = None, expires_at: str | None) -> int:
+        ids = list(dict.fromkeys(item_ids))
+        if not ids:
+            return 0
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(*self._refresh_expiry_sql(ids, domain, expires_at))
+            return max(cursor.rowcount, 0)
+
+    async def fetch_vectors(self, item_ids: Iterable[str], *, domain: str | None = None) -> list[VectorRecord]:
+        ids = list(dict.fromkeys(item_ids))
+        if not ids:
+            return []
+        return self._query_records(await self._fetch(lambda _binary: self._vectors_sql(ids, domain)))
+
+    async def delete(self, item_ids: Iterable[str], *, domain: str | None = None) -> int:
+        ids = list(dict.fromkeys(item_ids))
+        if not ids:
+            return 0
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(*self._delete_sql(ids, domain))
+            return max(cursor.rowcount, 0)
+
+    async def cleanup_expired(self) -> None:
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            await conn.execute(self._cleanup_sql())
+
+    async def _fetch(
+        self,
+        build: Callable[[bool], tuple[sql.Composed, Sequence[object]]],
+        *,
+        vectors: bool = True,
+        settings: Sequence[sql.Composed] = (),
+    ) -> list[tuple]:
+        """Run a read statement; ``build(binary)`` renders it for the negotiated vector format.
+
+        ``settings`` (``SET LOCAL`` statements) run first in the same transaction.
+        """
+
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            binary = vectors and await self._register_vector(conn)
+            query_sql, params = build(binary)
+            async with conn.cursor(binary=binary) as cur:
+                for statement in settings:
+                    await cur.execute(statement)
+                await cur.execute(query_sql, params, prepare=self._prepare)
+                return await cur.fetchall()
+
+    async def _register_vector(self, conn: AsyncConnection) -> bool:
+        if not self._binary_vectors:
+            return False
+        if self._vector_info is not None:
+            return self._use_vector_info(conn, self._vector_info)
+        try:
+            info = await TypeInfo.fetch(conn, "vector")
+        except (TypeError, psycopg.Error) as exc:
+            return self._disable_binary_vectors(exc)
+        return self._use_vector_info(conn, info)
+
+    async def _get_pool(self) -> AsyncConnectionPool:
+        if self._pool is None:
+            self._pool = AsyncConnectionPool(
+                self._conninfo,
+                open=False,
+                check=AsyncConnectionPool.check_connection,
+                name=f"memory37:{self._table}",
+                **self._pool_options,
+            )
+        await self._pool.open()
+        return self._pool
+
+    async def _ensure_schema(self, conn: AsyncConnection) -> None:
+        if self._schema_initialized:
+            return
+        async with conn.cursor() as cur:
+            await cur.execute(*self._layout_sql())
+            layout = await cur.fetchone()
+            self._check_layout(layout)
+            for statement in self._schema_statements(text_index=layout is None):
+                await cur.execute(statement)
+        await conn.commit()
+        self._schema_initialized = True
+
+
+_DISTANCE_OPERATORS = {"inner_product": "<#>", "cosine": "<=>"}
+_OPCLASS_SUFFIXES = {"inner_product": "ip", "cosine": "cosine"}
+_FILTER_COLUMNS = ("domain", "knowledge_version_id")
+_EMBEDDING_COLUMN = sql.SQL("embedding")
+_NO_EMBEDDING = sql.SQL("NULL::vector AS embedding")
+
+_ROW_COLUMNS = sql.SQL("item_id, domain, embedding, metadata, knowledge_version_id, expires_at")
+_FTS_DOCUMENT = sql.SQL("to_tsvector('simple', coalesce(metadata->>'content', ''))")
+
+
+def _check_rows(
+    directory: Path,
+    name: str,
+    matrix: np.ndarray,
+    scales: np.ndarray,
+    norms: np.ndarray,
+    layout: dict,
+    precision: VectorPrecision,
+) -> None:
+    """Raise ``ValueError`` unless snapshot arrays match the row count and dimension in ``vectors.json``."""
+
+    count, dimension = layout["count"], layout["dimension"]
+    if matrix.shape != (count, dimension) or matrix.dtype != _PRECISION_DTYPES[precision]:
+        raise ValueError(
+            f"snapshot {directory} is inconsistent: {name} is {matrix.dtype}{matrix.shape}, "
+            f"expected {np.dtype(_PRECISION_DTYPES[precision])}{(count, dimension)}"
+        )
+    if scales.shape != (count,) or norms.shape != (count,):
+        raise ValueError(f"snapshot {directory} is inconsistent: {name} scales/norms do not have {count} rows")
+
+
+def _split_metadata(record: VectorRecord) -> tuple[dict[str, str], str | None, object]:
+    """Metadata without the keys stored in dedicated columns, plus version and expiry."""
+
+    metadata = dict(record.metadata)
+    version = metadata.pop("knowledge_version_id", None)
+    expires_at = metadata.pop("expires_at", None)
+    return metadata, version, expires_at
+
+
+def _row_metadata(metadata: object, version: str | None, expires_at: object) -> dict[str, str]:
+    return {
+        **(dict(metadata) if isinstance(metadata, dict) else json.loads(metadata)),
+        **({"knowledge_version_id": version} if version else {}),
+        **({"expires_at": expires_at} if expires_at else {}),
+    }
+
+
 def _format_vector_literal(vector: Sequence[float]) -> str:
     return "[" + ",".join(f"{x:.10f}" for x in vector) + "]"
 
 
 def _parse_vector(value: object) -> list[float]:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, "to_numpy"):  # pgvector.Vector from the binary loader
+        return value.to_numpy().tolist()
     if isinstance(value, (list, tuple)):
         return [float(v) for v in value]
     if isinstance(value, str):
@@ -0,0 +1,58 @@
+import pytest
+
+from memory37.chunking import SemanticChunker
+from memory37.types import Chunk
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def test_semantic_chunker_keeps_sentences_whole_and_overlaps() -> None:
+    chunker = SemanticChunker(max_tokens=5, overlap_tokens=2, token_counter=count_words)
+
+    parts = list(chunker.split("One two. Three four. Five six! Seven eight? Nine ten."))
+
+    assert parts == ["One two. Three four.", "Three four. Five six!", "Five six! Seven eight?", "Seven eight? Nine ten."]
+
+
+def test_semantic_chunker_closes_chunks_at_paragraphs() -> None:
+    text = (
+        "The moon bridge spans the gorge. It glows at night! Travellers say it sings?\n\n"
+        "The old well is dry. Nobody drinks from it."
+    )
+    chunker = SemanticChunker(max_tokens=12, overlap_tokens=0, min_tokens=4, token_counter=count_words)
+
+    assert list(chunker.split(text)) == [
+        "The moon bridge spans the gorge. It glows at night!",
+        "Travellers say it sings?",
+        "The old well is dry. Nobody drinks from it.",
+    ]
+
+
+def test_semantic_chunker_splits_long_sentences_and_drops_repeated_parts() -> None:
+    chunker = SemanticChunker(max_tokens=4, overlap_tokens=0, token_counter=count_words)
+    source = Chunk(
+        id="lore::wall",
+        domain="lore",
+        text="stone " * 12 + "gate of the north wall",
+        payload={"source": "wall.md"},
+        metadata={"tags": "wall"},
+    )
+
+    parts = list(chunker(source))
+
+    assert [part.text for part in parts] == ["stone stone stone stone", "gate of the north", "wall"]
+    assert [part.id for part in parts] == ["lore::wall::part0", "lore::wall::part1", "lore::wall::part2"]
+    parts[0].metadata["tags"] = "changed"
+    assert source.metadata == {"tags": "wall"} and parts[1].metadata == {"tags": "wall"}
+
+
+def test_semantic_chunker_returns_short_text_unchanged() -> None:
+    source = Chunk(id="lore::short", domain="lore", text="A short note.", payload={}, metadata={})
+
+    assert list(SemanticChunker()(source)) == [source]
+    padded = Chunk(id="lore::padded", domain="lore", text="  A short\n note.\n\n", payload={}, metadata={})
+    assert list(SemanticChunker()(padded)) == [padded]
+    with pytest.raises(ValueError):
+        SemanticChunker(max_tokens=10, overlap_tokens=10)
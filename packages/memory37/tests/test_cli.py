@@ -33,6 +33,17 @@ art:
     assert "Ingested" in result.stdout
 
 
+def test_cli_ingest_file_diff_only_reports_counts(tmp_path: Path) -> None:
+    file_path = tmp_path / "knowledge.yaml"
+    file_path.write_text("lore:\n  - id: moon\n    title: Moon\n    body: Bridge\n", encoding="utf-8")
+
+    result = runner.invoke(app, ["ingest-file", str(file_path), "--dry-run", "--diff-only", "--knowledge-version-id", "kv_1"])
+
+    assert result.exit_code == 0
+    assert "Would apply: 1 new, 0 changed, 0 unchanged, 0 removed." in result.stdout
+    assert "Ingested" not in result.stdout
+
+
 def test_cli_ingest_runtime_snapshot_dry_run(tmp_path: Path) -> None:
     scenes_file = tmp_path / "scenes.yaml"
     scenes_file.write_text(
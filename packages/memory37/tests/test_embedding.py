@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from memory37.embedding import HashingEmbeddingProvider
+
+
+def test_hashing_embedder_is_deterministic_and_normalised() -> None:
+    texts = ["The moon bridge guards the ruins", "", "Moon bridge!"]
+
+    first = HashingEmbeddingProvider(dimension=256).embed_matrix(texts)
+    second = np.asarray(HashingEmbeddingProvider(dimension=256).embed(texts))
+
+    assert first.shape == (3, 256) and first.dtype == np.float32
+    np.testing.assert_allclose(first, second, rtol=1e-6)
+    assert np.linalg.norm(first[0]) == pytest.approx(1.0, abs=1e-5)
+    assert not first[1].any()
+
+
+def test_hashing_embedder_similarity_follows_shared_words_and_pieces() -> None:
+    provider = HashingEmbeddingProvider(dimension=1024)
+    anchor, related, inflected, unrelated = provider.embed_matrix(
+        [
+            "ancient moon bridge over the river",
+            "the moon bridge",
+            "moonlit bridges",
+            "merchant sells rare artifacts",
+        ]
+    )
+
+    assert anchor @ related > anchor @ inflected > anchor @ unrelated
+    assert anchor @ inflected > 0.1  # shared character n-grams, no shared words
+
+
+def test_hashing_embedder_batches_match_single_texts() -> None:
+    provider = HashingEmbeddingProvider(dimension=64)
+    provider._CHUNK = 2
+    texts = [f"text number {idx} about the moon" for idx in range(5)]
+
+    batch = provider.embed_matrix(texts)
+
+    for idx, text in enumerate(texts):
+        np.testing.assert_allclose(batch[idx], provider.embed_matrix([text])[0], rtol=1e-6)
@@ -0,0 +1,148 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from memory37.embedding_cache import (
+    CachedEmbeddingProvider,
+    PersistentEmbeddingProvider,
+    SQLiteEmbeddingCache,
+    with_embedding_cache,
+)
+
+
+class RecordingProvider:
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def embed(self, texts, *, model=None):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_cache_hits_on_normalized_text_and_dedupes_batch() -> None:
+    provider = RecordingProvider()
+    cache = CachedEmbeddingProvider(provider, max_entries=10)
+
+    first = cache.embed(["moon  ruins", "moon ruins", "npc"], model="m")
+    second = cache.embed([" moon ruins "], model="m")
+
+    assert provider.calls == [["moon  ruins", "npc"]]
+    assert first[0] == first[1] == second[0]
+    assert cache.stats.misses == 2
+    assert cache.stats.hits == 1
+    assert cache.stats.hit_ratio == pytest.approx(1 / 3)
+
+
+def test_cache_keys_include_model() -> None:
+    provider = RecordingProvider()
+    cache = CachedEmbeddingProvider(provider)
+
+    cache.embed(["moon"], model="a")
+    cache.embed(["moon"], model="b")
+
+    assert len(provider.calls) == 2
+
+
+def test_cache_evicts_least_recently_used_and_expires_by_ttl() -> None:
+    provider = RecordingProvider()
+    clock = FakeClock()
+    cache = CachedEmbeddingProvider(provider, max_entries=2, ttl_seconds=10, clock=clock)
+
+    cache.embed(["a", "b"])
+    cache.embed(["a"])  # refresh "a"
+    cache.embed(["c"])  # evicts "b"
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+
+    cache.embed(["a"])
+    assert provider.calls[-1] == ["c"]
+
+    clock.now = 11
+    cache.embed(["a"])
+    assert provider.calls[-1] == ["a"]
+    assert cache.stats.expirations == 1
+
+
+def test_cache_shares_vectors_through_redis() -> None:
+    server = fakeredis.FakeServer()
+    provider_a, provider_b = RecordingProvider(), RecordingProvider()
+    worker_a = CachedEmbeddingProvider(provider_a, redis_client=fakeredis.FakeRedis(server=server))
+    worker_b = CachedEmbeddingProvider(provider_b, redis_client=fakeredis.FakeRedis(server=server))
+
+    vector_a = worker_a.embed(["moon bridge"], model="m")[0]
+    vector_b = worker_b.embed(["moon bridge"], model="m")[0]
+
+    assert provider_b.calls == []
+    assert vector_b == pytest.approx(vector_a)
+    assert worker_b.stats.shared_hits == 1
+
+
+def test_async_cache_awaits_native_aembed_for_misses_only() -> None:
+    class AsyncProvider(RecordingProvider):
+        def __init__(self) -> None:
+            super().__init__()
+            self.async_calls: list[list[str]] = []
+
+        async def aembed(self, texts, *, model=None):
+            self.async_calls.append(list(texts))
+            return [[float(len(text)), 2.0] for text in texts]
+
+    server = fakeredis.FakeServer()
+    provider = AsyncProvider()
+    cache = CachedEmbeddingProvider(provider, redis_client=fakeredis.FakeRedis(server=server))
+    CachedEmbeddingProvider(RecordingProvider(), redis_client=fakeredis.FakeRedis(server=server)).embed(
+        ["shared"], model="m"
+    )
+    cache.embed(["local"], model="m")
+
+    vectors = asyncio.run(cache.aembed(["local", "shared", "fresh", "fresh"], model="m"))
+
+    assert provider.async_calls == [["fresh"]]
+    assert provider.calls == [["local"]]
+    assert vectors[2] == vectors[3] == [5.0, 2.0]
+    assert (cache.stats.hits, cache.stats.shared_hits, cache.stats.misses) == (1, 1, 2)
+    # Without a native aembed the wrapped provider's embed serves the misses.
+    plain = RecordingProvider()
+    assert asyncio.run(CachedEmbeddingProvider(plain).aembed(["moon"])) == [[4.0, 1.0]]
+    assert plain.calls == [["moon"]]
+
+
+def test_persistent_cache_survives_reopen(tmp_path) -> None:
+    path = tmp_path / "embeddings.sqlite"
+    first = PersistentEmbeddingProvider(RecordingProvider(), path, default_model="m")
+    vectors = first.embed(["moon bridge", "ancient ruins"])
+    first.cache.close()
+
+    provider = RecordingProvider()
+    with SQLiteEmbeddingCache(path) as cache:
+        second = PersistentEmbeddingProvider(provider, cache, default_model="m")
+        assert second.embed(["ancient ruins", "moon  bridge"]) == [vectors[1], vectors[0]]
+        assert len(cache) == 2
+    assert provider.calls == []
+
+
+def test_persistent_cache_embeds_only_changed_texts(tmp_path) -> None:
+    provider = RecordingProvider()
+    with SQLiteEmbeddingCache(tmp_path / "embeddings.sqlite") as cache:
+        cached = PersistentEmbeddingProvider(provider, cache)
+        cached.embed(["a", "b", "c"])
+        cached.embed(["a", "b changed", "c", "b changed"])
+
+    assert provider.calls == [["a", "b", "c"], ["b changed"]]
+    assert cached.stats.hits == 2
+    assert cached.stats.misses == 4
+
+
+def test_with_embedding_cache_is_noop_without_path() -> None:
+    provider = RecordingProvider()
+
+    assert with_embedding_cache(provider, None) is provider
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from memory37.lexical import BM25Index, normalize_scores, tokenize
+
+
+def _index() -> BM25Index:
+    index = BM25Index()
+    index.add_many(
+        "lore",
+        [
+            ("lore_1", "The moon bridge guards the ancient ruins."),
+            ("lore_2", "Moonlit ruins, ruins and more ruins under the sky"),
+            ("lore_3", "A merchant sells rare artifacts at the market"),
+        ],
+    )
+    index.add("scene", "scene_1", "Moon festival in the market square")
+    return index
+
+
+def test_tokenize_drops_punctuation_and_keeps_unicode() -> None:
+    assert tokenize("Лунный мост, ruins!") == ["лунный", "мост", "ruins"]
+
+
+def test_bm25_scores_only_matching_documents_in_domain() -> None:
+    scores = _index().score("lore", "ruins")
+
+    assert set(scores) == {"lore_1", "lore_2"}
+    assert scores["lore_2"] > scores["lore_1"]  # higher term frequency
+
+
+def test_bm25_prefix_matches_are_range_scans() -> None:
+    index = _index()
+
+    scores = index.score("lore", "moon")
+
+    assert set(scores) == {"lore_1", "lore_2"}  # "moon" and "moonlit"
+    assert index.score("lore", "mo") == {}  # below min_prefix only exact terms match
+
+
+def test_bm25_rare_terms_weigh_more() -> None:
+    scores = _index().score("lore", "merchant ruins")
+
+    assert max(scores, key=scores.get) == "lore_3"
+
+
+def test_bm25_restricts_to_candidate_ids() -> None:
+    scores = _index().score("lore", "ruins moon", doc_ids=["lore_1", "lore_3"])
+
+    assert set(scores) == {"lore_1"}
+
+
+def test_bm25_readd_replaces_document_and_remove_drops_it() -> None:
+    index = _index()
+    index.add("lore", "lore_3", "ruins of the merchant guild")
+    assert "lore_3" in index.score("lore", "ruins")
+
+    index.remove("lore", "lore_3")
+    assert "lore_3" not in index.score("lore", "ruins")
+    assert index.size("lore") == 2
+    assert not index.contains("lore", "lore_3")
+
+
+def test_bm25_top_k_with_predicate() -> None:
+    top = _index().top_k("lore", "ruins moon", 1, accept=lambda doc_id: doc_id != "lore_2")
+
+    assert [doc_id for doc_id, _ in top] == ["lore_1"]
+    assert top[0][1] == pytest.approx(_index().score("lore", "ruins moon")["lore_1"])
+
+
+def test_bm25_state_round_trip_scores_identically() -> None:
+    index = _index()
+    restored = BM25Index.from_state(json.loads(json.dumps(index.to_state())))
+
+    assert restored.score("lore", "moon ruins") == index.score("lore", "moon ruins")
+    restored.remove("lore", "lore_2")
+    assert restored.size("lore") == 2 and "lore_2" not in restored.score("lore", "ruins")
+
+
+def test_normalized_bm25_is_bounded_regardless_of_corpus_size() -> None:
+    small = _index()
+    large = _index()
+    large.add_many("lore", ((f"filler_{idx}", f"merchant road {idx}") for idx in range(200)))
+
+    for index in (small, large):
+        scores = normalize_scores(index.score("lore", "moon ruins"))
+        assert max(scores.values()) == pytest.approx(1.0)
+        assert all(0.0 < value <= 1.0 for value in scores.values())
+    assert max(large.score("lore", "moon ruins").values()) > max(small.score("lore", "moon ruins").values())
+    assert normalize_scores({}) == {}
@@ -1,3 +1,4 @@
+import asyncio
 import types
 
 import pytest
@@ -20,6 +21,133 @@ def test_openai_embedding_provider_with_stub_client(monkeypatch):
     assert vectors == [[5.0], [5.0]]
 
 
+class DummyAsyncEmbeddingsClient:
+    async def create(self, model, input):
+        return DummyEmbeddingsClient().create(model, input)
+
+
+def test_openai_embedding_provider_aembed_uses_async_client():
+    provider = OpenAIEmbeddingProvider(
+        client=types.SimpleNamespace(embeddings=None),
+        async_client=types.SimpleNamespace(embeddings=DummyAsyncEmbeddingsClient()),
+        model="stub",
+    )
+    vectors = asyncio.run(provider.aembed(["hi", "moon"]))
+    assert vectors == [[2.0], [4.0]]
+
+
+class FlakyEmbeddingsClient:
+    """Fails the first ``failures`` calls with the given status, then embeds."""
+
+    def __init__(self, failures=0, status=429):
+        self.failures = failures
+        self.status = status
+        self.calls = []
+
+    def _respond(self, input):
+        self.calls.append(list(input))
+        if self.failures:
+            self.failures -= 1
+            raise _StatusError(self.status)
+        entries = [types.SimpleNamespace(index=idx, embedding=[float(len(text))]) for idx, text in enumerate(input)]
+        return types.SimpleNamespace(data=list(reversed(entries)))
+
+    def create(self, model, input):
+        return self._respond(input)
+
+
+class FlakyAsyncEmbeddingsClient(FlakyEmbeddingsClient):
+    async def create(self, model, input):
+        return self._respond(input)
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers={"retry-after": "0"})
+
+
+def _batched_provider(client=None, async_client=None, **kwargs):
+    return OpenAIEmbeddingProvider(
+        client=types.SimpleNamespace(embeddings=client),
+        async_client=types.SimpleNamespace(embeddings=async_client) if async_client else None,
+        model="stub",
+        **{"retry_base_delay": 0.0, "token_counter": len, **kwargs},
+    )
+
+
+def test_openai_embedding_batches_by_items_and_tokens_and_keeps_order():
+    client = FlakyEmbeddingsClient()
+    provider = _batched_provider(client, max_batch_items=3, max_batch_tokens=10, max_concurrency=2)
+    texts = ["aaaa", "bbbb", "cc", "d", "eeeeeeeeeeee", "f"]
+
+    vectors = provider.embed(texts)
+
+    assert vectors == [[float(len(text))] for text in texts]
+    assert sorted(client.calls) == sorted([["aaaa", "bbbb", "cc"], ["d"], ["eeeeeeeeeeee"], ["f"]])
+    assert provider.stats.requests == 4
+    assert provider.stats.texts == 6
+
+
+def test_openai_embedding_retries_rate_limits_and_server_errors():
+    client = FlakyEmbeddingsClient(failures=2, status=429)
+    provider = _batched_provider(client)
+    assert provider.embed(["hi"]) == [[2.0]]
+    assert provider.stats.retries == 2
+
+    async_client = FlakyAsyncEmbeddingsClient(failures=1, status=503)
+    provider = _batched_provider(async_client=async_client, max_batch_items=1)
+    assert asyncio.run(provider.aembed(["hi", "moon"])) == [[2.0], [4.0]]
+    assert provider.stats.retries == 1
+
+
+def test_openai_embedding_does_not_retry_client_errors():
+    client = FlakyEmbeddingsClient(failures=1, status=400)
+    provider = _batched_provider(client)
+    with pytest.raises(_StatusError):
+        provider.embed(["hi"])
+    assert len(client.calls) == 1
+
+
+def test_openai_embedding_does_not_retry_timeouts_or_conflicts():
+    for status in (408, 409):
+        client = FlakyEmbeddingsClient(failures=1, status=status)
+        with pytest.raises(_StatusError):
+            _batched_provider(client).embed(["hi"])
+        assert len(client.calls) == 1
+
+
+def test_openai_embedding_rejects_oversized_inputs_before_any_request():
+    client = FlakyEmbeddingsClient()
+    provider = _batched_provider(client, max_input_tokens=4)
+    with pytest.raises(ValueError, match="Input 1"):
+        provider.embed(["moon", "moon bridge"])
+    assert client.calls == []
+
+
+def test_openai_embedding_leaves_estimated_oversize_inputs_to_the_api(caplog):
+    client = FlakyEmbeddingsClient()
+    provider = _batched_provider(client, max_input_tokens=2, token_counter=None)
+    with caplog.at_level("WARNING", logger="memory37.embedding"):
+        assert provider.embed(["moon bridge"]) == [[11.0]]
+    assert len(client.calls) == 1
+    assert "estimated tokens" in caplog.text
+
+
+def test_openai_sdk_clients_are_built_without_their_own_retries(monkeypatch):
+    built = []
+
+    def recorder(**kwargs):
+        built.append(kwargs)
+        return types.SimpleNamespace(embeddings=None)
+
+    monkeypatch.setattr("memory37.embedding.OpenAI", recorder)
+    monkeypatch.setattr("memory37.embedding.AsyncOpenAI", recorder)
+    OpenAIEmbeddingProvider(api_key="sk-test", model="stub")
+    assert [kwargs["max_retries"] for kwargs in built] == [0, 0]
+
+
 class DummyResponsesClient:
     def create(self, *args, **kwargs):
         class Response:
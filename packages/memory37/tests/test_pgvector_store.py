@@ -1,19 +1,66 @@
+import asyncio
 from collections import deque
 
-from memory37.vector_store import PgVectorStore, VectorRecord
+import numpy as np
+import pytest
+from pgvector import Vector
+
+from memory37.config import KnowledgeConfig
+from memory37.stores.pgvector_store import PgVectorWrapper
+from memory37.types import Chunk, ChunkScore, SearchRequest
+from memory37.vector_store import AsyncPgVectorStore, PgVectorStore, VectorIndexSpec, VectorRecord
+
+
+def _render(query) -> str:
+    """SQL text of a statement; ``sql.Composed`` is rendered instead of relying on its repr."""
+
+    return query.as_string(None) if hasattr(query, "as_string") else str(query)
+
+
+class FakeCopy:
+    def __init__(self, rows: list[tuple]) -> None:
+        self.rows = rows
+        self.types: list[str] = []
+
+    def set_types(self, types):
+        self.types = list(types)
+
+    def write_row(self, row):
+        self.rows.append(tuple(row))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
 
 
 class FakeCursor:
-    def __init__(self, queries: list[tuple[str, tuple | list | None]], results: list[tuple] | None = None) -> None:
+    rowcount = -1
+
+    def __init__(
+        self,
+        queries: list[tuple[str, tuple | list | None]],
+        results: list[tuple] | None = None,
+        copied: list[tuple] | None = None,
+    ) -> None:
         self._collector = queries
         self._results = deque(results or [])
+        self._copied = copied if copied is not None else []
 
     def execute(self, query, params=None):
-        self._collector.append((str(query), params))
+        self._collector.append((_render(query), params))
+
+    def copy(self, statement):
+        self._collector.append((_render(statement), None))
+        return FakeCopy(self._copied)
 
     def fetchall(self):
         return list(self._results)
 
+    def fetchone(self):
+        return None
+
     def __enter__(self):
         return self
 
@@ -25,13 +72,16 @@ class FakeConnection:
     def __init__(self, results: list[tuple] | None = None) -> None:
         self.queries: list[tuple[str, tuple | list | None]] = []
         self._results = results or []
+        self.copied: list[tuple] = []
+        self.commits = 0
         self.committed = False
         self.closed = False
 
-    def cursor(self):
-        return FakeCursor(self.queries, self._results)
+    def cursor(self, **kwargs):
+        return FakeCursor(self.queries, self._results, self.copied)
 
     def commit(self):
+        self.commits += 1
         self.committed = True
 
     def close(self):
@@ -60,7 +110,7 @@ def test_pgvector_store_upsert_executes_insert_sql(monkeypatch) -> None:
 
 
 def test_pgvector_store_query_returns_records(monkeypatch) -> None:
-    result_rows = [("kn_1", [0.1, 0.2, 0.3], {"domain": "scene"}, None, None)]
+    result_rows = [("kn_1", [0.1, 0.2, 0.3], {"domain": "scene"}, None, None, -0.14)]
     connection = FakeConnection(result_rows)
 
     def factory():
@@ -74,3 +124,648 @@ def test_pgvector_store_query_returns_records(monkeypatch) -> None:
     assert len(records) == 1
     assert records[0].item_id == "kn_1"
     assert records[0].metadata["domain"] == "scene"
+
+
+def test_pgvector_store_keyword_query_uses_full_text_rank() -> None:
+    result_rows = [("kn_1", {"domain": "lore", "content": "moon token"}, "kv_1", None, 0.4)]
+    connection = FakeConnection(result_rows)
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=3)
+
+    records = store.keyword_query("Moon token!", top_k=5, metadata_filter={"domain": "lore"})
+
+    sql_text, params = connection.queries[-1]
+    assert "to_tsquery('simple', %s)" in sql_text
+    assert "ts_rank_cd" in sql_text
+    assert params[0] == "moon:* | token:*"
+    assert params[-1] == 5
+    assert records[0].item_id == "kn_1"
+    assert records[0].score == 0.4
+    assert records[0].metadata["knowledge_version_id"] == "kv_1"
+    assert records[0].vector == []
+
+
+def test_pgvector_store_query_domains_single_round_trip() -> None:
+    result_rows = [
+        ("scene", "scene_1", "[0.1,0.2,0.3]", {"domain": "scene"}, None, None, -0.14),
+        ("lore", "lore_1", "[0.3,0.2,0.1]", {"domain": "lore"}, None, None, -0.1),
+    ]
+    connection = FakeConnection(result_rows)
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=3)
+
+    by_domain = store.query_domains([0.1, 0.2, 0.3], domains=["scene", "lore", "npc"], top_k=2)
+
+    assert len(connection.queries) == 1
+    sql_text, params = connection.queries[0]
+    assert "CROSS JOIN LATERAL" in sql_text
+    assert params[0] == ["scene", "lore", "npc"]
+    assert [r.item_id for r in by_domain["scene"]] == ["scene_1"]
+    assert by_domain["lore"][0].vector == [0.3, 0.2, 0.1]
+    assert by_domain["npc"] == []
+
+
+def test_pgvector_store_upsert_bulk_copies_batches_and_merges() -> None:
+    connection = FakeConnection()
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+    store._schema_initialized = True
+    records = [
+        VectorRecord(item_id=f"kn_{idx}", vector=[float(idx), 1.0], metadata={"domain": "lore", "knowledge_version_id": "kv_1"})
+        for idx in range(5)
+    ]
+    records.append(VectorRecord(item_id="kn_0", vector=[9.0, 9.0], metadata={"domain": "lore", "expires_at": "2030-01-01T00:00:00+00:00"}))
+
+    stats = store.upsert_bulk(records, batch_size=2)
+
+    assert stats.rows == 5
+    assert stats.batches == 3
+    assert stats.rows_per_second > 0
+    assert connection.commits == 3
+    assert connection.closed
+    statements = [q for q, _ in connection.queries]
+    assert sum("FROM STDIN (FORMAT BINARY)" in q for q in statements) == 3
+    assert sum("ON CONFLICT (item_id)" in q and "embedding::vector" in q for q in statements) == 3
+    assert not any("VALUES" in q for q in statements)
+    assert connection.copied[0] == ("kn_0", "lore", [9.0, 9.0], {"domain": "lore"}, None, "2030-01-01T00:00:00+00:00")
+    assert connection.copied[1] == ("kn_1", "lore", [1.0, 1.0], {"domain": "lore"}, "kv_1", None)
+
+
+class FakeAsyncCursor:
+    def __init__(self, connection: "FakeAsyncConnection") -> None:
+        self._connection = connection
+
+    async def execute(self, query, params=None, *, prepare=None):
+        self._connection.queries.append((_render(query), params, prepare))
+
+    async def executemany(self, query, params_seq):
+        for params in params_seq:
+            self._connection.queries.append((_render(query), params, None))
+
+    async def fetchall(self):
+        return list(self._connection.results)
+
+    async def fetchone(self):
+        return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class FakeAsyncConnection:
+    def __init__(self, results: list[tuple] | None = None) -> None:
+        self.queries: list[tuple[str, object, object]] = []
+        self.results = results or []
+        self.cursor_options: list[dict] = []
+
+    def cursor(self, **kwargs):
+        self.cursor_options.append(kwargs)
+        return FakeAsyncCursor(self)
+
+    async def execute(self, query, params=None):
+        self.queries.append((_render(query), params, None))
+
+    async def commit(self):
+        pass
+
+
+class FakeAsyncPool:
+    def __init__(self, connection: FakeAsyncConnection) -> None:
+        self._connection = connection
+        self.checkouts = 0
+        self.opened = 0
+        self.closed = False
+
+    async def open(self):
+        self.opened += 1
+
+    async def close(self):
+        self.closed = True
+
+    def connection(self):
+        pool = self
+
+        class _Checkout:
+            async def __aenter__(self):
+                pool.checkouts += 1
+                return pool._connection
+
+            async def __aexit__(self, exc_type, exc, tb):
+                return False
+
+        return _Checkout()
+
+
+def test_async_pgvector_store_reuses_pool_and_prepares_reads() -> None:
+    connection = FakeAsyncConnection([("kn_1", "[0.1,0.2,0.3]", {"domain": "scene"}, None, None, -0.14)])
+    pool = FakeAsyncPool(connection)
+    store = AsyncPgVectorStore(pool=pool, table="test_vectors", dimension=3)
+
+    async def scenario():
+        await store.upsert([VectorRecord(item_id="kn_1", vector=[0.1, 0.2, 0.3], metadata={"domain": "scene"})])
+        first = await store.query([0.1, 0.2, 0.3], top_k=5)
+        second = await store.query([0.1, 0.2, 0.3], top_k=5, metadata_filter={"domain": "scene"})
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first[0].item_id == "kn_1"
+    assert second[0].vector == [0.1, 0.2, 0.3]
+    assert pool.checkouts == 3
+    statements = connection.queries
+    assert sum("CREATE TABLE IF NOT EXISTS" in q for q, _, _ in statements) == 1
+    assert [prepare for q, _, prepare in statements if "ORDER BY distance" in q] == [True, True]
+
+
+def test_pg_wrapper_awaits_async_store_and_closes_pool() -> None:
+    connection = FakeAsyncConnection([("lore", "kn_1", None, {"content": "moon bridge"}, None, None, -0.8)])
+    pool = FakeAsyncPool(connection)
+    wrapper = PgVectorWrapper(store=AsyncPgVectorStore(pool=pool, table="test_vectors", dimension=2, prepare=None))
+
+    async def scenario():
+        results = await wrapper.search_domains(domains=["lore", "npc"], query="moon", k=3)
+        await wrapper.aclose()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert [score.chunk.id for score in results] == ["kn_1"]
+    assert pool.closed
+
+
+def test_pgvector_store_falls_back_to_text_literals_without_psycopg_connection() -> None:
+    connection = FakeConnection([("kn_1", "[0.5,0.25]", {"domain": "lore"}, None, None, -0.3125)])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+
+    records = store.query([0.5, 0.25], top_k=1)
+
+    assert connection.queries[-1][1][0] == "[0.5000000000,0.2500000000]"
+    assert records[0].vector == [0.5, 0.25]
+
+
+def test_async_pgvector_store_sends_and_reads_binary_vectors(monkeypatch) -> None:
+    connection = FakeAsyncConnection([("kn_1", Vector([0.5, 0.25]), {"domain": "lore"}, None, None, -0.3125)])
+    store = AsyncPgVectorStore(pool=FakeAsyncPool(connection), table="test_vectors", dimension=2)
+
+    async def registered(conn):
+        return True
+
+    monkeypatch.setattr(store, "_register_vector", registered)
+
+    records = asyncio.run(store.query([0.5, 0.25], top_k=1))
+
+    vector_param = connection.queries[-1][1][0]
+    assert isinstance(vector_param, np.ndarray)
+    assert vector_param.dtype == np.float32
+    assert connection.cursor_options[-1] == {"binary": True}
+    assert records[0].vector == [0.5, 0.25]
+
+
+def test_pgvector_store_scores_in_database_without_embeddings() -> None:
+    connection = FakeConnection([("kn_1", None, {"domain": "lore"}, None, None, 0.2)])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2, distance="cosine")
+
+    records = store.query([1.0, 0.0], top_k=3, metadata_filter={"domain": "lore"}, with_vectors=False)
+
+    sql_text, params = connection.queries[-1]
+    assert "NULL::vector AS embedding" in sql_text
+    assert "<=>" in sql_text
+    assert "ORDER BY distance" in sql_text
+    assert params[-1] == 3
+    assert records[0].vector == []
+    assert records[0].score == 0.8
+
+
+def test_pg_wrapper_overfetches_for_lexical_rescoring() -> None:
+    rows = [
+        ("lore", f"kn_{idx}", None, {"content": text}, None, None, distance)
+        for idx, (text, distance) in enumerate([("ash road", -0.9), ("iron gate", -0.8), ("moon bridge moon", -0.7)])
+    ]
+    connection = FakeAsyncConnection(rows)
+    wrapper = PgVectorWrapper(
+        store=AsyncPgVectorStore(pool=FakeAsyncPool(connection), table="test_vectors", dimension=2),
+        rescore_fetch_k=3,
+        alpha=0.5,
+    )
+
+    results = asyncio.run(wrapper.search_domains(domains=["lore"], query="moon", k=1))
+
+    sql_text, params, _ = connection.queries[-1]
+    assert "NULL::vector AS embedding" in sql_text
+    assert params[-1] == 3
+    assert [score.chunk.id for score in results] == ["kn_2"]
+
+
+class SequencedConnection(FakeConnection):
+    """Returns the next prepared result set on every fetchall."""
+
+    def __init__(self, result_sets: list[list[tuple]]) -> None:
+        super().__init__()
+        self.result_sets = deque(result_sets)
+        self.autocommit = False
+
+    def cursor(self, **kwargs):
+        connection = self
+
+        class _Cursor(FakeCursor):
+            def fetchall(self):
+                return connection.result_sets.popleft()
+
+        return _Cursor(self.queries)
+
+
+def test_create_vector_index_rebuilds_invalid_index_concurrently() -> None:
+    name = "test_vectors_embedding_hnsw_cosine"
+    connection = SequencedConnection([[(name, "hnsw", 0, False)], [(name, "hnsw", 8192, True)]])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=3, distance="cosine")
+    store._schema_initialized = True
+
+    stats = store.create_vector_index(VectorIndexSpec(method="hnsw", m=24, ef_construction=100))
+
+    assert connection.autocommit
+    statements = [q for q, _ in connection.queries]
+    assert any("DROP INDEX" in q and "CONCURRENTLY" in q for q in statements)
+    create = next(q for q in statements if "CREATE INDEX" in q)
+    assert "CONCURRENTLY" in create and "hnsw" in create and "vector_cosine_ops" in create
+    assert "WITH (m = 24, ef_construction = 100)" in create
+    assert stats.valid and stats.size_bytes == 8192
+    assert stats.build_seconds is not None
+
+
+def test_create_vector_index_keeps_valid_index() -> None:
+    name = "test_vectors_embedding_ivfflat_ip"
+    connection = SequencedConnection([[(name, "ivfflat", 4096, True)], [(name, "ivfflat", 4096, True)]])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=3)
+    store._schema_initialized = True
+
+    stats = store.create_vector_index(VectorIndexSpec(method="ivfflat", lists=50))
+
+    assert not any("CREATE INDEX" in q for q, _ in connection.queries)
+    assert stats.name == name
+    assert stats.build_seconds is None
+
+
+def test_query_applies_recall_settings_with_set_local() -> None:
+    connection = FakeConnection([("kn_1", None, {"domain": "lore"}, None, None, -0.5)])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+
+    store.query([1.0, 0.0], top_k=1, ef_search=80, probes=10)
+
+    statements = [q for q, _ in connection.queries]
+    assert statements[-3] == "SET LOCAL hnsw.ef_search = 80"
+    assert statements[-2] == "SET LOCAL ivfflat.probes = 10"
+    assert "ORDER BY distance" in statements[-1]
+
+
+def test_query_filters_domain_and_version_by_column() -> None:
+    connection = FakeConnection([])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+
+    store.query([1.0, 0.0], top_k=3, metadata_filter={"domain": "lore", "knowledge_version_id": "kv_1", "tag": "moon"})
+
+    sql_text, params = connection.queries[-1]
+    assert '"domain" = %s' in sql_text and '"knowledge_version_id" = %s' in sql_text
+    assert params[1:] == ["lore", "kv_1", '{"tag": "moon"}', 3]
+
+
+class LayoutConnection(FakeConnection):
+    """Reports an existing table layout and per-statement row counts."""
+
+    def __init__(self, layout: tuple | None, rowcounts: list[int] | None = None) -> None:
+        super().__init__()
+        self.layout = layout
+        self.rowcounts = deque(rowcounts or [])
+
+    def cursor(self, **kwargs):
+        connection = self
+
+        class _Cursor(FakeCursor):
+            rowcount = -1
+
+            def execute(self, query, params=None):
+                super().execute(query, params)
+                if "UPDATE" in _render(query) or "INSERT INTO" in _render(query):
+                    self.rowcount = connection.rowcounts.popleft() if connection.rowcounts else 0
+
+            def fetchone(self):
+                return connection.layout
+
+        return _Cursor(self.queries)
+
+
+def test_partitioned_store_creates_list_partitions_and_keys_on_domain() -> None:
+    connection = LayoutConnection(None)
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2, partitions=["lore", "Scene-2"])
+
+    store.upsert([VectorRecord(item_id="kn_1", vector=[1.0, 0.0], metadata={"domain": "lore"})])
+
+    statements = [q for q, _ in connection.queries]
+    assert any("PARTITION BY LIST (domain)" in q and "PRIMARY KEY (domain, item_id)" in q for q in statements)
+    assert any('"test_vectors_p_lore" PARTITION OF "test_vectors" FOR VALUES IN (\'lore\')' in q for q in statements)
+    assert any('"test_vectors_p_scene_2"' in q for q in statements)
+    assert any('"test_vectors_default" PARTITION OF "test_vectors" DEFAULT' in q for q in statements)
+    insert_sql, params = connection.queries[-1]
+    assert "ON CONFLICT (domain, item_id)" in insert_sql
+    assert params[:2] == ("kn_1", "lore")
+
+
+def test_partitioned_store_refuses_plain_table_until_migrated() -> None:
+    connection = LayoutConnection(("r", True, []))
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2, partitions=["lore"])
+
+    with pytest.raises(RuntimeError, match="migrate_schema"):
+        store.upsert([VectorRecord(item_id="kn_1", vector=[1.0, 0.0], metadata={"domain": "lore"})])
+
+
+def test_startup_refuses_tables_that_need_a_migration() -> None:
+    unmigrated = LayoutConnection(("r", False, []))
+    with pytest.raises(RuntimeError, match="no domain column"):
+        PgVectorStore(lambda: unmigrated, table="test_vectors", dimension=2).upsert(
+            [VectorRecord(item_id="kn_1", vector=[1.0, 0.0], metadata={"domain": "lore"})]
+        )
+    assert not any("UPDATE" in q or "ADD COLUMN" in q for q, _ in unmigrated.queries)
+
+    partitioned = LayoutConnection(("p", True, ["test_vectors_default", "test_vectors_p_lore"]))
+    store = PgVectorStore(lambda: partitioned, table="test_vectors", dimension=2, partitions=["lore", "npc"])
+    with pytest.raises(RuntimeError, match="test_vectors_p_npc"):
+        store.upsert([VectorRecord(item_id="kn_1", vector=[1.0, 0.0], metadata={"domain": "npc"})])
+    assert not any("PARTITION OF" in q or "ATTACH" in q for q, _ in partitioned.queries)
+
+
+def test_migrate_schema_moves_rows_into_a_new_partition_in_batches() -> None:
+    connection = LayoutConnection(("p", True, ["test_vectors_default", "test_vectors_p_lore"]), rowcounts=[2, 1, 0])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2, partitions=["lore", "npc"])
+
+    stats = store.migrate_schema(batch_size=2)
+
+    statements = [q for q, _ in connection.queries]
+    step = {
+        label: next(idx for idx, q in enumerate(statements) if marker in q)
+        for label, marker in [
+            ("create", 'CREATE TABLE IF NOT EXISTS "test_vectors_p_npc" (LIKE "test_vectors"'),
+            ("move", 'DELETE FROM "test_vectors_default"'),
+            ("guard", "CHECK (domain <> 'npc') NOT VALID"),
+            ("validate", "VALIDATE CONSTRAINT"),
+            ("attach", 'ATTACH PARTITION "test_vectors_p_npc" FOR VALUES IN (\'npc\')'),
+        ]
+    }
+    assert step["create"] < step["move"] < step["guard"] < step["validate"] < step["attach"]
+    assert sum("LIMIT 2" in q and "domain = 'npc'" in q for q in statements) == 3
+    assert not any("DETACH" in q for q in statements)
+    assert stats.created_partitions == ["test_vectors_p_npc"] and stats.copied_rows == 3
+
+
+def test_migrate_schema_backfills_domain_in_batches() -> None:
+    connection = LayoutConnection(("r", False, []), rowcounts=[2, 2, 1])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+
+    stats = store.migrate_schema(batch_size=2)
+
+    statements = [q for q, _ in connection.queries]
+    assert any("ADD COLUMN IF NOT EXISTS domain" in q for q in statements)
+    assert sum("UPDATE" in q for q in statements) == 3
+    assert stats.backfilled_rows == 5
+    assert stats.copied_rows == 0 and stats.created_partitions == []
+    assert any("(domain, knowledge_version_id)" in q for q in statements)
+
+
+def test_migrate_schema_converts_plain_table_to_partitions() -> None:
+    connection = LayoutConnection(("r", True, []), rowcounts=[7])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2, partitions=["lore"])
+
+    stats = store.migrate_schema()
+
+    statements = [q for q, _ in connection.queries]
+    rename = next(idx for idx, q in enumerate(statements) if "RENAME TO" in q)
+    partitioned = next(idx for idx, q in enumerate(statements) if "PARTITION BY LIST" in q)
+    drop = next(idx for idx, q in enumerate(statements) if "DROP TABLE" in q)
+    assert rename < partitioned < drop
+    assert stats.copied_rows == 7
+    assert stats.created_partitions == ["test_vectors_default", "test_vectors_p_lore"]
+
+
+def test_full_text_index_is_built_at_startup_only_for_a_new_table() -> None:
+    fresh = LayoutConnection(None)
+    existing = LayoutConnection(("r", True, []))
+    for connection in (fresh, existing):
+        store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+        store.upsert([VectorRecord(item_id="kn_1", vector=[1.0, 0.0], metadata={"domain": "lore"})])
+
+    assert any("USING GIN" in q for q, _ in fresh.queries)
+    assert not any("USING GIN" in q for q, _ in existing.queries)
+
+
+def test_create_text_index_builds_gin_concurrently() -> None:
+    name = "test_vectors_content_fts"
+    connection = SequencedConnection([[], [(name, "gin", 2048, True)]])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+    store._schema_initialized = True
+
+    stats = store.create_text_index()
+
+    assert connection.autocommit
+    stats_params = connection.queries[0][1]
+    assert stats_params[-2:] == [["gin"], name]
+    create = next(q for q, _ in connection.queries if "CREATE INDEX" in q)
+    assert create.startswith(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "test_vectors" USING GIN')
+    assert stats.name == name and stats.method == "gin"
+
+
+def test_create_vector_index_per_domain() -> None:
+    name = "test_vectors_p_lore_embedding_hnsw_ip"
+    connection = SequencedConnection([[], [(name, "hnsw", 1024, True)]])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=3)
+    store._schema_initialized = True
+
+    stats = store.create_vector_index(domain="lore")
+
+    create = next(q for q, _ in connection.queries if "CREATE INDEX" in q)
+    assert f'"{name}"' in create and create.endswith("WHERE domain = 'lore'")
+    assert stats.name == name
+
+    partitioned = PgVectorStore(lambda: connection, table="test_vectors", dimension=3, partitions=["lore"])
+    with pytest.raises(ValueError):
+        partitioned.create_vector_index()
+    assert "WHERE" not in _render(partitioned._create_index_sql(VectorIndexSpec(), concurrently=True, domain="lore"))
+
+
+def test_query_many_uses_one_lateral_round_trip() -> None:
+    result_rows = [
+        (1, "npc_1", None, {"domain": "npc"}, None, None, -0.9),
+        (0, "lore_1", None, {"domain": "lore"}, "kv_1", None, -0.5),
+        (0, "lore_2", None, {"domain": "lore"}, "kv_1", None, -0.4),
+    ]
+    connection = FakeConnection(result_rows)
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+
+    results = store.query_many(
+        [("lore", [1.0, 0.0], {"knowledge_version_id": "kv_1", "tag": "x"}, 2), ("npc", [0.0, 1.0], None, 1), ("art", [1.0, 1.0], None, 1)],
+        with_vectors=False,
+    )
+
+    assert len(connection.queries) == 1
+    sql_text, params = connection.queries[0]
+    assert "CROSS JOIN LATERAL" in sql_text and "LIMIT q.k" in sql_text
+    # Without the pgvector binary dumper the vectors fall back to text literals.
+    assert "%s::text[]" in sql_text and "q.vec::vector" in sql_text
+    assert params[2][0].startswith("[1.0")
+    assert params[0] == [0, 1, 2]
+    assert params[1] == ["lore", "npc", "art"]
+    assert params[3] == ["kv_1", None, None]
+    assert params[4] == ['{"tag": "x"}', None, None]
+    assert params[5] == [2, 1, 1]
+    assert [r.item_id for r in results[0]] == ["lore_1", "lore_2"]
+    assert [r.item_id for r in results[1]] == ["npc_1"]
+    assert results[2] == []
+    assert results[0][0].score == 0.5
+
+
+def test_async_query_many_binds_query_vectors_as_a_binary_vector_array(monkeypatch) -> None:
+    connection = FakeAsyncConnection([(0, "lore_1", None, {"domain": "lore"}, None, None, -0.5)])
+    store = AsyncPgVectorStore(pool=FakeAsyncPool(connection), table="test_vectors", dimension=2)
+
+    async def registered(conn):
+        return True
+
+    monkeypatch.setattr(store, "_register_vector", registered)
+
+    results = asyncio.run(
+        store.query_many([("lore", [1.0, 0.0], None, 1), ("npc", [0.0, 1.0], None, 1)], with_vectors=False)
+    )
+
+    sql_text, params, _ = connection.queries[-1]
+    assert "%s::vector[]" in sql_text and "q.vec::vector" not in sql_text
+    assert all(isinstance(vector, np.ndarray) and vector.dtype == np.float32 for vector in params[2])
+    assert connection.cursor_options[-1] == {"binary": True}
+    assert [r.item_id for r in results[0]] == ["lore_1"]
+
+
+def test_wrapper_search_many_embeds_once_and_queries_once() -> None:
+    result_rows = [
+        (0, "lore_1", None, {"domain": "lore", "content": "moon gate"}, None, None, -0.8),
+        (1, "srd_1", None, {"domain": "srd", "content": "moon rule"}, None, None, -0.6),
+    ]
+    connection = FakeConnection(result_rows)
+    calls: list[list[str]] = []
+
+    class Provider:
+        def embed(self, texts, *, model=None):
+            calls.append(list(texts))
+            return [[1.0, 0.0] for _ in texts]
+
+    wrapper = PgVectorWrapper(lambda: connection, table="test_vectors", dimension=2, embedding_provider=Provider())
+    wrapper._store._schema_initialized = True
+
+    lore, rules = asyncio.run(
+        wrapper.search_many([SearchRequest(domain="lore", query="moon", k=3), SearchRequest(domain="srd", query="moon", k=3)])
+    )
+
+    assert calls == [["moon"]]
+    assert len(connection.queries) == 1
+    assert [s.chunk.id for s in lore] == ["lore_1"]
+    assert [s.chunk.id for s in rules] == ["srd_1"]
+
+
+def test_content_hashes_and_bulk_delete_use_columns() -> None:
+    connection = FakeConnection([("lore", "lore::1", "abc"), ("npc", "npc::1", None)])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+
+    hashes = store.content_hashes(knowledge_version_id="kv_1")
+    store.delete(["lore::1", "lore::2", "lore::1"], domain="lore")
+
+    assert hashes == {("lore", "lore::1"): "abc", ("npc", "npc::1"): None}
+    (select_sql, select_params), (delete_sql, delete_params) = connection.queries
+    assert "knowledge_version_id = %s" in select_sql and select_params == ["kv_1"]
+    assert "item_id = ANY(%s)" in delete_sql
+    assert delete_params == ["lore", ["lore::1", "lore::2"]]
+    assert connection.committed
+
+
+def test_content_hashes_by_source_and_expiry_refresh() -> None:
+    connection = FakeConnection([])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+
+    store.content_hashes(knowledge_version_id="kv_1", source="lore.yaml")
+    store.refresh_expiry(["lore::1", "lore::1"], domain="lore", expires_at="2099-01-01T00:00:00+00:00")
+
+    (select_sql, select_params), (update_sql, update_params) = connection.queries
+    assert "metadata->>'ingest_source' = %s" in select_sql and select_params == ["kv_1", "lore.yaml"]
+    assert update_sql == 'UPDATE "test_vectors" SET expires_at = %s WHERE item_id = ANY(%s) AND domain = %s'
+    assert update_params == ["2099-01-01T00:00:00+00:00", ["lore::1"], "lore"]
+    assert connection.committed
+
+
+def test_fetch_vectors_reads_rows_by_id() -> None:
+    connection = FakeConnection([("lore::1", "[0.5,0.25]", {"domain": "lore"}, None, None, None)])
+    store = PgVectorStore(lambda: connection, table="test_vectors", dimension=2)
+
+    records = store.fetch_vectors(["lore::1", "lore::1"], domain="lore")
+
+    (select_sql, params), = connection.queries
+    assert "WHERE item_id = ANY(%s) AND domain = %s" in select_sql
+    assert params == [["lore::1"], "lore"]
+    assert records[0].vector == [0.5, 0.25] and records[0].score is None
+
+
+def test_pg_wrapper_retries_dense_domains_one_by_one_when_the_shared_query_fails() -> None:
+    wrapper = PgVectorWrapper(store=AsyncPgVectorStore(pool=FakeAsyncPool(FakeAsyncConnection([])), table="t", dimension=2))
+    searched: list[str] = []
+
+    async def shared(*args, **kwargs):
+        raise RuntimeError("partition is gone")
+
+    async def single(domain, *args, **kwargs):
+        searched.append(domain)
+        if domain == "npc":
+            raise RuntimeError("partition is gone")
+        return [ChunkScore(chunk=Chunk(id=f"{domain}::1", domain=domain, text="moon"), score=0.4)]
+
+    wrapper._search_dense_domains = shared
+    wrapper._search_embedded = single
+
+    results = asyncio.run(wrapper.search_domains(domains=["lore", "npc", "scene"], query="moon", k=5))
+
+    assert sorted(searched) == ["lore", "npc", "scene"]
+    assert [r.chunk.id for r in results] == ["lore::1", "scene::1"]
+
+
+def test_pg_wrapper_mmr_fetches_vectors_of_keyword_only_hits() -> None:
+    class HybridStore:
+        def __init__(self) -> None:
+            self.fetched: list[tuple[list[str], str | None]] = []
+
+        async def query(self, vector, *, top_k, metadata_filter=None, with_vectors=True, **settings):
+            return [
+                VectorRecord(item_id="lore::a", vector=[1.0, 0.0], metadata={"content": "moon bridge"}, score=0.9),
+                VectorRecord(item_id="lore::c", vector=[0.0, 1.0], metadata={"content": "moon well"}, score=0.5),
+            ]
+
+        async def keyword_query(self, text, *, top_k, metadata_filter=None):
+            return [
+                VectorRecord(item_id="lore::dup", vector=[], metadata={"content": "moon bridge"}, score=2.0),
+                VectorRecord(item_id="lore::a", vector=[], metadata={"content": "moon bridge"}, score=1.0),
+            ]
+
+        async def fetch_vectors(self, item_ids, *, domain=None):
+            self.fetched.append((list(item_ids), domain))
+            return [VectorRecord(item_id="lore::dup", vector=[1.0, 0.0], metadata={"content": "moon bridge"})]
+
+    config = KnowledgeConfig.model_validate(
+        {
+            "knowledge": {
+                "lore": {
+                    "store": "pgvector",
+                    "embedding": {"provider": "openai", "model": "m", "dimensions": 1024},
+                    "retrieval": {"mode": "hybrid", "k_vector": 2, "k_keyword": 5, "fuse": "rrf"},
+                }
+            }
+        }
+    )
+    store = HybridStore()
+    wrapper = PgVectorWrapper(store=store, knowledge_config=config, mmr_lambda=0.5)
+
+    results = asyncio.run(wrapper.search_domains(domains=["lore"], query="moon bridge", k=2))
+
+    # The keyword-only duplicate of lore::a is no longer treated as maximally novel.
+    assert store.fetched == [(["lore::dup"], "lore")]
+    assert [r.chunk.id for r in results] == ["lore::a", "lore::c"]
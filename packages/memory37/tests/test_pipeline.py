@@ -0,0 +1,189 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from memory37.domain import KnowledgeItem
+from memory37.pipeline import IngestCheckpoint, StreamingIngestPipeline
+from memory37.stores.pgvector_store import InMemoryVectorStore
+from memory37.types import Chunk
+
+
+class CountingProvider:
+    def __init__(self) -> None:
+        self.batches: list[int] = []
+
+    def embed(self, texts, *, model=None):
+        self.batches.append(len(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class RecordingStore:
+    def __init__(self, fail_after: int | None = None) -> None:
+        self.items: dict[str, Chunk] = {}
+        self.calls = 0
+        self.fail_after = fail_after
+
+    async def upsert(self, *, domain, items):
+        if self.fail_after is not None and self.calls >= self.fail_after:
+            raise RuntimeError("database went away")
+        self.calls += 1
+        for item in items:
+            assert item.payload["embedding"] == [float(len(item.text)), 1.0]
+            self.items[item.id] = item
+
+
+def _source(count: int):
+    produced = []
+
+    def generate():
+        for idx in range(count):
+            produced.append(idx)
+            yield KnowledgeItem(item_id=f"lore::{idx}", domain="lore" if idx % 2 else "npc", content="x" * (idx + 1))
+
+    return generate(), produced
+
+
+def test_streaming_pipeline_batches_and_stores_every_item() -> None:
+    provider = CountingProvider()
+    store = RecordingStore()
+    seen = []
+    pipeline = StreamingIngestPipeline(store, provider, batch_size=4, on_progress=lambda p: seen.append(p.upserted))
+    source, _ = _source(10)
+
+    progress = asyncio.run(pipeline.run(source))
+
+    assert set(store.items) == {f"lore::{idx}" for idx in range(10)}
+    assert provider.batches == [4, 4, 2]
+    assert progress.items == 10 and progress.upserted == 10 and progress.batches == 3
+    assert seen[-1] == 10
+
+
+def test_streaming_pipeline_applies_backpressure_to_the_source() -> None:
+    started = asyncio.Event()
+
+    class SlowStore(RecordingStore):
+        async def upsert(self, *, domain, items):
+            started.set()
+            await asyncio.sleep(0.05)
+            await super().upsert(domain=domain, items=items)
+
+    source, produced = _source(200)
+    pipeline = StreamingIngestPipeline(SlowStore(), CountingProvider(), batch_size=2, queue_size=1)
+
+    async def scenario():
+        task = asyncio.ensure_future(pipeline.run(source))
+        await started.wait()
+        read = len(produced)
+        await task
+        return read
+
+    read_while_writing = asyncio.run(scenario())
+    # A handful of batches fit in the queues and workers; the rest of the source is not read ahead.
+    assert read_while_writing <= 2 * 6
+    assert len(produced) == 200
+
+
+def test_streaming_pipeline_resumes_from_checkpoint(tmp_path) -> None:
+    path = tmp_path / "ingest.json"
+    source, _ = _source(10)
+    pipeline = StreamingIngestPipeline(
+        RecordingStore(fail_after=4),  # two batches, each split into two domains
+        CountingProvider(),
+        batch_size=3,
+        embed_concurrency=1,
+        checkpoint=IngestCheckpoint.load(path, source="corpus"),
+    )
+    with pytest.raises(RuntimeError):
+        asyncio.run(pipeline.run(source))
+
+    checkpoint = IngestCheckpoint.load(path, source="corpus")
+    assert checkpoint.offset == 6 and checkpoint.chunks == 6
+
+    store = RecordingStore()
+    source, _ = _source(10)
+    progress = asyncio.run(StreamingIngestPipeline(store, CountingProvider(), batch_size=3, checkpoint=checkpoint).run(source))
+
+    assert set(store.items) == {f"lore::{idx}" for idx in range(6, 10)}
+    assert progress.skipped_items == 6
+    assert IngestCheckpoint.load(path).offset == 10
+    with pytest.raises(ValueError):
+        IngestCheckpoint.load(path, source="other corpus")
+
+
+def test_streaming_pipeline_splits_long_entries_without_cutting_items_across_checkpoints(tmp_path) -> None:
+    store = RecordingStore()
+    checkpoint = IngestCheckpoint.load(tmp_path / "ingest.json")
+    items = [Chunk(id="lore::long", domain="lore", text="y" * 25, payload={}, metadata={})]
+
+    asyncio.run(StreamingIngestPipeline(store, CountingProvider(), batch_size=2, max_chars=10, checkpoint=checkpoint).run(items))
+
+    assert sorted(store.items) == ["lore::long::part0", "lore::long::part1", "lore::long::part2"]
+    assert checkpoint.offset == 1 and checkpoint.chunks == 3
+
+
+def test_incremental_ingest_writes_only_changes_and_deletes_missing_items() -> None:
+    provider = CountingProvider()
+    store = InMemoryVectorStore(embedding_provider=provider)
+
+    def items(texts):
+        return [
+            KnowledgeItem(item_id=item_id, domain="lore", content=text, knowledge_version_id="kv_1")
+            for item_id, text in texts.items()
+        ]
+
+    def ingest(texts, **kwargs):
+        pipeline = StreamingIngestPipeline(store, provider, incremental=True, knowledge_version_id="kv_1", **kwargs)
+        return asyncio.run(pipeline.run(items(texts)))
+
+    first = ingest({"lore::a": "moon bridge", "lore::b": "sun gate", "lore::c": "old well"})
+    assert (first.new, first.changed, first.unchanged, first.deleted) == (3, 0, 0, 0)
+
+    embedded_before = sum(provider.batches)
+    plan = ingest({"lore::a": "moon bridge", "lore::b": "sun gate, rebuilt"}, dry_run=True)
+    assert (plan.new, plan.changed, plan.unchanged, plan.deleted) == (0, 1, 1, 1)
+    assert sum(provider.batches) == embedded_before
+    assert len(asyncio.run(store.content_hashes(knowledge_version_id="kv_1"))) == 3
+
+    second = ingest({"lore::a": "moon bridge", "lore::b": "sun gate, rebuilt"})
+    assert (second.changed, second.unchanged, second.deleted, second.upserted) == (1, 1, 1, 1)
+    assert sum(provider.batches) == embedded_before + 1
+    hashes = asyncio.run(store.content_hashes(knowledge_version_id="kv_1"))
+    assert set(hashes) == {("lore", "lore::a"), ("lore", "lore::b")}
+    results = asyncio.run(store.search(domain="lore", query="old well", k_vector=5))
+    assert "lore::c" not in {score.chunk.id for score in results}
+
+
+def test_incremental_ingest_requires_a_knowledge_version() -> None:
+    with pytest.raises(ValueError, match="knowledge_version_id"):
+        StreamingIngestPipeline(RecordingStore(), CountingProvider(), incremental=True)
+
+
+def test_incremental_ingest_deletes_only_within_its_source_and_domains_and_refreshes_ttl() -> None:
+    provider = CountingProvider()
+    store = InMemoryVectorStore(embedding_provider=provider)
+
+    def ingest(source_id, entries, expires_at=None):
+        items = [
+            KnowledgeItem(item_id=item_id, domain=domain, content=item_id, knowledge_version_id="kv_1", expires_at=expires_at)
+            for domain, item_id in entries
+        ]
+        pipeline = StreamingIngestPipeline(store, provider, incremental=True, knowledge_version_id="kv_1", source_id=source_id)
+        return asyncio.run(pipeline.run(items))
+
+    ingest("lore.yaml", [("lore", "lore::a"), ("lore", "lore::b"), ("npc", "npc::x")])
+    ingest("extra.yaml", [("lore", "lore::t")])
+
+    later = datetime(2099, 1, 1, tzinfo=timezone.utc)
+    rerun = ingest("lore.yaml", [("lore", "lore::a")], expires_at=later)
+
+    # lore::b is gone; npc::x (domain not read) and lore::t (another source) stay.
+    assert rerun.deleted == 1
+    remaining = asyncio.run(store.content_hashes(knowledge_version_id="kv_1"))
+    assert set(remaining) == {("lore", "lore::a"), ("npc", "npc::x"), ("lore", "lore::t")}
+
+    embedded = sum(provider.batches)
+    renewed = ingest("lore.yaml", [("lore", "lore::a")], expires_at=later + timedelta(days=30))
+    assert (renewed.unchanged, renewed.refreshed, renewed.upserted) == (1, 1, 0)
+    assert sum(provider.batches) == embedded
+    assert store._store.get_metadata("lore::a")["expires_at"] == (later + timedelta(days=30)).isoformat()
@@ -0,0 +1,87 @@
+import threading
+
+from memory37.domain import KnowledgeItem
+from memory37.rerankers import BudgetedRerankProvider, LocalRerankProvider, proximity_score
+
+
+def _items(*pairs):
+    return [KnowledgeItem(item_id=item_id, domain="lore", content=content) for item_id, content in pairs]
+
+
+class SlowReranker:
+    def __init__(self, release: threading.Event | None = None) -> None:
+        self.release = release
+        self.calls = 0
+
+    def rerank(self, query, items):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        return [(item, float(idx)) for idx, item in enumerate(reversed(items), 1)][::-1]
+
+
+def test_budgeted_rerank_caches_by_query_and_candidate_set() -> None:
+    upstream = SlowReranker()
+    reranker = BudgetedRerankProvider(upstream, budget_seconds=1.0)
+    items = _items(("a", "moon"), ("b", "sun"))
+
+    first = reranker.rerank("Moon  bridge", items)
+    second = reranker.rerank("moon bridge", list(reversed(items)))
+
+    assert [item.item_id for item, _ in first] == [item.item_id for item, _ in second]
+    assert upstream.calls == 1 and reranker.stats.cache_hits == 1
+
+
+def test_budgeted_rerank_falls_back_when_the_budget_is_exceeded() -> None:
+    release = threading.Event()
+    upstream = SlowReranker(release)
+    reranker = BudgetedRerankProvider(upstream, budget_seconds=0.05, fallback=LocalRerankProvider())
+    items = _items(("a", "the sun gate"), ("b", "the moon bridge over the gorge"))
+
+    ranked = reranker.rerank("moon bridge", items)
+
+    assert [item.item_id for item, _ in ranked] == ["b", "a"]
+    assert reranker.stats.timeouts == 1
+
+    release.set()
+    deadline = threading.Event()
+    while reranker.stats.late_results == 0 and not deadline.wait(0.01):
+        pass
+    reranker.rerank("moon bridge", items)
+    assert reranker.stats.cache_hits == 1 and upstream.calls == 1
+    reranker.close()
+
+
+def test_budgeted_rerank_keeps_hybrid_order_on_errors() -> None:
+    class Broken:
+        def rerank(self, query, items):
+            raise RuntimeError("upstream down")
+
+    reranker = BudgetedRerankProvider(Broken())
+    ranked = reranker.rerank("moon", _items(("a", "x"), ("b", "y")))
+
+    assert [item.item_id for item, _ in ranked] == ["a", "b"]
+    assert reranker.stats.errors == 1
+
+
+def test_local_rerank_prefers_close_terms_and_demotes_duplicates() -> None:
+    class BagOfWords:
+        vocabulary = ["moon", "bridge", "well", "old", "stone"]
+
+        def embed(self, texts, *, model=None):
+            return [[float(text.lower().count(word)) for word in self.vocabulary] for text in texts]
+
+    assert proximity_score(["moon", "bridge"], "the moon bridge".split()) > proximity_score(
+        ["moon", "bridge"], "moon over the old bridge".split()
+    )
+    items = _items(
+        ("far", "moon over the old stone bridge"),
+        ("near", "the moon bridge"),
+        ("near::copy", "the moon bridge"),
+        ("well", "the moon well"),
+    )
+    ranked = LocalRerankProvider(embedding_provider=BagOfWords(), mmr_lambda=0.3).rerank("moon bridge", items)
+
+    ids = [item.item_id for item, _ in ranked]
+    assert ids[0] == "near"
+    assert ids.index("near::copy") == 3
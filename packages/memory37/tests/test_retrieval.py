@@ -1,7 +1,12 @@
+import threading
 from math import sqrt
 
+import numpy as np
+import pytest
+
 from memory37.domain import KnowledgeItem
-from memory37.retrieval import HybridRetriever, RerankProvider
+from memory37.rerankers import BudgetedRerankProvider, LocalRerankProvider
+from memory37.retrieval import HybridRetriever, RerankProvider, mmr_select, parent_id, reciprocal_rank_fusion
 from memory37.vector_store import EmbeddingProvider, MemoryVectorStore, VectorRecord
 
 
@@ -70,6 +75,42 @@ def test_hybrid_retriever_with_rerank_provider_changes_order() -> None:
     assert ids[0] == "scene_a"  # due to stub reranker reversing order
 
 
+def test_hybrid_retriever_falls_back_when_rerank_exceeds_its_budget() -> None:
+    release = threading.Event()
+
+    class HangingReranker:
+        def rerank(self, query: str, items):
+            release.wait(5)
+            return [(item, 1.0) for item in reversed(items)]
+
+    items = [
+        KnowledgeItem(item_id="lore_far", domain="lore", content="moon over the old stone bridge"),
+        KnowledgeItem(item_id="lore_near", domain="lore", content="the moon bridge"),
+        KnowledgeItem(item_id="lore_well", domain="lore", content="the moon well"),
+    ]
+    reranker = BudgetedRerankProvider(HangingReranker(), budget_seconds=0.05, fallback=LocalRerankProvider())
+
+    def retriever(rerank_provider=None) -> HybridRetriever:
+        built = HybridRetriever(
+            vector_store=MemoryVectorStore(),
+            embedding_provider=KeywordEmbeddingProvider(["moon", "bridge"]),
+            embedding_model="test",
+            rerank_provider=rerank_provider,
+        )
+        built.index(items)
+        return built
+
+    hybrid = retriever().query("moon bridge", top_k=3)
+    results = retriever(reranker).query("moon bridge", top_k=3)
+    release.set()
+    reranker.close()
+
+    expected = LocalRerankProvider().rerank("moon bridge", [item for item, _ in hybrid])
+    assert [item.item_id for item, _ in results] == [item.item_id for item, _ in expected]
+    assert results[0][0].item_id == "lore_near"
+    assert reranker.stats.timeouts == 1
+
+
 def test_hybrid_retriever_without_documents_uses_metadata() -> None:
     provider: EmbeddingProvider = KeywordEmbeddingProvider(["moon"])
     store = MemoryVectorStore()
@@ -89,3 +130,22 @@ def test_hybrid_retriever_without_documents_uses_metadata() -> None:
     item, score = results[0]
     assert item.item_id == "scene::demo"
     assert score > 0.0
+
+
+def test_reciprocal_rank_fusion_rewards_agreement() -> None:
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+
+    assert fused["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused["c"] == pytest.approx(1 / 63 + 1 / 61)
+    assert max(fused, key=fused.get) == "a"
+
+
+def test_mmr_select_trades_relevance_for_novelty_and_caps_parents() -> None:
+    vectors = np.array([[1.0, 0.0], [0.99, 0.05], [0.0, 1.0]], dtype=np.float32)
+
+    assert mmr_select([1.0, 0.95, 0.6], vectors, k=3, mmr_lambda=1.0) == [0, 1, 2]
+    assert mmr_select([1.0, 0.95, 0.6], vectors, k=3, mmr_lambda=0.5) == [0, 2, 1]
+    parents = [parent_id(item_id) for item_id in ("lore::a::part0", "lore::a::part1", "lore::b")]
+    assert parents == ["lore::a", "lore::a", "lore::b"]
+    assert mmr_select([1.0, 0.95, 0.6], vectors, k=3, mmr_lambda=1.0, parents=parents, max_per_parent=1) == [0, 2]
+    assert mmr_select([], vectors[:0], k=3) == []
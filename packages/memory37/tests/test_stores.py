@@ -0,0 +1,338 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from memory37.config import KnowledgeConfig
+from memory37.stores.executor import StoreExecutor
+from memory37.stores.pgvector_store import InMemoryVectorStore
+from memory37.types import Chunk, SearchRequest
+from memory37.vector_store import MemoryVectorStore
+
+
+class DriftingEmbeddingProvider:
+    """Maps "obsidian" texts to their own axis and everything else (incl. queries) to the moon axis."""
+
+    def embed(self, texts, *, model=None):
+        return [[0.0, 1.0] if text.startswith("Obsidian") else [1.0, 0.0] for text in texts]
+
+
+def _chunks() -> list[Chunk]:
+    texts = {
+        "lore::bridge": "The moon bridge is guarded by a ronin",
+        "lore::tower": "A moon tower stands over the valley",
+        "lore::lake": "Moon reflections on the silent lake",
+        "lore::token": "Obsidian token grants passage across the border",
+    }
+    return [Chunk(id=item_id, domain="lore", text=text, metadata={"kind": "lore"}) for item_id, text in texts.items()]
+
+
+def _hybrid_config(**retrieval) -> KnowledgeConfig:
+    settings = {"mode": "hybrid", "k_vector": 2, "k_keyword": 5, "fuse": "rrf", **retrieval}
+    return KnowledgeConfig.model_validate(
+        {
+            "knowledge": {
+                "lore": {
+                    "store": "pgvector",
+                    "embedding": {"provider": "openai", "model": "m", "dimensions": 1024},
+                    "retrieval": {key: value for key, value in settings.items() if value is not None},
+                }
+            }
+        }
+    )
+
+
+def test_vector_mode_misses_keyword_hit_outside_dense_top_k() -> None:
+    store = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider())
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+
+    results = asyncio.run(store.search(domain="lore", query="ancient obsidian", k_vector=2))
+
+    assert "lore::token" not in {r.chunk.id for r in results}
+
+
+def test_hybrid_mode_from_knowledge_config_fuses_keyword_candidates() -> None:
+    store = InMemoryVectorStore(
+        embedding_provider=DriftingEmbeddingProvider(),
+        knowledge_config=_hybrid_config(),
+    )
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+
+    results = asyncio.run(store.search(domain="lore", query="ancient obsidian", k_vector=2))
+
+    ids = [r.chunk.id for r in results]
+    assert ids == ["lore::bridge", "lore::token"]
+    assert results[0].score >= results[1].score
+
+
+def test_hybrid_domain_without_fuse_blends_scores_linearly() -> None:
+    store = InMemoryVectorStore(
+        embedding_provider=DriftingEmbeddingProvider(),
+        knowledge_config=_hybrid_config(fuse=None),
+    )
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+
+    results = asyncio.run(store.search(domain="lore", query="ancient obsidian", k_vector=2))
+
+    # alpha · cosine: the keyword-only hit scores 0.3 and loses to both dense hits.
+    assert [r.chunk.id for r in results] == ["lore::bridge", "lore::tower"]
+    assert results[0].score == pytest.approx(0.7)
+
+
+def test_domain_k_vector_widens_the_dense_branch() -> None:
+    plain = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider())
+    configured = InMemoryVectorStore(
+        embedding_provider=DriftingEmbeddingProvider(),
+        knowledge_config=_hybrid_config(mode="vector", k_vector=4, k_keyword=None, fuse=None),
+    )
+    for store in (plain, configured):
+        asyncio.run(store.upsert(domain="lore", items=_chunks()))
+
+    # All moon texts tie on cosine; only a wider dense branch lets BM25 pick the lake.
+    assert [r.chunk.id for r in asyncio.run(plain.search(domain="lore", query="moon lake", k_vector=1))] == ["lore::bridge"]
+    assert [r.chunk.id for r in asyncio.run(configured.search(domain="lore", query="moon lake", k_vector=1))] == ["lore::lake"]
+
+
+def test_hybrid_keyword_branch_respects_filters() -> None:
+    store = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider())
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+
+    results = asyncio.run(
+        store.search(domain="lore", query="obsidian token", k_vector=3, k_keyword=5, filters={"kind": "other"})
+    )
+
+    assert results == []
+
+
+class CountingEmbeddingProvider:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def embed(self, texts, *, model=None):
+        self.calls += 1
+        return [[1.0 if "moon" in text.lower() else 0.0, 1.0] for text in texts]
+
+
+def test_query_embedding_provider_is_used_only_for_queries() -> None:
+    documents, queries = CountingEmbeddingProvider(), CountingEmbeddingProvider()
+    store = InMemoryVectorStore(embedding_provider=documents, query_embedding_provider=queries)
+
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+    asyncio.run(store.search(domain="lore", query="moon", k_vector=2))
+    asyncio.run(store.search_many([SearchRequest(domain="lore", query="moon lake", k=1)]))
+
+    assert (documents.calls, queries.calls) == (1, 2)
+
+
+def test_search_domains_embeds_once_and_applies_quotas() -> None:
+    provider = CountingEmbeddingProvider()
+    store = InMemoryVectorStore(embedding_provider=provider)
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+    asyncio.run(
+        store.upsert(
+            domain="scene",
+            items=[Chunk(id=f"scene::{idx}", domain="scene", text=f"moon scene {idx}") for idx in range(3)],
+        )
+    )
+    provider.calls = 0
+
+    results = asyncio.run(store.search_domains(domains=["scene", "lore", "npc"], query="moon", k=4, per_domain_k=2))
+
+    assert provider.calls == 1
+    assert len(results) == 4
+    domains = [r.chunk.domain for r in results]
+    assert domains.count("scene") == 2 and domains.count("lore") == 2
+    assert all(a.score >= b.score for a, b in zip(results, results[1:]))
+
+
+def test_search_domains_normalises_scores_per_domain_before_merging() -> None:
+    store = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider(), knowledge_config=_hybrid_config())
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+    npcs = [Chunk(id=f"npc::{name}", domain="npc", text=f"Moon {name}") for name in ("priest", "smith", "ronin")]
+    asyncio.run(store.upsert(domain="npc", items=npcs))
+
+    # lore is hybrid (RRF scores around 1/60), npc is dense (cosine around 1): raw scores would bury lore.
+    results = asyncio.run(store.search_domains(domains=["lore", "npc"], query="moon", k=2))
+
+    assert {r.chunk.domain for r in results} == {"lore", "npc"}
+    assert all(0.0 <= r.score <= 1.0 for r in results)
+
+
+def test_search_domains_isolates_a_failing_domain() -> None:
+    store = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider())
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+    search_embedded = store._search_embedded
+
+    def flaky(domain, *args, **kwargs):
+        if domain == "npc":
+            raise RuntimeError("npc index is broken")
+        return search_embedded(domain, *args, **kwargs)
+
+    store._search_embedded = flaky
+
+    results = asyncio.run(store.search_domains(domains=["npc", "lore"], query="moon", k=2))
+
+    assert [r.chunk.domain for r in results] == ["lore", "lore"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.search(domain="npc", query="moon", k_vector=2))
+
+
+def test_search_domains_diversifies_split_parts_with_mmr() -> None:
+    class AxisEmbeddingProvider:
+        def embed(self, texts, *, model=None):
+            return [[1.0 if "bridge" in text else 0.0, 1.0 if "well" in text else 0.0, 0.1] for text in texts]
+
+    store = InMemoryVectorStore(embedding_provider=AxisEmbeddingProvider(), mmr_lambda=0.5, max_per_parent=1)
+    parts = [Chunk(id=f"lore::bridge::part{idx}", domain="lore", text=f"moon bridge part {idx}") for idx in range(3)]
+    asyncio.run(store.upsert(domain="lore", items=[*parts, Chunk(id="lore::well", domain="lore", text="moon well")]))
+
+    results = asyncio.run(store.search_domains(domains=["lore"], query="moon bridge", k=2))
+
+    assert [r.chunk.id for r in results][1] == "lore::well"
+    assert sum(r.chunk.id.startswith("lore::bridge") for r in results) == 1
+
+
+def test_search_many_matches_single_searches_with_one_embedding_call() -> None:
+    provider = CountingEmbeddingProvider()
+    store = InMemoryVectorStore(embedding_provider=provider, knowledge_config=_hybrid_config())
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+    asyncio.run(store.upsert(domain="scene", items=[Chunk(id="scene::1", domain="scene", text="moon scene")]))
+    requests = [
+        SearchRequest(domain="lore", query="obsidian token", k=2),
+        SearchRequest(domain="scene", query="moon", k=1),
+        SearchRequest(domain="lore", query="moon", k=3, filters={"kind": "lore"}),
+        SearchRequest(domain="npc", query="moon", k=3),
+    ]
+    provider.calls = 0
+
+    batched = asyncio.run(store.search_many(requests))
+
+    assert provider.calls == 1
+    single = [
+        asyncio.run(store.search(domain=r.domain, query=r.query, k_vector=r.k, filters=r.filters)) for r in requests
+    ]
+    assert [[s.chunk.id for s in results] for results in batched] == [[s.chunk.id for s in results] for results in single]
+    assert batched[3] == []
+
+
+def test_store_executor_limits_concurrency_and_records_queue_time() -> None:
+    executor = StoreExecutor(max_workers=4, max_concurrency=1)
+    running: list[int] = []
+    peak: list[int] = []
+
+    def work(value: int) -> int:
+        running.append(value)
+        peak.append(len(running))
+        time.sleep(0.02)
+        running.remove(value)
+        return value * 2
+
+    async def scenario() -> list[int]:
+        return await asyncio.gather(*(executor.run(work, value) for value in range(3)))
+
+    assert asyncio.run(scenario()) == [0, 2, 4]
+    assert max(peak) == 1
+    stats = executor.stats
+    assert stats.submitted == stats.completed == 3 and stats.in_flight == 0
+    assert stats.queue_seconds_max >= 0.02  # the last call waited for two others
+    assert stats.mean_run_seconds >= 0.02
+    executor.shutdown()
+
+
+def test_in_memory_store_scores_off_the_event_loop() -> None:
+    loop_threads: set[int] = set()
+
+    class RecordingProvider(DriftingEmbeddingProvider):
+        def embed(self, texts, *, model=None):
+            loop_threads.add(threading.get_ident())
+            return super().embed(texts, model=model)
+
+    executor = StoreExecutor(max_workers=2)
+    store = InMemoryVectorStore(embedding_provider=RecordingProvider(), executor=executor)
+
+    async def scenario():
+        await store.upsert(domain="lore", items=_chunks())
+        return await store.search_domains(domains=["lore"], query="moon", k=2), threading.get_ident()
+
+    results, main_thread = asyncio.run(scenario())
+
+    assert len(results) == 2
+    assert main_thread not in loop_threads
+    assert executor.stats.completed >= 4  # two embeddings, upsert and search
+
+
+def test_snapshot_round_trip_maps_vectors_and_restores_lexical_index(tmp_path) -> None:
+    config = _hybrid_config()
+    store = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider(), knowledge_config=config)
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+    expected = asyncio.run(store.search(domain="lore", query="obsidian passage", k_vector=2))
+    store.save_snapshot(tmp_path / "snapshot", fingerprint="v1")
+
+    restored = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider(), knowledge_config=config)
+    assert not restored.load_snapshot(tmp_path / "missing")
+    assert not restored.load_snapshot(tmp_path / "snapshot", fingerprint="v2")
+    assert restored.load_snapshot(tmp_path / "snapshot", fingerprint="v1")
+
+    assert isinstance(restored._store._matrix, np.memmap)
+    results = asyncio.run(restored.search(domain="lore", query="obsidian passage", k_vector=2))
+    assert [(r.chunk.id, round(r.score, 6)) for r in results] == [(r.chunk.id, round(r.score, 6)) for r in expected]
+
+    asyncio.run(restored.upsert(domain="lore", items=[Chunk(id="lore::gate", domain="lore", text="Obsidian gate", metadata={})]))
+    assert "lore::gate" in {r.chunk.id for r in asyncio.run(restored.search(domain="lore", query="obsidian gate", k_vector=5))}
+    assert InMemoryVectorStore(vector_precision="int8").load_snapshot(tmp_path / "snapshot") is False
+
+
+def test_snapshot_with_mismatched_arrays_is_rejected(tmp_path) -> None:
+    store = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider())
+    asyncio.run(store.upsert(domain="lore", items=_chunks()))
+    store.save_snapshot(tmp_path / "snapshot")
+    vectors = np.load(tmp_path / "snapshot" / "vectors.npy")
+    np.save(tmp_path / "snapshot" / "vectors.npy", vectors[:-1])
+
+    assert InMemoryVectorStore().load_snapshot(tmp_path / "snapshot") is False
+
+
+def test_snapshot_load_rereads_when_another_worker_swaps_it(tmp_path, monkeypatch) -> None:
+    writer = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider())
+    asyncio.run(writer.upsert(domain="lore", items=_chunks()[:2]))
+    writer.save_snapshot(tmp_path / "snapshot")
+    original_load = MemoryVectorStore.load
+    loads = []
+
+    def load_then_swap(directory, *, mmap=True):
+        store = original_load(directory, mmap=mmap)
+        loads.append(len(store))
+        if len(loads) == 1:
+            asyncio.run(writer.upsert(domain="lore", items=_chunks()[2:]))
+            writer.save_snapshot(tmp_path / "snapshot")
+        return store
+
+    monkeypatch.setattr(MemoryVectorStore, "load", staticmethod(load_then_swap))
+    reader = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider())
+
+    assert reader.load_snapshot(tmp_path / "snapshot", mmap=False)
+    assert loads == [2, 4]
+    assert len(reader._store) == 4
+
+
+def test_cleanup_expired_drops_vectors_and_lexical_postings() -> None:
+    store = InMemoryVectorStore(embedding_provider=DriftingEmbeddingProvider())
+    chunks = _chunks()
+    chunks[0].metadata["expires_at"] = "2000-01-01T00:00:00+00:00"
+    chunks[1].metadata["expires_at"] = "2999-01-01T00:00:00+00:00"
+
+    async def scenario():
+        await store.upsert(domain="lore", items=chunks)
+        before = await store.search(domain="lore", query="moon bridge ronin", k_vector=4)
+        removed = await store.acleanup_expired()
+        return before, removed
+
+    before, removed = asyncio.run(scenario())
+
+    assert "lore::bridge" not in {r.chunk.id for r in before}
+    assert removed == 1
+    assert not store._lexical.contains("lore", "lore::bridge")
+    assert store._lexical.contains("lore", "lore::tower")
+    assert store.cleanup_expired() == 0
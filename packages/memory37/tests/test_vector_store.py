@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+
+from memory37.vector_store import MemoryVectorStore, VectorRecord, quantization_report
+
+
+def _records(count: int, dimension: int = 8, seed: int = 7) -> list[VectorRecord]:
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dimension))
+    return [
+        VectorRecord(item_id=f"kn_{idx}", vector=vector.tolist(), metadata={"domain": "lore" if idx % 2 else "scene"})
+        for idx, vector in enumerate(vectors)
+    ]
+
+
+def _brute_force(records: list[VectorRecord], query: list[float], top_k: int) -> list[str]:
+    q = np.asarray(query)
+    scored = []
+    for record in records:
+        v = np.asarray(record.vector)
+        scored.append((float(q @ v / (np.linalg.norm(q) * np.linalg.norm(v))), record.item_id))
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [item_id for _, item_id in scored[:top_k]]
+
+
+def test_memory_store_matches_brute_force_cosine() -> None:
+    records = _records(300)
+    store = MemoryVectorStore()
+    store.upsert(records)
+
+    query = records[42].vector
+    results = store.query(query, top_k=5)
+
+    assert [record.item_id for record in results] == _brute_force(records, query, 5)
+    assert results[0].item_id == "kn_42"
+    assert results[0].score == pytest.approx(1.0, abs=1e-5)
+    assert all(a.score >= b.score for a, b in zip(results, results[1:]))
+
+
+def test_memory_store_query_batch_returns_results_per_query() -> None:
+    records = _records(100)
+    store = MemoryVectorStore()
+    store.upsert(records)
+
+    batch = store.query_batch([records[3].vector, records[8].vector], top_k=3, metadata_filter={"domain": "lore"})
+
+    assert len(batch) == 2
+    assert batch[0][0].item_id == "kn_3"
+    assert batch[1][0].item_id != "kn_8"  # kn_8 is in the "scene" domain
+    assert all(record.metadata["domain"] == "lore" for results in batch for record in results)
+
+
+def test_memory_store_upsert_replaces_existing_rows_in_place() -> None:
+    store = MemoryVectorStore()
+    store.upsert([VectorRecord(item_id="a", vector=[1.0, 0.0], metadata={"v": "1"})])
+    store.upsert(_records(100, dimension=2))
+    store.upsert([VectorRecord(item_id="a", vector=[0.0, 1.0], metadata={"v": "2"})])
+
+    assert len(store) == 101
+    top = store.query([0.0, 1.0], top_k=1, metadata_filter={"v": "2"})
+    assert top[0].item_id == "a"
+    assert top[0].vector == [0.0, 1.0]
+
+
+def test_memory_store_rejects_dimension_mismatch() -> None:
+    store = MemoryVectorStore()
+    store.upsert([VectorRecord(item_id="a", vector=[1.0, 0.0], metadata={})])
+
+    with pytest.raises(ValueError):
+        store.upsert([VectorRecord(item_id="b", vector=[1.0, 0.0, 0.0], metadata={})])
+    with pytest.raises(ValueError):
+        store.query([1.0, 0.0, 0.0], top_k=1)
+
+
+def test_memory_store_zero_query_scores_zero() -> None:
+    store = MemoryVectorStore()
+    store.upsert(_records(4, dimension=3))
+
+    results = store.query([0.0, 0.0, 0.0], top_k=10)
+
+    assert [record.item_id for record in results] == ["kn_0", "kn_1", "kn_2", "kn_3"]
+    assert all(record.score == 0.0 for record in results)
+
+
+def test_memory_store_ties_at_the_top_k_boundary_keep_insertion_order() -> None:
+    store = MemoryVectorStore()
+    store.upsert(_records(500, dimension=3))
+
+    results = store.query([0.0, 0.0, 0.0], top_k=3)
+
+    assert [record.item_id for record in results] == ["kn_0", "kn_1", "kn_2"]
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_memory_store_compact_precision_keeps_ranking_and_shrinks_rows(precision) -> None:
+    records = _records(300, dimension=64)
+    exact = MemoryVectorStore()
+    exact.upsert(records)
+    compact = MemoryVectorStore(precision=precision)
+    compact.upsert(records)
+
+    query = records[10].vector
+    results = compact.query(query, top_k=10)
+
+    assert results[0].item_id == "kn_10"
+    assert len({r.item_id for r in results} & set(_brute_force(records, query, 10))) >= 9
+    assert compact.vector_bytes < exact.vector_bytes
+    np.testing.assert_allclose(results[0].vector, records[10].vector, atol=0.05)
+
+
+def test_memory_store_rescores_int8_shortlist_with_higher_precision() -> None:
+    records = _records(300, dimension=64)
+    store = MemoryVectorStore(precision="int8", rescore_precision="float32", rescore_factor=5)
+    store.upsert(records)
+    store.delete(["kn_0", "kn_1"])
+
+    query = records[42].vector
+    results = store.query_batch([query], top_k=5, metadata_filter={"domain": "scene"})[0]
+
+    expected = _brute_force([r for r in records[2:] if r.metadata["domain"] == "scene"], query, 5)
+    assert [record.item_id for record in results] == expected
+    assert results[0].score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_quantization_report_lists_memory_and_recall_per_mode() -> None:
+    vectors = np.random.default_rng(3).normal(size=(500, 32))
+
+    reports = quantization_report(vectors, vectors[:20], top_k=5)
+
+    by_mode = {(r.precision, r.rescore_precision): r for r in reports}
+    assert by_mode[("float32", None)].recall == 1.0
+    assert by_mode[("float32", None)].bytes_per_vector == 32 * 4 + 4
+    assert by_mode[("int8", None)].bytes_per_vector == 32 + 8
+    assert by_mode[("int8", "float16")].recall >= by_mode[("int8", None)].recall
+
+
+def test_memory_store_hides_expired_records_and_sweeps_them_from_the_heap() -> None:
+    now = [1_000.0]
+    store = MemoryVectorStore(clock=lambda: now[0])
+    records = _records(6)
+    records[1].metadata["expires_at"] = "1970-01-01T00:20:00+00:00"  # 1200
+    records[2].metadata["expires_at"] = "1970-01-01T00:25:00"  # naive, UTC: 1500
+    records[3].metadata["expires_at"] = "1970-01-01T00:20:00Z"
+    store.upsert(records)
+    # Re-upserting with a later deadline leaves a stale heap entry that must not expire kn_3.
+    store.upsert([VectorRecord(item_id="kn_3", vector=records[3].vector, metadata={"domain": "lore", "expires_at": "1970-01-01T01:00:00Z"})])
+
+    assert len(store.query(records[1].vector, top_k=6)) == 6
+    now[0] = 1_300.0
+    assert "kn_1" not in {r.item_id for r in store.query(records[1].vector, top_k=6)}
+    assert store.get_metadata("kn_1") is None and len(store) == 6
+
+    assert store.remove_expired() == [("lore", "kn_1")]
+    assert store.remove_expired(now=2_000.0) == [("scene", "kn_2")]
+    assert len(store) == 4 and store.get_metadata("kn_3") is not None
+
+    remaining = [r for r in records if r.item_id not in {"kn_1", "kn_2"}]
+    query = records[4].vector
+    assert [r.item_id for r in store.query(query, top_k=4)] == _brute_force(remaining, query, 4)
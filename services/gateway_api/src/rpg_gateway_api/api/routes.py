@@ -5,13 +5,13 @@ from __future__ import annotations
 from datetime import UTC, datetime
 from typing import Any, List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from ..rate_limit import rate_limit
 
 from ..auth.telegram import InitDataValidationError, InitDataValidator
 from ..auth.dependencies import get_current_player, get_data_store
 from ..data import DataStoreProtocol, NotFoundError, SceneStateRecord, CampaignRunRecord
-from ..config import HealthPayload, Settings, get_settings
+from ..config import HealthPayload, ReadinessPayload, Settings, get_settings
 from ..jwt_utils import issue_access_token
 from ..models import (
     AccessTokenResponse,
@@ -149,6 +149,27 @@ def read_health(settings: Settings = Depends(get_settings)) -> HealthPayload:
     return HealthPayload(status="ok", api_version=settings.api_version)
 
 
+@router.get("/ready", response_model=ReadinessPayload, tags=["system"])
+def read_ready(request: Request, response: Response) -> ReadinessPayload:
+    """Готовность к трафику: 503, пока база знаний прогревается."""
+
+    service = getattr(request.app.state, "knowledge_service", None)
+    if service is None:
+        return ReadinessPayload(status="ready", knowledge="disabled")
+    progress = service.warmup_progress
+    warming = progress.state == "warming"
+    if warming:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadinessPayload(
+        status="warming" if warming else "ready",
+        knowledge=progress.state,
+        knowledge_items_total=progress.items_total,
+        knowledge_items_loaded=progress.items_loaded,
+        knowledge_from_snapshot=progress.from_snapshot,
+        knowledge_warmup_seconds=round(progress.seconds, 3),
+    )
+
+
 @router.get("/v1/knowledge/search", tags=["knowledge"])
 async def search_knowledge(
     request: Request,
@@ -159,6 +180,12 @@ async def search_knowledge(
     """Поиск в базе знаний Memory37."""
 
     service = getattr(request.app.state, "knowledge_service", None)
+    if service and service.state == "warming":
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Knowledge search is warming up",
+            headers={"Retry-After": "5"},
+        )
     if not service or not service.available:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Knowledge search unavailable")
 
@@ -7,6 +7,7 @@ import logging
 import logging.config
 from pathlib import Path
 
+import asyncio
 import json
 import logging
 import logging.config
@@ -55,7 +56,9 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
-    app.state.knowledge_service = KnowledgeService(settings)
+    # Ingest базы знаний идёт в фоне после старта (см. _warm_up_knowledge), чтобы медленный
+    # прогрев не задерживал запуск и не проваливал liveness-пробы.
+    app.state.knowledge_service = KnowledgeService(settings, defer_load=settings.knowledge_background_warmup)
     app.state.generation_service = GenerationService(settings)
     app.state.graph_service = init_graph_service(settings)
 
@@ -123,7 +126,12 @@ def create_app() -> FastAPI:
             "message": message,
             "traceId": trace_id,
         }
-        return Response(content=json.dumps(payload, ensure_ascii=False), status_code=exc.status_code, media_type="application/json")
+        return Response(
+            content=json.dumps(payload, ensure_ascii=False),
+            status_code=exc.status_code,
+            media_type="application/json",
+            headers=getattr(exc, "headers", None),
+        )
 
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):  # type: ignore[override]
@@ -195,11 +203,34 @@ def create_app() -> FastAPI:
         if bus:
             await bus.stop()
 
+    @app.on_event("startup")
+    async def _warm_up_knowledge() -> None:
+        if settings.knowledge_background_warmup:
+            app.state.knowledge_warmup = asyncio.create_task(app.state.knowledge_service.warm_up())
+
+    @app.on_event("startup")
+    async def _start_knowledge_ttl_sweep() -> None:
+        if settings.knowledge_ttl_sweep_seconds > 0:
+            app.state.knowledge_ttl_sweep = asyncio.create_task(
+                app.state.knowledge_service.run_expiry_sweeps(settings.knowledge_ttl_sweep_seconds)
+            )
+
+    @app.on_event("shutdown")
+    async def _close_knowledge_store() -> None:
+        app.state.knowledge_service.stop_warm_up()
+        for name in ("knowledge_warmup", "knowledge_ttl_sweep"):
+            task = getattr(app.state, name, None)
+            if task is not None and not task.done():
+                task.cancel()
+                # Прогрев завершается только когда его поток остановится между пачками.
+                await asyncio.gather(task, return_exceptions=True)
+        await app.state.knowledge_service.aclose()
+
     @app.get("/config", tags=["system"])
     def read_config_version(request: Request) -> dict[str, str]:
         """Возвращает текущую версию API и состояние подсистем."""
 
-        knowledge_state = "enabled" if app.state.knowledge_service.available else "disabled"
+        knowledge_state = app.state.knowledge_service.state
         generation_service = getattr(app.state, "generation_service", None)
         generation_state = "enabled" if generation_service and generation_service.available else "disabled"
         trace_id = getattr(request.state, "trace_id", "")
@@ -34,6 +34,11 @@ class Settings(BaseSettings):
         description="OpenAI embedding model override",
         alias="KNOWLEDGE_OPENAI_EMBEDDING_MODEL",
     )
+    knowledge_local_embedder: Literal["token-frequency", "hashing"] = Field(
+        "token-frequency",
+        description="Embedder without OpenAI: token-frequency or hashing (feature hashing into knowledge_vector_dimension)",
+        alias="KNOWLEDGE_LOCAL_EMBEDDER",
+    )
     openai_api_key: str | None = Field(
         None,
         description="OpenAI API key",
@@ -86,6 +91,135 @@ class Settings(BaseSettings):
         description="Размерность вектора",
         alias="KNOWLEDGE_VECTOR_DIMENSION",
     )
+    knowledge_embedding_cache_size: int = Field(
+        10_000,
+        ge=0,
+        description="LRU size of the query-embedding cache (0 disables caching)",
+        alias="KNOWLEDGE_EMBEDDING_CACHE_SIZE",
+    )
+    knowledge_embedding_cache_ttl_seconds: float = Field(
+        3600.0,
+        gt=0,
+        description="TTL of cached query embeddings, seconds",
+        alias="KNOWLEDGE_EMBEDDING_CACHE_TTL_SECONDS",
+    )
+    knowledge_embedding_cache_redis_url: str | None = Field(
+        None,
+        description="Redis DSN for an embedding cache tier shared between workers (optional)",
+        alias="KNOWLEDGE_EMBEDDING_CACHE_REDIS_URL",
+    )
+    knowledge_config_path: str | None = Field(
+        None,
+        description="Path to Memory37 knowledge config YAML (per-domain retrieval: hybrid/RRF)",
+        alias="KNOWLEDGE_CONFIG_PATH",
+    )
+    knowledge_pool_min_size: int = Field(
+        1,
+        ge=0,
+        description="Минимальный размер пула соединений pgvector",
+        alias="KNOWLEDGE_POOL_MIN_SIZE",
+    )
+    knowledge_pool_max_size: int = Field(
+        10,
+        ge=1,
+        description="Максимальный размер пула соединений pgvector",
+        alias="KNOWLEDGE_POOL_MAX_SIZE",
+    )
+    knowledge_prepared_statements: bool = Field(
+        True,
+        description="Server-side prepared statements для поиска (отключить за pgbouncer в transaction mode)",
+        alias="KNOWLEDGE_PREPARED_STATEMENTS",
+    )
+    knowledge_hnsw_ef_search: int | None = Field(
+        None,
+        ge=1,
+        description="hnsw.ef_search для поиска (SET LOCAL; выше — точнее и медленнее)",
+        alias="KNOWLEDGE_HNSW_EF_SEARCH",
+    )
+    knowledge_ivfflat_probes: int | None = Field(
+        None,
+        ge=1,
+        description="ivfflat.probes для поиска (SET LOCAL)",
+        alias="KNOWLEDGE_IVFFLAT_PROBES",
+    )
+    knowledge_vector_partitions: str | None = Field(
+        None,
+        description="Домены с собственной LIST-партицией таблицы векторов, через запятую (нужна memory37 migrate-schema)",
+        alias="KNOWLEDGE_VECTOR_PARTITIONS",
+    )
+    knowledge_executor_workers: int = Field(
+        4,
+        ge=1,
+        description="Потоки пула для блокирующей работы хранилища знаний (скоринг, синхронный psycopg, эмбеддинги)",
+        alias="KNOWLEDGE_EXECUTOR_WORKERS",
+    )
+    knowledge_max_concurrency: int | None = Field(
+        None,
+        ge=1,
+        description="Сколько задач хранилища знаний выполняется одновременно (по умолчанию = числу потоков)",
+        alias="KNOWLEDGE_MAX_CONCURRENCY",
+    )
+    knowledge_vector_precision: Literal["float32", "float16", "int8"] = Field(
+        "float32",
+        description="Формат векторов in-memory store: float32, float16 или int8 с масштабом на вектор",
+        alias="KNOWLEDGE_VECTOR_PRECISION",
+    )
+    knowledge_rescore_precision: Literal["float32", "float16", "int8"] | None = Field(
+        None,
+        description="Второй формат векторов для пересчёта лучших кандидатов компактного поиска (например float16 при int8)",
+        alias="KNOWLEDGE_RESCORE_PRECISION",
+    )
+    knowledge_snapshot_path: str | None = Field(
+        None,
+        description="Каталог снапшота in-memory индекса знаний: при совпадении отпечатка источника старт без ingest",
+        alias="KNOWLEDGE_SNAPSHOT_PATH",
+    )
+    knowledge_mmr_lambda: float | None = Field(
+        None,
+        ge=0.0,
+        le=1.0,
+        description="MMR-отбор результатов поиска знаний: 1 — только релевантность, меньше — больше разнообразия",
+        alias="KNOWLEDGE_MMR_LAMBDA",
+    )
+    knowledge_mmr_max_per_parent: int | None = Field(
+        None,
+        ge=1,
+        description="Максимум частей (::partN) одной записи знаний в выдаче поиска",
+        alias="KNOWLEDGE_MMR_MAX_PER_PARENT",
+    )
+    knowledge_rerank: Literal["off", "local", "openai"] = Field(
+        "off",
+        description="Rerank выдачи поиска знаний: off, local (без сети) или openai (LLM с бюджетом задержки)",
+        alias="KNOWLEDGE_RERANK",
+    )
+    knowledge_rerank_budget_seconds: float = Field(
+        1.0,
+        gt=0.0,
+        description="Бюджет задержки LLM-rerank, секунды; по его истечении выдачу ранжирует fallback",
+        alias="KNOWLEDGE_RERANK_BUDGET_SECONDS",
+    )
+    knowledge_rerank_fallback: Literal["local", "hybrid"] = Field(
+        "local",
+        description="Порядок при таймауте или ошибке LLM-rerank: local — локальный rerank, hybrid — гибридный",
+        alias="KNOWLEDGE_RERANK_FALLBACK",
+    )
+    knowledge_rerank_candidates: int = Field(
+        20,
+        ge=1,
+        description="Сколько кандидатов гибридного поиска передаётся в rerank",
+        alias="KNOWLEDGE_RERANK_CANDIDATES",
+    )
+    knowledge_background_warmup: bool = Field(
+        True,
+        description="Загружать базу знаний в фоне после старта приложения (готовность — GET /ready)",
+        alias="KNOWLEDGE_BACKGROUND_WARMUP",
+    )
+    knowledge_ttl_sweep_seconds: float = Field(
+        300.0,
+        ge=0.0,
+        description="Период фоновой очистки записей знаний с истёкшим expires_at, секунды (0 — выключена)",
+        alias="KNOWLEDGE_TTL_SWEEP_SECONDS",
+    )
     neo4j_uri: str | None = Field(
         None,
         description="Neo4j URI для GraphRAG (bolt://...)",
@@ -164,6 +298,17 @@ class HealthPayload(BaseModel):
     api_version: str
 
 
+class ReadinessPayload(BaseModel):
+    """Ответ readiness-check: готовность к трафику и прогресс прогрева базы знаний."""
+
+    status: Literal["ready", "warming"]
+    knowledge: Literal["warming", "enabled", "disabled"]
+    knowledge_items_total: int = 0
+    knowledge_items_loaded: int = 0
+    knowledge_from_snapshot: bool = False
+    knowledge_warmup_seconds: float = 0.0
+
+
 @lru_cache
 def get_settings() -> Settings:
     """Загружает настройки с кешированием.
@@ -3,27 +3,73 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import logging
 import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Literal
 
 try:  # pragma: no cover - optional dependency
     import psycopg  # type: ignore
 except Exception:  # pragma: no cover - degrade gracefully if not installed
     psycopg = None  # type: ignore[assignment]
 
+try:  # pragma: no cover - optional dependency
+    from prometheus_client import Gauge
+except Exception:  # pragma: no cover - метрики прогрева доступны только через /ready
+    Gauge = None  # type: ignore[assignment]
+
 from pydantic import BaseModel, Field
 
-from memory37 import KnowledgeVersion, KnowledgeVersionRegistry
-from memory37.embedding import OpenAIEmbeddingProvider, TokenFrequencyEmbeddingProvider
+from memory37 import KnowledgeConfig, KnowledgeVersion, KnowledgeVersionRegistry, load_knowledge_config
+from memory37.domain import KnowledgeItem
+from memory37.embedding import HashingEmbeddingProvider, OpenAIEmbeddingProvider, TokenFrequencyEmbeddingProvider
+from memory37.embedding_cache import CachedEmbeddingProvider, EmbeddingCacheStats
+from memory37.rerankers import BudgetedRerankProvider, LocalRerankProvider, OpenAIChatRerankProvider
+from memory37.retrieval import RerankProvider
+from memory37.stores.executor import ExecutorStats, StoreExecutor
 from memory37.stores.pgvector_store import InMemoryVectorStore, PgVectorWrapper
+from memory37.vector_store import AsyncConnectionPool, AsyncPgVectorStore
 from memory37.ingest import load_knowledge_items_from_yaml
-from memory37.types import Chunk, ChunkScore
+from memory37.types import Chunk
 
 from .config import Settings
 
 logger = logging.getLogger(__name__)
 
+_WARMUP_GAUGE = (
+    Gauge("gateway_knowledge_warmup", "Прогрев базы знаний: items_total, items_loaded, seconds, ready", ["field"])
+    if Gauge is not None
+    else None
+)
+
+KnowledgeState = Literal["warming", "enabled", "disabled"]
+
+# Элементов на один upsert прогрева; между пачками проверяется флаг остановки.
+_WARMUP_BATCH = 256
+
+
+@dataclass
+class KnowledgeWarmupProgress:
+    """Прогресс прогрева базы знаний (``/ready``, ``/config`` и метрики)."""
+
+    state: KnowledgeState = "warming"
+    items_total: int = 0
+    items_loaded: int = 0
+    from_snapshot: bool = False
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    @property
+    def seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
 
 class KnowledgeSearchResult(BaseModel):
     item_id: str
@@ -35,32 +81,69 @@ class KnowledgeSearchResult(BaseModel):
 class KnowledgeService:
     """Обёртка над Memory37 core для gateway."""
 
-    def __init__(self, settings: Settings) -> None:
+    def __init__(self, settings: Settings, *, defer_load: bool = False) -> None:
         self._settings = settings
         self._available = False
+        self._progress = KnowledgeWarmupProgress()
         self._version_registry = KnowledgeVersionRegistry()
         self._version_id: str | None = None
         self._store: PgVectorWrapper | InMemoryVectorStore | None = None
         self._domains = ["scene", "npc", "lore", "srd", "art"]
         self._alpha = 0.7
-        self._load()
+        self._embedding_cache: CachedEmbeddingProvider | None = None
+        self._reranker: RerankProvider | None = None
+        # Поток прогрева не отменяется task.cancel(); он сам проверяет флаг между пачками.
+        self._stop_warmup = threading.Event()
+        # Блокирующая работа стора (скоринг, синхронный psycopg, эмбеддинги) не занимает event loop.
+        self._executor = StoreExecutor(
+            max_workers=settings.knowledge_executor_workers,
+            max_concurrency=settings.knowledge_max_concurrency,
+            name="knowledge-store",
+        )
+        # С defer_load ingest выполняет warm_up() в фоне, а приложение стартует сразу.
+        if not defer_load:
+            self._warm_up_blocking()
+        elif not self._configured():
+            self._progress.state = "disabled"
 
     @property
     def available(self) -> bool:
         return self._available
 
+    @property
+    def state(self) -> KnowledgeState:
+        return self._progress.state
+
+    @property
+    def warmup_progress(self) -> KnowledgeWarmupProgress:
+        return self._progress
+
+    @property
+    def embedding_cache_stats(self) -> EmbeddingCacheStats | None:
+        return self._embedding_cache.stats if self._embedding_cache else None
+
+    @property
+    def executor_stats(self) -> ExecutorStats:
+        return self._executor.stats
+
     async def search(self, query: str, *, top_k: int = 5) -> list[KnowledgeSearchResult]:
         if not self._available or not self._store:
             raise RuntimeError("Knowledge search is not configured")
         version_filter = {"knowledge_version_id": self._version_id} if self._version_id else {}
-        merged: list[ChunkScore] = []
-        for domain in self._domains:
+        # С rerank гибридный поиск отдаёт более широкий пул кандидатов, rerank выбирает из него top_k.
+        k = max(top_k, self._settings.knowledge_rerank_candidates) if self._reranker else top_k
+        try:
+            merged = await self._store.search_domains(domains=self._domains, query=query, k=k, filters=version_filter)
+        except Exception as exc:
+            logger.warning("Knowledge search failed: %s", exc)
+            return []
+        if self._reranker is not None and merged:
+            # Rerank ждёт LLM до бюджета; слоты executor стора ему не нужны, а его
+            # queue time не должна списываться на стор.
             try:
-                results = await self._store.search(domain=domain, query=query, k_vector=top_k, filters=version_filter)
-                merged.extend(results)
-            except Exception:
-                continue
-        merged.sort(key=lambda r: r.score, reverse=True)
+                merged = await asyncio.to_thread(self._rerank, query, merged)
+            except Exception as exc:
+                logger.warning("Knowledge rerank failed (%s); keeping hybrid order", exc)
         merged = merged[:top_k]
         return [
             KnowledgeSearchResult(
@@ -72,10 +155,99 @@ class KnowledgeService:
             for item in merged
         ]
 
-    def _load(self) -> None:
+    async def warm_up(self) -> None:
+        """Фоновый прогрев: загрузка и ingest идут в отдельном потоке, event loop отвечает на запросы.
+
+        Ошибка прогрева не роняет приложение: база знаний остаётся выключенной.
+        """
+
+        if self._progress.state != "warming":
+            return
+        worker = asyncio.ensure_future(asyncio.to_thread(self._warm_up_blocking))
+        try:
+            await asyncio.shield(worker)
+        except asyncio.CancelledError:
+            # Отмена (shutdown): просим поток остановиться и ждём, пока он дойдёт до границы пачки.
+            self._stop_warmup.set()
+            await asyncio.gather(worker, return_exceptions=True)
+            raise
+        except Exception:
+            logger.exception("Knowledge warm-up failed; knowledge search disabled")
+
+    def stop_warm_up(self) -> None:
+        """Просит фоновый прогрев остановиться после текущей пачки ingest."""
+
+        self._stop_warmup.set()
+
+    async def run_expiry_sweeps(self, interval: float) -> None:
+        """Фоновая очистка записей с истёкшим TTL (эпизоды с ``ttl_days``) каждые ``interval`` секунд."""
+
+        while True:
+            await asyncio.sleep(interval)
+            await self.sweep_expired()
+
+    async def sweep_expired(self) -> int:
+        """Одна очистка просроченных записей; 0, если база знаний не готова или стор не знает TTL.
+
+        In-memory стор снимает просроченные записи с кучи сроков за O(expired log n),
+        pgvector выполняет ``DELETE ... WHERE expires_at < NOW()``.
+        """
+
+        if not self._available or self._store is None:
+            return 0
+        cleanup = getattr(self._store, "acleanup_expired", None)
+        if cleanup is None:
+            return 0
+        try:
+            removed = await cleanup() or 0
+        except Exception as exc:
+            logger.warning("Knowledge TTL sweep failed: %s", exc)
+            return 0
+        if removed:
+            logger.info("Knowledge TTL sweep removed %d expired records", removed)
+        return removed
+
+    def _warm_up_blocking(self) -> None:
+        progress = self._progress
+        progress.state = "warming"
+        progress.started_at = time.monotonic()
+        progress.finished_at = None
+        try:
+            self._load()
+        except Exception as exc:
+            self._available = False
+            progress.error = str(exc)
+            raise
+        finally:
+            progress.finished_at = time.monotonic()
+            progress.state = "enabled" if self._available else "disabled"
+            self._publish_progress()
+            logger.info(
+                "Knowledge warm-up finished in %.2fs: state=%s items=%d/%d snapshot=%s",
+                progress.seconds,
+                progress.state,
+                progress.items_loaded,
+                progress.items_total,
+                progress.from_snapshot,
+            )
+
+    def _publish_progress(self) -> None:
+        if _WARMUP_GAUGE is None:
+            return
+        progress = self._progress
+        _WARMUP_GAUGE.labels("items_total").set(progress.items_total)
+        _WARMUP_GAUGE.labels("items_loaded").set(progress.items_loaded)
+        _WARMUP_GAUGE.labels("seconds").set(progress.seconds)
+        _WARMUP_GAUGE.labels("ready").set(1 if progress.state != "warming" else 0)
+
+    @staticmethod
+    def _configured() -> bool:
         env_path_present = "KNOWLEDGE_SOURCE_PATH" in os.environ
         env_db_present = "KNOWLEDGE_DATABASE_URL" in os.environ and os.environ.get("KNOWLEDGE_DATABASE_URL")
-        if not env_path_present and not env_db_present:
+        return bool(env_path_present or env_db_present)
+
+    def _load(self) -> None:
+        if not self._configured():
             logger.info("KNOWLEDGE_SOURCE_PATH не задан в окружении, knowledge search отключён")
             self._available = False
             return
@@ -94,9 +266,15 @@ class KnowledgeService:
         self._version_id = self._version_registry.get_version_id(alias=version_alias)
 
         provider = self._create_embedding_provider()
+        # Кеш только для эмбеддингов запросов: векторы документов при ingest его не вытесняют.
+        query_provider = self._with_embedding_cache(provider)
+        knowledge_config = self._load_knowledge_config()
+        self._reranker = self._create_reranker()
         # Если задан source-path (локальный ingest) и не используется OpenAI, предпочитаем in-memory, чтобы избежать несовпадения размерности эмбеддингов с pgvector.
         using_local_ingest = bool(self._settings.knowledge_source_path)
-        prefer_memory = using_local_ingest and not self._settings.knowledge_use_openai
+        # Hashing-эмбеддер пишет векторы размерности таблицы, ему pgvector не мешает.
+        local_dimension_matches = self._settings.knowledge_local_embedder == "hashing"
+        prefer_memory = using_local_ingest and not self._settings.knowledge_use_openai and not local_dimension_matches
 
         if self._settings.knowledge_database_url and psycopg is not None and not prefer_memory:
             self._store = PgVectorWrapper(
@@ -104,8 +282,17 @@ class KnowledgeService:
                 table=self._settings.knowledge_vector_table,
                 dimension=self._settings.knowledge_vector_dimension,
                 embedding_provider=provider,
+                query_embedding_provider=query_provider,
                 embedding_model=self._settings.knowledge_openai_embedding_model,
                 alpha=self._alpha,
+                knowledge_config=knowledge_config,
+                store=self._create_async_pg_store(),
+                ef_search=self._settings.knowledge_hnsw_ef_search,
+                probes=self._settings.knowledge_ivfflat_probes,
+                partitions=self._vector_partitions(),
+                executor=self._executor,
+                mmr_lambda=self._settings.knowledge_mmr_lambda,
+                max_per_parent=self._settings.knowledge_mmr_max_per_parent,
             )
         else:
             if self._settings.knowledge_database_url and psycopg is None:
@@ -114,63 +301,245 @@ class KnowledgeService:
                 logger.info("KNOWLEDGE_SOURCE_PATH задан, используем in-memory store для локального ingest.")
             self._store = InMemoryVectorStore(
                 embedding_provider=provider,
+                query_embedding_provider=query_provider,
                 embedding_model=self._settings.knowledge_openai_embedding_model,
                 alpha=self._alpha,
+                knowledge_config=knowledge_config,
+                executor=self._executor,
+                vector_precision=self._settings.knowledge_vector_precision,
+                rescore_precision=self._settings.knowledge_rescore_precision,
+                mmr_lambda=self._settings.knowledge_mmr_lambda,
+                max_per_parent=self._settings.knowledge_mmr_max_per_parent,
             )
 
+        snapshot_path = self._settings.knowledge_snapshot_path if isinstance(self._store, InMemoryVectorStore) else None
+        fingerprint = self._snapshot_fingerprint(provider) if snapshot_path else None
+        if snapshot_path and fingerprint and self._store.load_snapshot(snapshot_path, fingerprint=fingerprint):
+            logger.info("Knowledge index loaded from snapshot %s", snapshot_path)
+            self._progress.from_snapshot = True
+            asyncio.run(self._prepare_store([]))
+            self._available = True
+            return
+
         items = self._load_items()
+        self._progress.items_total = len(items)
         if not items and isinstance(self._store, InMemoryVectorStore):
             logger.info("Knowledge source not provided; knowledge search disabled")
             self._available = False
             return
 
-        if items:
-            asyncio.run(self._ingest_items(items))
-
-        # Очистка TTL если поддерживается
-        cleanup = getattr(self._store, "cleanup_expired", None)
-        if callable(cleanup):
+        # Ingest и очистка TTL выполняются во временном event loop; пул соединений
+        # закрываем там же, рабочий loop откроет новый при первом запросе.
+        asyncio.run(self._prepare_store(items))
+        if self._stop_warmup.is_set():
+            logger.info("Knowledge warm-up stopped after %d/%d items", self._progress.items_loaded, len(items))
+            self._available = False
+            return
+        if snapshot_path and fingerprint:
             try:
-                cleanup()
-            except Exception:  # pragma: no cover
-                pass
+                self._store.save_snapshot(snapshot_path, fingerprint=fingerprint)
+            except OSError as exc:  # pragma: no cover - зависит от файловой системы
+                logger.warning("Knowledge snapshot %s не сохранён: %s", snapshot_path, exc)
 
         self._available = True
 
-    def _load_items(self) -> list:
+    def _source_path(self) -> Path | None:
         path_value = self._settings.knowledge_source_path
         if not path_value:
-            return []
+            return None
         source_path = Path(path_value)
         if not source_path.is_absolute():
             source_path = Path.cwd() / source_path
+        return source_path
+
+    def _load_items(self) -> list:
+        source_path = self._source_path()
+        if source_path is None:
+            return []
         if not source_path.exists():
             logger.warning("Knowledge source path %s not found", source_path)
             return []
         return load_knowledge_items_from_yaml(source_path, knowledge_version_id=self._version_id)
 
+    def _snapshot_fingerprint(self, provider) -> str | None:
+        """Отпечаток снапшота: содержимое источника, модель эмбеддингов, формат векторов и версия знаний."""
+
+        source_path = self._source_path()
+        if source_path is None or not source_path.is_file():
+            return None
+        digest = hashlib.sha256(source_path.read_bytes())
+        model = getattr(provider, "model_name", None) or self._settings.knowledge_openai_embedding_model
+        for part in (
+            self._settings.knowledge_use_openai,
+            model,
+            self._settings.knowledge_local_embedder,
+            self._settings.knowledge_vector_dimension,
+            self._settings.knowledge_vector_precision,
+            self._settings.knowledge_rescore_precision,
+            self._version_id,
+        ):
+            digest.update(b"\0" + str(part).encode("utf-8"))
+        return digest.hexdigest()
+
+    async def aclose(self) -> None:
+        """Освобождает соединения хранилища знаний и пул rerank (shutdown приложения)."""
+
+        await self._close_store()
+        close_reranker = getattr(self._reranker, "close", None)
+        if close_reranker is not None:
+            close_reranker()
+
+    async def _close_store(self) -> None:
+        close = getattr(self._store, "aclose", None)
+        if close is not None:
+            await close()
+
+    async def _prepare_store(self, items: list) -> None:
+        try:
+            if items:
+                await self._ingest_items(items)
+            # Очистка TTL если поддерживается
+            cleanup = getattr(self._store, "acleanup_expired", None)
+            if cleanup is not None:
+                try:
+                    await cleanup()
+                except Exception:  # pragma: no cover
+                    pass
+            else:
+                cleanup = getattr(self._store, "cleanup_expired", None)
+                if callable(cleanup):
+                    try:
+                        cleanup()
+                    except Exception:  # pragma: no cover
+                        pass
+        finally:
+            # Соединения привязаны к loop прогрева; пул rerank живёт до shutdown приложения.
+            await self._close_store()
+
+    def _create_async_pg_store(self) -> AsyncPgVectorStore | None:
+        if AsyncConnectionPool is None:
+            logger.info("psycopg_pool не установлен; pgvector store работает без пула соединений.")
+            return None
+        return AsyncPgVectorStore(
+            self._settings.knowledge_database_url,
+            table=self._settings.knowledge_vector_table,
+            dimension=self._settings.knowledge_vector_dimension,
+            min_size=self._settings.knowledge_pool_min_size,
+            max_size=self._settings.knowledge_pool_max_size,
+            prepare=self._settings.knowledge_prepared_statements,
+            partitions=self._vector_partitions(),
+        )
+
+    def _vector_partitions(self) -> list[str] | None:
+        raw = getattr(self._settings, "knowledge_vector_partitions", None)
+        if not raw:
+            return None
+        return [domain.strip() for domain in raw.split(",") if domain.strip()]
+
     async def _ingest_items(self, items: Iterable) -> None:
         if not self._store:
             return
-        chunk_batches: dict[str, list[Chunk]] = {domain: [] for domain in self._domains}
+        items_by_domain: dict[str, list] = {domain: [] for domain in self._domains}
         for item in items:
-            meta = dict(item.metadata)
-            if item.knowledge_version_id:
-                meta["knowledge_version_id"] = item.knowledge_version_id
-            if item.expires_at:
-                meta["expires_at"] = item.expires_at.isoformat()
-            chunk = Chunk(id=item.item_id, domain=item.domain, text=item.content, payload={}, metadata=meta)
-            chunk_batches.setdefault(item.domain, []).append(chunk)
-        for domain, chunks in chunk_batches.items():
-            if not chunks:
-                continue
-            await self._store.upsert(domain=domain, items=chunks)
+            items_by_domain.setdefault(item.domain, []).append(item)
+        for domain, domain_items in items_by_domain.items():
+            for start in range(0, len(domain_items), _WARMUP_BATCH):
+                if self._stop_warmup.is_set():
+                    return
+                batch = domain_items[start : start + _WARMUP_BATCH]
+                await self._store.upsert(domain=domain, items=[self._to_chunk(item) for item in batch])
+                # items_total считает элементы источника, поэтому и здесь элементы, а не чанки.
+                self._progress.items_loaded += len(batch)
+                self._publish_progress()
+
+    @staticmethod
+    def _to_chunk(item) -> Chunk:
+        meta = dict(item.metadata)
+        if item.knowledge_version_id:
+            meta["knowledge_version_id"] = item.knowledge_version_id
+        if item.expires_at:
+            meta["expires_at"] = item.expires_at.isoformat()
+        return Chunk(id=item.item_id, domain=item.domain, text=item.content, payload={}, metadata=meta)
+
+    def _load_knowledge_config(self) -> KnowledgeConfig | None:
+        path_value = self._settings.knowledge_config_path
+        if not path_value:
+            return None
+        try:
+            return load_knowledge_config(path_value)
+        except Exception as exc:
+            logger.warning("Knowledge config %s not loaded (%s); using vector retrieval", path_value, exc)
+            return None
+
+    def _with_embedding_cache(self, provider):
+        if self._settings.knowledge_embedding_cache_size <= 0:
+            return provider
+        redis_client = None
+        if self._settings.knowledge_embedding_cache_redis_url:
+            try:
+                import redis
+
+                redis_client = redis.Redis.from_url(self._settings.knowledge_embedding_cache_redis_url)
+            except Exception as exc:  # pragma: no cover - зависит от окружения
+                logger.warning("Embedding cache: redis недоступен (%s), используем только локальный кеш", exc)
+        self._embedding_cache = CachedEmbeddingProvider(
+            provider,
+            max_entries=self._settings.knowledge_embedding_cache_size,
+            ttl_seconds=self._settings.knowledge_embedding_cache_ttl_seconds,
+            default_model=self._settings.knowledge_openai_embedding_model,
+            redis_client=redis_client,
+        )
+        return self._embedding_cache
+
+    def _create_reranker(self) -> RerankProvider | None:
+        mode = self._settings.knowledge_rerank
+        if mode == "off":
+            return None
+        local = LocalRerankProvider()
+        if mode == "local":
+            return local
+        fallback = local if self._settings.knowledge_rerank_fallback == "local" else None
+        try:
+            llm = OpenAIChatRerankProvider(
+                api_key=self._settings.openai_api_key,
+                model=self._settings.knowledge_openai_rerank_model,
+                timeout=self._settings.openai_timeout_seconds,
+            )
+        except Exception as exc:
+            logger.warning("OpenAI rerank недоступен (%s); используем fallback", exc)
+            return fallback
+        # LLM не дольше бюджета: по таймауту или ошибке порядок задаёт fallback,
+        # опоздавший ответ всё равно попадёт в кеш.
+        return BudgetedRerankProvider(
+            llm, budget_seconds=self._settings.knowledge_rerank_budget_seconds, fallback=fallback
+        )
+
+    def _rerank(self, query: str, merged: list) -> list:
+        by_id = {item.chunk.id: item for item in merged}
+        items = [
+            KnowledgeItem(
+                item_id=item.chunk.id,
+                domain=item.chunk.domain,
+                content=item.chunk.text,
+                metadata={k: str(v) for k, v in item.chunk.metadata.items()},
+            )
+            for item in merged
+        ]
+        return [
+            by_id[item.item_id].model_copy(update={"score": score})
+            for item, score in self._reranker.rerank(query, items)
+        ]
 
     def _create_embedding_provider(self):
         if self._settings.knowledge_use_openai:
             try:
                 return OpenAIEmbeddingProvider(model=self._settings.knowledge_openai_embedding_model)
             except Exception:  # pragma: no cover - fallback
-                return TokenFrequencyEmbeddingProvider()
+                return self._create_local_embedding_provider()
+        return self._create_local_embedding_provider()
+
+    def _create_local_embedding_provider(self):
+        if getattr(self._settings, "knowledge_local_embedder", "token-frequency") == "hashing":
+            return HashingEmbeddingProvider(dimension=self._settings.knowledge_vector_dimension)
         return TokenFrequencyEmbeddingProvider()
 
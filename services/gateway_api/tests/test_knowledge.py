@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import threading
+import time
 from pathlib import Path
 
 import pytest
 from fastapi.testclient import TestClient
+from memory37.stores.pgvector_store import InMemoryVectorStore
+from memory37.types import Chunk
 
+from rpg_gateway_api import knowledge as knowledge_module
 from rpg_gateway_api.app import create_app
 from rpg_gateway_api.config import get_settings
+from rpg_gateway_api.knowledge import KnowledgeService
 
 
 @pytest.fixture(autouse=True)
@@ -26,12 +33,24 @@ def sample_knowledge_path() -> Path:
     return file_path
 
 
+def _wait_ready(client: TestClient, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/ready")
+        if response.status_code == 200 or time.monotonic() > deadline:
+            return response.json()
+        time.sleep(0.05)
+
+
 def test_knowledge_search_returns_results(monkeypatch: pytest.MonkeyPatch, sample_knowledge_path: Path) -> None:
     monkeypatch.setenv("KNOWLEDGE_SOURCE_PATH", str(sample_knowledge_path))
     app = create_app()
-    client = TestClient(app)
+    with TestClient(app) as client:
+        ready = _wait_ready(client)
+        response = client.get("/v1/knowledge/search", params={"q": "moon", "top_k": 2})
 
-    response = client.get("/v1/knowledge/search", params={"q": "moon", "top_k": 2})
+    assert ready["status"] == "ready" and ready["knowledge"] == "enabled"
+    assert ready["knowledge_items_loaded"] == ready["knowledge_items_total"] > 0
 
     assert response.status_code == 200
     data = response.json()
@@ -49,3 +68,105 @@ def test_knowledge_search_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
     response = client.get("/v1/knowledge/search", params={"q": "moon"})
 
     assert response.status_code == 503
+
+
+def test_knowledge_warming_degrades_search_and_readiness(monkeypatch: pytest.MonkeyPatch, sample_knowledge_path: Path) -> None:
+    monkeypatch.setenv("KNOWLEDGE_SOURCE_PATH", str(sample_knowledge_path))
+    app = create_app()
+    # Без lifespan прогрев не запускается: сервис остаётся в состоянии warming.
+    client = TestClient(app)
+
+    ready = client.get("/ready")
+    search = client.get("/v1/knowledge/search", params={"q": "moon"})
+    config = client.get("/config")
+
+    assert ready.status_code == 503 and ready.json()["status"] == "warming"
+    assert search.status_code == 503 and search.headers["Retry-After"] == "5"
+    assert config.json()["knowledge"] == "warming"
+
+
+def test_knowledge_ttl_sweep_removes_expired_records(monkeypatch: pytest.MonkeyPatch, sample_knowledge_path: Path) -> None:
+    monkeypatch.setenv("KNOWLEDGE_SOURCE_PATH", str(sample_knowledge_path))
+    monkeypatch.setenv("KNOWLEDGE_BACKGROUND_WARMUP", "false")
+    service = create_app().state.knowledge_service
+    expired = Chunk(
+        id="scene::old_episode",
+        domain="scene",
+        text="A forgotten moon festival",
+        metadata={"expires_at": "2000-01-01T00:00:00+00:00"},
+    )
+    asyncio.run(service._store.upsert(domain="scene", items=[expired]))
+
+    results = asyncio.run(service.search("forgotten moon festival", top_k=5))
+
+    assert "scene::old_episode" not in {item.item_id for item in results}
+    assert asyncio.run(service.sweep_expired()) == 1
+    assert asyncio.run(service.sweep_expired()) == 0
+
+
+def test_cancelled_warm_up_stops_its_thread_between_batches(monkeypatch: pytest.MonkeyPatch, sample_knowledge_path: Path) -> None:
+    monkeypatch.setenv("KNOWLEDGE_SOURCE_PATH", str(sample_knowledge_path))
+    monkeypatch.setattr(knowledge_module, "_WARMUP_BATCH", 1)
+    entered, release = threading.Event(), threading.Event()
+    original_upsert = InMemoryVectorStore.upsert
+
+    async def blocking_upsert(self, *, domain, items):
+        entered.set()
+        release.wait(5)
+        await original_upsert(self, domain=domain, items=items)
+
+    monkeypatch.setattr(InMemoryVectorStore, "upsert", blocking_upsert)
+    service = KnowledgeService(get_settings(), defer_load=True)
+
+    async def scenario() -> None:
+        task = asyncio.create_task(service.warm_up())
+        await asyncio.to_thread(entered.wait, 5)
+        task.cancel()
+        while not service._stop_warmup.is_set():
+            await asyncio.sleep(0.01)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+
+    # The thread finished the batch in flight, then stopped before the next one.
+    assert service.warmup_progress.items_loaded == 1
+    assert service.warmup_progress.items_total > 1
+    assert service.state == "disabled" and not service.available
+
+
+def test_openai_rerank_over_budget_falls_back_to_local_order(monkeypatch: pytest.MonkeyPatch, sample_knowledge_path: Path) -> None:
+    monkeypatch.setenv("KNOWLEDGE_SOURCE_PATH", str(sample_knowledge_path))
+    monkeypatch.setenv("KNOWLEDGE_RERANK", "openai")
+    monkeypatch.setenv("KNOWLEDGE_RERANK_BUDGET_SECONDS", "0.05")
+    release = threading.Event()
+
+    class HangingRerank:
+        def __init__(self, **kwargs) -> None:
+            pass
+
+        def rerank(self, query, items):
+            release.wait(5)
+            return [(item, 1.0) for item in items]
+
+    monkeypatch.setattr(knowledge_module, "OpenAIChatRerankProvider", HangingRerank)
+    service = KnowledgeService(get_settings())
+    submitted = []
+    store_run = service._executor.run
+
+    async def recording_run(fn, *args, **kwargs):
+        submitted.append(getattr(fn, "__name__", repr(fn)))
+        return await store_run(fn, *args, **kwargs)
+
+    monkeypatch.setattr(service._executor, "run", recording_run)
+    try:
+        results = asyncio.run(service.search("moon", top_k=2))
+    finally:
+        release.set()
+        asyncio.run(service.aclose())
+
+    assert 1 <= len(results) <= 2
+    assert service._reranker.stats.timeouts == 1
+    # The rerank wait does not hold a slot of the store executor.
+    assert "_rerank" not in submitted
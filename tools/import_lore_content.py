@@ -7,7 +7,7 @@ import argparse
 import json
 import os
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 try:
     import psycopg  # type: ignore
@@ -15,6 +15,8 @@ except Exception:  # pragma: no cover - опционально для pgvector
     psycopg = None  # type: ignore[assignment]
 
 from memory37.embedding import OpenAIEmbeddingProvider, TokenFrequencyEmbeddingProvider
+from memory37.embedding_cache import with_embedding_cache
+from memory37.pipeline import IngestCheckpoint, StreamingIngestPipeline
 from memory37.stores.pgvector_store import InMemoryVectorStore, PgVectorWrapper
 from memory37.types import Chunk
 from memory37.versioning import KnowledgeVersion, KnowledgeVersionRegistry
@@ -61,16 +63,26 @@ def _embedding_provider(use_openai: bool, model: str | None):
     return TokenFrequencyEmbeddingProvider()
 
 
-def _build_store(dsn: str | None, provider, embedding_model: str | None):
+def _build_store(dsn: str | None, provider, embedding_model: str | None, bulk_batch_size: int | None = None):
     if dsn and psycopg is not None:
-        return PgVectorWrapper(lambda: psycopg.connect(dsn), embedding_provider=provider, embedding_model=embedding_model)
+        return PgVectorWrapper(
+            lambda: psycopg.connect(dsn),
+            embedding_provider=provider,
+            embedding_model=embedding_model,
+            bulk_batch_size=bulk_batch_size,
+        )
     return InMemoryVectorStore(embedding_provider=provider, embedding_model=embedding_model)
 
 
 def collect_chunks(content_root: Path, version_id: str) -> list[Chunk]:
-    chunks: list[Chunk] = []
+    return list(iter_chunks(content_root, version_id))
+
+
+def iter_chunks(content_root: Path, version_id: str) -> Iterator[Chunk]:
+    """Чанки по одному файлу за раз в стабильном порядке (нужен для --checkpoint)."""
+
     # Lore
-    for path in content_root.glob("lore/**/*.json"):
+    for path in sorted(content_root.glob("lore/**/*.json")):
         data = _load_json(path)
         lore_id = data.get("id") or path.stem
         body = data.get("body") or {}
@@ -81,10 +93,10 @@ def collect_chunks(content_root: Path, version_id: str) -> list[Chunk]:
             "lore_kind": path.parts[-2] if len(path.parts) >= 2 else "",
             "knowledge_version_id": version_id,
         }
-        chunks.append(Chunk(id=f"lore::{lore_id}", domain="lore", text=text, metadata=meta, payload={}))
+        yield Chunk(id=f"lore::{lore_id}", domain="lore", text=text, metadata=meta, payload={})
 
     # NPC
-    for path in content_root.glob("npc/**/*.json"):
+    for path in sorted(content_root.glob("npc/**/*.json")):
         data = _load_json(path)
         npc_id = data.get("npcId") or path.stem
         summary = data.get("description", "")
@@ -97,10 +109,10 @@ def collect_chunks(content_root: Path, version_id: str) -> list[Chunk]:
             "lore_refs": ",".join(data.get("lore_refs", [])),
             "knowledge_version_id": version_id,
         }
-        chunks.append(Chunk(id=f"npc::{npc_id}", domain="npc", text=text, metadata=meta, payload={}))
+        yield Chunk(id=f"npc::{npc_id}", domain="npc", text=text, metadata=meta, payload={})
 
     # Quests
-    for path in content_root.glob("quests/*.json"):
+    for path in sorted(content_root.glob("quests/*.json")):
         data = _load_json(path)
         qid = data.get("questId") or path.stem
         stages = data.get("stages", [])
@@ -112,10 +124,10 @@ def collect_chunks(content_root: Path, version_id: str) -> list[Chunk]:
             "lore_ref": data.get("lore_ref", ""),
             "knowledge_version_id": version_id,
         }
-        chunks.append(Chunk(id=f"quest::{qid}", domain="quest", text=text, metadata=meta, payload={}))
+        yield Chunk(id=f"quest::{qid}", domain="quest", text=text, metadata=meta, payload={})
 
     # Scenes
-    for path in content_root.glob("scenes/**/*.json"):
+    for path in sorted(content_root.glob("scenes/**/*.json")):
         data = _load_json(path)
         scene_id = data.get("sceneId") or path.stem
         segments = data.get("text", {}).get("segments", [])
@@ -126,10 +138,9 @@ def collect_chunks(content_root: Path, version_id: str) -> list[Chunk]:
             "tone": data.get("tone", ""),
             "knowledge_version_id": version_id,
         }
-        chunks.append(Chunk(id=f"scene::{scene_id}", domain="scene", text=text, metadata=meta, payload={}))
+        yield Chunk(id=f"scene::{scene_id}", domain="scene", text=text, metadata=meta, payload={})
 
     # Items/artcards можно добавить при необходимости
-    return chunks
 
 
 def collect_graph_facts(content_root: Path, version_id: str) -> list[dict]:
@@ -236,30 +247,76 @@ def main() -> None:
     parser.add_argument("--neo4j-database", default=os.environ.get("NEO4J_DATABASE"))
     parser.add_argument("--use-openai", action="store_true")
     parser.add_argument("--openai-embedding-model", default=os.environ.get("OPENAI_EMBEDDING_MODEL"))
+    parser.add_argument(
+        "--embedding-cache",
+        type=Path,
+        default=os.environ.get("MEMORY37_EMBEDDING_CACHE"),
+        help="SQLite-файл кеша эмбеддингов: неизменившиеся тексты не отправляются в провайдер",
+    )
+    parser.add_argument(
+        "--bulk-batch-size",
+        type=int,
+        default=1000,
+        help="Размер батча COPY-загрузки в pgvector (0 — построчный INSERT)",
+    )
+    parser.add_argument("--batch-size", type=int, default=256, help="Чанков в микро-батче эмбеддинга/записи")
+    parser.add_argument("--embed-concurrency", type=int, default=2, help="Одновременных батчей эмбеддинга")
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=0,
+        help="Делить тексты по границам предложений на части такого размера в токенах (0 — не делить)",
+    )
+    parser.add_argument("--chunk-overlap", type=int, default=64, help="Токенов перекрытия между соседними частями")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="JSON-файл для продолжения прерванного импорта")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Эмбеддить и писать только новые/изменённые чанки версии, удалять исчезнувшие",
+    )
+    parser.add_argument("--diff-only", action="store_true", help="Только посчитать изменения, ничего не записывая")
     args = parser.parse_args()
 
     _load_env_key_if_missing()
     provider = _embedding_provider(args.use_openai or bool(os.environ.get("OPENAI_API_KEY")), args.openai_embedding_model)
-    store = _build_store(args.pg_dsn, provider, args.openai_embedding_model)
+    provider = with_embedding_cache(provider, args.embedding_cache)
+    store = _build_store(args.pg_dsn, provider, args.openai_embedding_model, args.bulk_batch_size or None)
 
     # registry/aliases
     registry = KnowledgeVersionRegistry()
     registry.register(KnowledgeVersion(id=args.version_id, semver="1.0.0", kind="lore", status="latest"))
     registry.set_alias("lore_latest", args.version_id)
 
-    chunks = collect_chunks(args.content_root, args.version_id)
     facts = collect_graph_facts(args.content_root, args.version_id)
 
-    # Vector ingest
-    async def _upsert_all() -> None:
-        domains: dict[str, list[Chunk]] = {}
-        for ch in chunks:
-            domains.setdefault(ch.domain, []).append(ch)
-        for domain, items in domains.items():
-            await store.upsert(domain=domain, items=items)  # type: ignore[arg-type]
-            print(f"Upserted {len(items)} chunks into domain {domain}")
-
-    asyncio.run(_upsert_all())
+    # Vector ingest: чтение, эмбеддинг и запись идут потоком с ограниченными очередями
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = IngestCheckpoint.load(args.checkpoint, source=f"{args.content_root.resolve()}@{args.version_id}")
+    pipeline = StreamingIngestPipeline(
+        store,
+        provider,
+        embedding_model=args.openai_embedding_model,
+        batch_size=args.batch_size,
+        embed_concurrency=args.embed_concurrency,
+        max_tokens=args.chunk_tokens or None,
+        overlap_tokens=args.chunk_overlap,
+        checkpoint=checkpoint,
+        on_progress=lambda p: print(f"Upserted {p.upserted} chunks ({p.chunks_per_second:.0f} chunks/s)"),
+        incremental=args.incremental,
+        knowledge_version_id=args.version_id,
+        # Тег источника: tombstone-проход не трогает строки, загруженные из других каталогов.
+        source_id=args.content_root.name if args.incremental or args.diff_only else None,
+        dry_run=args.diff_only,
+    )
+    stats = asyncio.run(pipeline.run(iter_chunks(args.content_root, args.version_id)))
+    if args.incremental or args.diff_only:
+        print(f"new {stats.new}, changed {stats.changed}, unchanged {stats.unchanged}, removed {stats.deleted}")
+    if args.diff_only:
+        return
+    if checkpoint is not None:
+        checkpoint.clear()
+    print(f"Ingested {stats.upserted} chunks in {stats.seconds:.1f}s")
 
     # Graph ingest (optional)
     if GraphClient and args.neo4j_uri: